@@ -0,0 +1,49 @@
+__author__ = 'Leenix'
+
+
+class Entry(dict):
+    """
+    Read-only data entry.
+    Entries are handed to every matching writer as the same object, so nothing downstream is allowed to change them.
+    Formatters that need a modified version should work from entry.copy(), which returns a regular dictionary.
+
+    Only the top level of the entry is protected; nested values should be treated as read-only by convention.
+
+    Readers stamp each entry with the (monotonic) time it was read in, which the later stages use to measure latency.
+    """
+
+    ingest_time = None
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Entry is read-only - use entry.copy() to get a modifiable dictionary")
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    clear = _read_only
+    pop = _read_only
+    popitem = _read_only
+    setdefault = _read_only
+    update = _read_only
+
+    def copy(self):
+        """
+        Get a modifiable copy of the entry
+        :return: Dictionary copy of the entry
+        """
+        return dict(self)
+
+    def __reduce__(self):
+        # dict pickling fills the new object item-by-item, which the read-only methods would reject
+        return self.__class__, (dict(self),)
+
+
+def freeze(entry):
+    """
+    Make the entry read-only for fan-out
+    Entries that are already read-only are passed back as-is, so an entry is only ever wrapped once.
+    :param entry: Dictionary entry
+    :return: Entry object
+    """
+    if isinstance(entry, Entry):
+        return entry
+    return Entry(entry)
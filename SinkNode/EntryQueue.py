@@ -0,0 +1,378 @@
+from collections import deque
+from Queue import Queue, Empty, Full
+from time import time as _time
+
+__author__ = 'Leenix'
+
+# Maximum number of entries a stage will take off its queue in one go
+DEFAULT_BATCH_SIZE = 64
+
+# Backpressure policies - what happens when an entry is put on a full queue. COALESCE is the exception: it replaces
+# a queued entry with the same id whether the queue is full or not, so only the latest entry for each id is waiting
+BLOCK = "block"                 # Wait for room (the producer stalls)
+DROP_OLDEST = "drop_oldest"     # Throw away the oldest queued entry to make room
+DROP_NEWEST = "drop_newest"     # Throw away the incoming entry
+COALESCE = "coalesce"           # Replace the queued entry with the same id; drop the oldest if there's still no room
+
+POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+
+def entry_id(entry):
+    """
+    Get the coalescing key of an entry
+    :param entry: Queued entry
+    :return: The id of dictionary entries, otherwise None (never coalesced)
+    """
+    if isinstance(entry, dict):
+        return entry.get("id")
+    return None
+
+
+def ingest_time(entry):
+    """
+    Get the time an entry was read in
+    :param entry: Queued entry
+    :return: Ingest timestamp set by the reader, or None if the entry doesn't have one
+    """
+    return getattr(entry, "ingest_time", None)
+
+
+class EntryQueue(Queue):
+    """
+    Queue for passing entries between the stages of the ingestor.
+    Entries can be taken off and put on in batches, so a burst of entries costs a single lock round-trip and wakeup
+    instead of one per entry.
+
+    Queues can be bounded with a backpressure policy so a slow stage degrades predictably instead of growing without
+    limit. Every entry thrown away by the policy is counted in 'dropped'.
+
+    Closing the queue wakes up everything waiting on it. Consumers get whatever is left, then an empty batch to tell
+    them the stream has ended; anything put on a closed queue is dropped.
+
+    Every entry is queued with the time it was read in (see Metrics), so a stage can tell how long its entries have
+    taken to reach it even once they've been formatted into something that can't carry a timestamp.
+    """
+
+    def __init__(self, maxsize=0, policy=BLOCK, key=entry_id):
+        """
+        :param maxsize: Maximum number of queued entries. 0 is unbounded
+        :param policy: Backpressure policy used when the queue is full (see POLICIES). COALESCE also replaces queued
+        entries with the same id when there is room
+        :param key: Function that gets the coalescing key of an entry; only used by the COALESCE policy
+        """
+        assert policy in POLICIES
+        self.policy = policy
+        self.key = key
+        self.dropped = 0
+        self.closed = False
+        Queue.__init__(self, maxsize)
+
+    # Queue storage - entries are queued as (entry, stamp) pairs. Coalescing queues keep [key, entry, stamp] slots
+    # and an index of the slot queued for each key
+    def _init(self, maxsize):
+        self.queue = deque()
+        self.slots = {} if self.policy == COALESCE else None
+
+    def _put(self, item, stamp=None):
+        if self.slots is None:
+            self.queue.append((item, stamp))
+        else:
+            slot = [self.key(item), item, stamp]
+            if slot[0] is not None:
+                self.slots[slot[0]] = slot
+            self.queue.append(slot)
+
+    def _get(self):
+        return self._get_stamped()[0]
+
+    def _get_stamped(self):
+        if self.slots is None:
+            return self.queue.popleft()
+
+        slot = self.queue.popleft()
+        if slot[0] is not None:
+            del self.slots[slot[0]]
+        return slot[1], slot[2]
+
+    def _put_with_policy(self, item, stamp=None):
+        """
+        Put the entry on the queue according to the backpressure policy
+        Must be called with the mutex held, and never with the BLOCK policy.
+        :param item: Entry
+        :param stamp: Ingest timestamp of the entry
+        :return: None
+        """
+        if self.slots is not None:
+            key = self.key(item)
+            if key is not None and key in self.slots:
+                # Coalesce - the queued entry is replaced in place and keeps its position
+                self.slots[key][1] = item
+                self.slots[key][2] = stamp
+                self.dropped += 1
+                return
+
+        if 0 < self.maxsize <= self._qsize():
+            if self.policy == DROP_NEWEST:
+                self.dropped += 1
+                return
+
+            self._get()
+            self.dropped += 1
+            self.unfinished_tasks -= 1
+
+        self._put(item, stamp)
+        self.unfinished_tasks += 1
+        self.not_empty.notify()
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Put an entry on the queue
+        Only the BLOCK policy waits (or raises Full) when the queue is full; the other policies never block.
+        :param item: Entry
+        :param block: Wait for room if the queue is full (BLOCK policy only)
+        :param timeout: Maximum time to wait (in seconds). None waits indefinitely
+        :return: None
+        """
+        self.not_full.acquire()
+        try:
+            if self.closed:
+                self.dropped += 1
+                return
+
+            if self.policy != BLOCK:
+                self._put_with_policy(item, ingest_time(item))
+                return
+
+            if self.maxsize > 0:
+                if not block:
+                    if self._qsize() >= self.maxsize:
+                        raise Full
+                elif timeout is None:
+                    while self._qsize() >= self.maxsize and not self.closed:
+                        self.not_full.wait()
+                elif timeout < 0:
+                    raise ValueError("'timeout' must be a non-negative number")
+                else:
+                    end_time = _time() + timeout
+                    while self._qsize() >= self.maxsize and not self.closed:
+                        remaining = end_time - _time()
+                        if remaining <= 0.0:
+                            raise Full
+                        self.not_full.wait(remaining)
+
+                # Closed while waiting for room
+                if self.closed:
+                    self.dropped += 1
+                    return
+
+            self._put(item, ingest_time(item))
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+        finally:
+            self.not_full.release()
+
+    def get(self, block=True, timeout=None):
+        """
+        Remove and return a single entry
+        Same as Queue.get, except that a closed queue raises Empty once it has run dry instead of waiting forever.
+        :param block: Wait for an entry if the queue is empty
+        :param timeout: Maximum time to wait (in seconds). None waits indefinitely
+        :return: Entry
+        """
+        items = self.get_batch(1, block, timeout)
+        if len(items) == 0:
+            raise Empty
+        return items[0]
+
+    def close(self):
+        """
+        Mark the end of the stream
+        Everything waiting on the queue is woken up straight away. Entries already queued can still be taken.
+        :return: None
+        """
+        self.mutex.acquire()
+        try:
+            self.closed = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+        finally:
+            self.mutex.release()
+
+    def drop_remaining(self, taken=0):
+        """
+        Throw away everything that's queued, along with entries already taken off the queue but not processed
+        Used by a stage that has run out of time to drain. Discarded entries are counted as dropped and marked as done.
+        :param taken: Number of entries the caller has taken and is giving up on
+        :return: Number of entries discarded
+        """
+        self.mutex.acquire()
+        try:
+            count = self._qsize() + taken
+            self._init(self.maxsize)
+            self.dropped += count
+
+            self.unfinished_tasks = max(0, self.unfinished_tasks - count)
+            if not self.unfinished_tasks:
+                self.all_tasks_done.notify_all()
+            self.not_full.notify_all()
+            return count
+
+        finally:
+            self.mutex.release()
+
+    def set_limit(self, maxsize, policy=BLOCK):
+        """
+        Change the capacity and backpressure policy of the queue
+        Can be done while the queue is in use. Entries that no longer fit are dropped (and counted) by the new policy;
+        a BLOCK queue that is already over its new size just stops accepting entries until it drains.
+        :param maxsize: Maximum number of queued entries. 0 is unbounded
+        :param policy: Backpressure policy used when the queue is full (see POLICIES). COALESCE also replaces queued
+        entries with the same id when there is room
+        :return: None
+        """
+        assert policy in POLICIES
+
+        self.mutex.acquire()
+        try:
+            items = [self._get_stamped() for _ in range(self._qsize())]
+            self.unfinished_tasks -= len(items)
+
+            self.maxsize = maxsize
+            self.policy = policy
+            self._init(maxsize)
+
+            for item, stamp in items:
+                if policy == BLOCK:
+                    self._put(item, stamp)
+                    self.unfinished_tasks += 1
+                else:
+                    self._put_with_policy(item, stamp)
+
+            self.not_full.notify_all()
+            if self._qsize():
+                self.not_empty.notify_all()
+            if not self.unfinished_tasks:
+                self.all_tasks_done.notify_all()
+
+        finally:
+            self.mutex.release()
+
+    def get_batch(self, max_items=DEFAULT_BATCH_SIZE, block=True, timeout=None):
+        """
+        Remove and return whatever is queued, up to max_items
+        Blocking behaviour is the same as Queue.get - the call only waits while the queue is empty, so a lone entry
+        is returned as soon as it arrives.
+
+        :param max_items: Maximum number of entries to return
+        :param block: Wait for an entry if the queue is empty
+        :param timeout: Maximum time to wait (in seconds). None waits indefinitely
+        :return: List of entries in queue order. Empty once the queue has been closed and drained
+        """
+        return self.get_stamped_batch(max_items, block, timeout)[0]
+
+    def get_stamped_batch(self, max_items=DEFAULT_BATCH_SIZE, block=True, timeout=None):
+        """
+        Same as get_batch, but also returns the ingest timestamp each entry was queued with
+        :param max_items: Maximum number of entries to return
+        :param block: Wait for an entry if the queue is empty
+        :param timeout: Maximum time to wait (in seconds). None waits indefinitely
+        :return: Tuple of (entries, stamps) lists, in queue order
+        """
+        self.not_empty.acquire()
+        try:
+            if not block:
+                if not self._qsize() and not self.closed:
+                    raise Empty
+            elif timeout is None:
+                while not self._qsize() and not self.closed:
+                    self.not_empty.wait()
+            elif timeout < 0:
+                raise ValueError("'timeout' must be a non-negative number")
+            else:
+                end_time = _time() + timeout
+                while not self._qsize() and not self.closed:
+                    remaining = end_time - _time()
+                    if remaining <= 0.0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+
+            count = min(max_items, self._qsize())
+            pairs = [self._get_stamped() for _ in range(count)]
+            self.not_full.notify(count)
+
+            if count == 0:
+                return [], []
+            items, stamps = zip(*pairs)
+            return list(items), list(stamps)
+
+        finally:
+            self.not_empty.release()
+
+    def put_batch(self, items, block=True, stamps=None):
+        """
+        Put a batch of entries on the queue under a single lock
+        Entries are added in order. A full BLOCK queue makes the call wait for room as needed; the other policies
+        drop entries instead.
+
+        :param items: List of entries
+        :param block: Wait for room on a full BLOCK queue. If False, entries that don't fit are dropped
+        :param stamps: Ingest timestamps of the entries, for entries that have been formatted since they were read.
+        Defaults to the timestamps the entries carry themselves
+        :return: None
+        """
+        if len(items) == 0:
+            return
+
+        if stamps is None:
+            stamps = [ingest_time(item) for item in items]
+
+        self.not_full.acquire()
+        try:
+            if self.closed:
+                self.dropped += len(items)
+                return
+
+            if self.policy != BLOCK:
+                for item, stamp in zip(items, stamps):
+                    self._put_with_policy(item, stamp)
+                return
+
+            for i, item in enumerate(items):
+                if self.maxsize > 0:
+                    if not block and self._qsize() >= self.maxsize:
+                        self.dropped += len(items) - i
+                        return
+
+                    while self._qsize() >= self.maxsize and not self.closed:
+                        self.not_full.wait()
+
+                    # Closed while waiting for room
+                    if self.closed:
+                        self.dropped += len(items) - i
+                        return
+
+                self._put(item, stamps[i])
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+
+        finally:
+            self.not_full.release()
+
+    def task_done(self, count=1):
+        """
+        Mark a number of taken entries as processed
+        :param count: Number of entries that have been processed
+        :return: None
+        """
+        self.all_tasks_done.acquire()
+        try:
+            unfinished = self.unfinished_tasks - count
+            if unfinished <= 0:
+                if unfinished < 0:
+                    raise ValueError('task_done() called too many times')
+                self.all_tasks_done.notify_all()
+            self.unfinished_tasks = unfinished
+
+        finally:
+            self.all_tasks_done.release()
@@ -0,0 +1,481 @@
+import errno
+import fcntl
+import heapq
+import logging
+import os
+import socket
+import time
+from functools import partial
+from itertools import count
+from threading import Thread, Lock
+from Queue import Queue
+
+from SinkNode.Poller import Poller, READ, WRITE, get_fd
+
+__author__ = 'Leenix'
+
+LOGGER_FORMAT = "%(asctime)s - %(name)s - %(levelname)s: %(message)s"
+
+# Threads shared by every blocking call handed off the loop (writers without a non-blocking implementation)
+EXECUTOR_THREADS = 4
+
+# Time resolved addresses are reused before the name is looked up again (in seconds)
+ADDRESS_TTL = 300.0
+
+# Time allowed for the executor and resolver threads to finish their current job when the loop closes (in seconds)
+EXECUTOR_JOIN_TIMEOUT = 1.0
+
+# Time allowed for a non-blocking HTTP request to finish (in seconds)
+HTTP_TIMEOUT = 30
+
+RECEIVE_SIZE = 4096
+
+
+class Timer(object):
+    """
+    Handle for a call scheduled on the event loop
+    """
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Stop the call from happening
+        :return: None
+        """
+        self.cancelled = True
+
+
+class EventLoop(object):
+    """
+    Single-threaded event loop.
+    Runs callbacks when file descriptors become ready or timers go off, so hundreds of sockets can be handled by one
+    thread. Blocking calls are handed to a small shared pool of executor threads and their results come back to the
+    loop as callbacks. Name lookups get a resolver thread of their own, so slow writers can't hold them up.
+
+    Only call_soon_threadsafe may be used from other threads; everything else must be called on the loop.
+    """
+
+    def __init__(self, executor_threads=EXECUTOR_THREADS, logger_level=logging.FATAL, logger_format=LOGGER_FORMAT):
+        self.logger = logging.getLogger("EventLoop")
+        log_handler = logging.StreamHandler()
+        log_handler.setFormatter(logging.Formatter(logger_format))
+        self.logger.addHandler(log_handler)
+        self.logger.setLevel(logger_level)
+
+        self.poller = Poller()
+        self.readers = {}
+        self.writers = {}
+        self.timers = []
+        self.timer_sequence = count()
+        self.ready = []
+
+        # Other threads hand callbacks over under a lock, then poke the loop awake through a pipe
+        self.pending = []
+        self.pending_lock = Lock()
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        _set_nonblocking(self.wakeup_read)
+        _set_nonblocking(self.wakeup_write)
+        self.add_reader(self.wakeup_read, self._read_wakeup)
+
+        self.executor_threads = executor_threads
+        self.executor_queue = Queue()
+        self.executors = []
+
+        # Resolved addresses by (host, port), along with the callbacks waiting on lookups still in progress
+        self.resolver_queue = Queue()
+        self.resolver = None
+        self.addresses = {}
+        self.lookups = {}
+
+        self.is_running = False
+        self.is_closed = False
+
+    def call_soon(self, callback, *args):
+        """
+        Run the callback on the next pass of the loop
+        :param callback: Function to call
+        :param args: Arguments for the function
+        :return: None
+        """
+        self.ready.append((callback, args))
+
+    def call_soon_threadsafe(self, callback, *args):
+        """
+        Run the callback on the loop from any thread
+        :param callback: Function to call
+        :param args: Arguments for the function
+        :return: None
+        """
+        self.pending_lock.acquire()
+        try:
+            # Executors left behind when the loop closed have nowhere to send their results
+            if self.is_closed:
+                return
+            wake = len(self.pending) == 0
+            self.pending.append((callback, args))
+        finally:
+            self.pending_lock.release()
+
+        # Only the first call since the last pass needs to wake the loop
+        if wake:
+            try:
+                os.write(self.wakeup_write, b"x")
+            except OSError:
+                pass
+
+    def call_later(self, delay, callback, *args):
+        """
+        Run the callback after a delay
+        :param delay: Time to wait (in seconds)
+        :param callback: Function to call
+        :param args: Arguments for the function
+        :return: Timer handle that can be cancelled
+        """
+        timer = Timer(time.time() + delay, callback, args)
+        heapq.heappush(self.timers, (timer.when, next(self.timer_sequence), timer))
+        return timer
+
+    def add_reader(self, fd, callback, *args):
+        """
+        Run the callback whenever the file descriptor has data to read
+        :param fd: File descriptor (or object with a fileno method)
+        :param callback: Function to call
+        :param args: Arguments for the function
+        :return: None
+        """
+        fd = get_fd(fd)
+        self.readers[fd] = (callback, args)
+        self._update_fd(fd)
+
+    def remove_reader(self, fd):
+        fd = get_fd(fd)
+        if self.readers.pop(fd, None) is not None:
+            self._update_fd(fd)
+
+    def add_writer(self, fd, callback, *args):
+        """
+        Run the callback whenever the file descriptor can be written to
+        :param fd: File descriptor (or object with a fileno method)
+        :param callback: Function to call
+        :param args: Arguments for the function
+        :return: None
+        """
+        fd = get_fd(fd)
+        self.writers[fd] = (callback, args)
+        self._update_fd(fd)
+
+    def remove_writer(self, fd):
+        fd = get_fd(fd)
+        if self.writers.pop(fd, None) is not None:
+            self._update_fd(fd)
+
+    def _update_fd(self, fd):
+        events = 0
+        if fd in self.readers:
+            events |= READ
+        if fd in self.writers:
+            events |= WRITE
+
+        if events == 0:
+            self.poller.unregister(fd)
+        elif fd in self.poller.events:
+            self.poller.modify(fd, events)
+        else:
+            self.poller.register(fd, events)
+
+    def run_in_executor(self, function, args=(), callback=None):
+        """
+        Run a blocking function on an executor thread
+        The callback is run on the loop with (result, error) once the function has finished.
+        :param function: Blocking function to call
+        :param args: Tuple of arguments for the function
+        :param callback: Function to call with the result
+        :return: None
+        """
+        # Executor threads are only started as they're needed
+        if len(self.executors) < self.executor_threads:
+            executor = Thread(name="EventLoopExecutor", target=self._executor_loop, args=(self.executor_queue,))
+            executor.setDaemon(True)
+            executor.start()
+            self.executors.append(executor)
+
+        self.executor_queue.put((function, args, callback))
+
+    def resolve(self, host, port, callback):
+        """
+        Look up the addresses of a host on the resolver thread
+        Addresses are kept for ADDRESS_TTL seconds, and lookups of a name already being looked up are joined onto it.
+        The callback is run on the loop with (addresses, error), where addresses is the list from socket.getaddrinfo.
+        :param host: Host name or address
+        :param port: Port number
+        :param callback: Function to call with the addresses
+        :return: None
+        """
+        key = (host, port)
+        cached = self.addresses.get(key)
+        if cached is not None and cached[0] > time.time():
+            return self.call_soon(callback, cached[1], None)
+
+        if key in self.lookups:
+            self.lookups[key].append(callback)
+            return
+        self.lookups[key] = [callback]
+
+        if self.resolver is None:
+            self.resolver = Thread(name="EventLoopResolver", target=self._executor_loop, args=(self.resolver_queue,))
+            self.resolver.setDaemon(True)
+            self.resolver.start()
+
+        self.resolver_queue.put((socket.getaddrinfo, (host, port, 0, socket.SOCK_STREAM), partial(self._resolved, key)))
+
+    def _resolved(self, key, addresses, error):
+        if error is None:
+            self.addresses[key] = (time.time() + ADDRESS_TTL, addresses)
+
+        for callback in self.lookups.pop(key, []):
+            self._run_callback(callback, (addresses, error))
+
+    def _executor_loop(self, jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+
+            function, args, callback = job
+            result, error = None, None
+            try:
+                result = function(*args)
+            except Exception as err:
+                error = err
+
+            if callback is not None:
+                self.call_soon_threadsafe(callback, result, error)
+
+    def run(self):
+        """
+        Run the loop until stop is called
+        :return: None
+        """
+        self.is_running = True
+
+        while self.is_running:
+            timeout = None
+            if len(self.ready) > 0:
+                timeout = 0
+            elif len(self.timers) > 0:
+                timeout = max(0.0, self.timers[0][0] - time.time())
+
+            for fd, events in self.poller.poll(timeout):
+                if events & READ and fd in self.readers:
+                    callback, args = self.readers[fd]
+                    self._run_callback(callback, args)
+                if events & WRITE and fd in self.writers:
+                    callback, args = self.writers[fd]
+                    self._run_callback(callback, args)
+
+            now = time.time()
+            while len(self.timers) > 0 and self.timers[0][0] <= now:
+                timer = heapq.heappop(self.timers)[2]
+                if not timer.cancelled:
+                    self.ready.append((timer.callback, timer.args))
+
+            # Run what's ready now; anything scheduled by these callbacks waits for the next pass
+            ready, self.ready = self.ready, []
+            for callback, args in ready:
+                self._run_callback(callback, args)
+
+        self._close()
+
+    def _run_callback(self, callback, args):
+        try:
+            callback(*args)
+        except Exception:
+            self.logger.exception("Callback failed")
+
+    def _read_wakeup(self):
+        try:
+            while os.read(self.wakeup_read, RECEIVE_SIZE):
+                pass
+        except OSError:
+            pass
+
+        self.pending_lock.acquire()
+        try:
+            pending, self.pending = self.pending, []
+        finally:
+            self.pending_lock.release()
+
+        self.ready.extend(pending)
+
+    def stop(self):
+        """
+        Stop the loop once the current pass has finished
+        Safe to call from any thread.
+        :return: None
+        """
+        self.call_soon_threadsafe(self._stop)
+
+    def _stop(self):
+        self.is_running = False
+
+    def _close(self):
+        threads = list(self.executors)
+        for _ in self.executors:
+            self.executor_queue.put(None)
+        if self.resolver is not None:
+            threads.append(self.resolver)
+            self.resolver_queue.put(None)
+
+        # A thread stuck in a blocking call is left behind rather than holding up the stop
+        deadline = time.time() + EXECUTOR_JOIN_TIMEOUT
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.time()))
+            if thread.is_alive():
+                self.logger.warning("%s is still busy - leaving it behind", thread.name)
+
+        self.pending_lock.acquire()
+        try:
+            self.is_closed = True
+        finally:
+            self.pending_lock.release()
+
+        self.poller.close()
+        os.close(self.wakeup_read)
+        os.close(self.wakeup_write)
+
+
+class AsyncConnection(object):
+    """
+    Non-blocking TCP client for a single request.
+    Connects, sends the whole request, then optionally reads until the server closes the connection. The callback is
+    run on the loop with (response, error) when it's all over.
+    """
+
+    def __init__(self, loop, host, port, request, callback, read_response=True, timeout=HTTP_TIMEOUT):
+        self.loop = loop
+        self.host = host
+        self.port = port
+        self.outgoing = request
+        self.response = []
+        self.callback = callback
+        self.read_response = read_response
+        self.sock = None
+        self.timer = loop.call_later(timeout, self._fail, socket.timeout("Request timed out"))
+
+        # Name lookups block, so they're done off the loop
+        loop.resolve(host, port, self._resolved)
+
+    def _resolved(self, addresses, error):
+        # The request may have timed out while the name was being looked up. Connecting now would send it twice
+        if self.callback is None:
+            return
+
+        if error is not None:
+            return self._fail(error)
+
+        family, sock_type, protocol, _, address = addresses[0]
+        self.sock = socket.socket(family, sock_type, protocol)
+        self.sock.setblocking(0)
+
+        result = self.sock.connect_ex(address)
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            return self._fail(socket.error(result, os.strerror(result)))
+
+        self.loop.add_writer(self.sock, self._send)
+
+    def _send(self):
+        try:
+            sent = self.sock.send(self.outgoing)
+        except socket.error as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            return self._fail(err)
+
+        self.outgoing = self.outgoing[sent:]
+        if len(self.outgoing) > 0:
+            return
+
+        self.loop.remove_writer(self.sock)
+        if self.read_response:
+            self.loop.add_reader(self.sock, self._receive)
+        else:
+            self._finish(None)
+
+    def _receive(self):
+        try:
+            data = self.sock.recv(RECEIVE_SIZE)
+        except socket.error as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            return self._fail(err)
+
+        if len(data) > 0:
+            self.response.append(data)
+        else:
+            self._finish(b"".join(self.response))
+
+    def _fail(self, error):
+        self._finish(None, error)
+
+    def _finish(self, response, error=None):
+        if self.callback is None:
+            return
+
+        callback, self.callback = self.callback, None
+        self.timer.cancel()
+
+        if self.sock is not None:
+            self.loop.remove_reader(self.sock)
+            self.loop.remove_writer(self.sock)
+            self.sock.close()
+
+        callback(response, error)
+
+
+def http_request(loop, host, port, method, path, callback, body="", headers=None, timeout=HTTP_TIMEOUT):
+    """
+    Make a non-blocking HTTP/1.0 request
+    The callback is run on the loop with ((status, body), error) once the response has arrived.
+    :param loop: EventLoop to run the request on
+    :param host: Server name
+    :param port: Server port
+    :param method: HTTP method, e.g. "GET"
+    :param path: Request path, including any query string
+    :param callback: Function to call with the response
+    :param body: Request body
+    :param headers: Dictionary of extra request headers
+    :param timeout: Time allowed for the whole request (in seconds)
+    :return: None
+    """
+    lines = ["{} {} HTTP/1.0".format(method, path), "Host: {}".format(host), "Connection: close"]
+
+    for name, value in (headers or {}).items():
+        lines.append("{}: {}".format(name, value))
+    if len(body) > 0:
+        lines.append("Content-Length: {}".format(len(body)))
+
+    request = "\r\n".join(lines) + "\r\n\r\n" + body
+
+    def parse_response(response, error):
+        if error is not None:
+            return callback(None, error)
+
+        try:
+            head, _, response_body = response.partition("\r\n\r\n")
+            status = int(head.split(" ", 2)[1])
+        except (IndexError, ValueError) as err:
+            return callback(None, err)
+
+        callback((status, response_body), None)
+
+    AsyncConnection(loop, host, port, request, parse_response, timeout=timeout)
+
+
+def _set_nonblocking(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
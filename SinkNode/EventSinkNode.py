@@ -0,0 +1,238 @@
+import logging
+import time
+from threading import Thread
+
+from SinkNode import SinkNode, READER_JOIN_TIMEOUT
+from SinkNode.EntryQueue import EntryQueue, Empty, DEFAULT_BATCH_SIZE, ingest_time
+from SinkNode.EventLoop import EventLoop, EXECUTOR_THREADS
+
+__author__ = 'Leenix'
+
+
+class LoopQueue(EntryQueue):
+    """
+    Read queue that pokes the event loop whenever entries are put on it
+    """
+
+    def __init__(self, on_put):
+        EntryQueue.__init__(self)
+        self.on_put = on_put
+
+    def put(self, item, block=True, timeout=None):
+        EntryQueue.put(self, item, block, timeout)
+        self.on_put()
+
+    def put_batch(self, items, block=True, stamps=None):
+        EntryQueue.put_batch(self, items, block, stamps)
+        self.on_put()
+
+
+class AsyncWriter(object):
+    """
+    Drives a Writer from the event loop instead of its own threads.
+    Entries are formatted on the loop and written one at a time with the writer's write_entry_async, so each writer
+    still sees its entries in order.
+    """
+
+    def __init__(self, writer, loop, on_idle):
+        self.writer = writer
+        self.loop = loop
+        self.on_idle = on_idle
+        self.is_writing = False
+        self.stamp = None
+
+    def add_entries(self, entries):
+        """
+        Format a batch of entries and queue them up for writing
+        The loop can't wait for room, so entries that don't fit in a full write queue are dropped.
+        :param entries: List of entries
+        :return: None
+        """
+        formatter = self.writer.formatter
+        formatted_entries, stamps, errors = formatter._format_batch(entries, [ingest_time(entry) for entry in entries])
+
+        formatter.metrics.count_received(len(entries))
+        formatter.metrics.count_sent(len(formatted_entries))
+        formatter.metrics.count_errors(errors)
+        formatter.metrics.record_latency(stamps)
+
+        self.writer.write_queue.put_batch(formatted_entries, block=False, stamps=stamps)
+        self._write_next()
+
+    def is_idle(self):
+        return not self.is_writing and self.writer.write_queue.qsize() == 0
+
+    def _write_next(self):
+        if self.is_writing:
+            return
+
+        try:
+            entries, stamps = self.writer.write_queue.get_stamped_batch(1, block=False)
+        except Empty:
+            return self.on_idle()
+
+        if len(entries) == 0:
+            return self.on_idle()
+
+        self.is_writing = True
+        self.stamp = stamps[0]
+        self.writer.metrics.count_received()
+        try:
+            self.writer.write_entry_async(entries[0], self.loop, self._written)
+        except Exception as err:
+            self._written(None, err)
+
+    def _written(self, result, error):
+        if error is not None:
+            self.writer.metrics.count_errors()
+            self.writer.logger.warning("Entry could not be written: %s", error)
+        else:
+            self.writer.metrics.count_sent()
+            self.writer.logger.info("Entry written")
+
+        self.writer.metrics.record_latency([self.stamp])
+
+        self.is_writing = False
+        self.writer.write_queue.task_done()
+
+        # Go round the loop before the next write so a writer that finishes straight away can't hog it
+        self.loop.call_soon(self._write_next)
+
+
+class EventSinkNode(SinkNode):
+    """
+    SinkNode that runs every writer on a single event loop thread.
+    The threaded SinkNode gives each writer a formatter thread and a write thread. Here, formatting and writing are
+    callbacks on one loop. Network writers (SocketWriter, DweetWriter, ThingspeakWriter) write without blocking; other
+    writers have their blocking write_entry run on a small shared pool of executor threads. Hundreds of writers cost
+    no extra threads.
+
+    Readers still run in their own threads. Formatting happens on the loop, so keep CPU-heavy formatters on the
+    threaded SinkNode.
+    """
+
+    def __init__(self, reader=None, logger_level=logging.FATAL, batch_size=DEFAULT_BATCH_SIZE,
+                 executor_threads=EXECUTOR_THREADS):
+        SinkNode.__init__(self, logger_level=logger_level, batch_size=batch_size)
+
+        self.loop = EventLoop(executor_threads=executor_threads, logger_level=logger_level)
+        self.async_writers = {}
+        self.wake_pending = False
+        self.is_stopping = False
+        self.read_queue = LoopQueue(self._wake)
+        self.metrics.queue = self.read_queue
+        self.process_thread = Thread(name="main", target=self.loop.run)
+
+        if reader is not None:
+            self.add_reader(reader)
+
+    def _start_writer(self, writer):
+        """
+        Writers don't get threads of their own; they're driven from the loop
+        :param writer: Writer object
+        :return:
+        """
+        writer.is_running = True
+
+    def stop(self, drain_timeout=0):
+        """
+        Stop the ingestor
+        Same as SinkNode.stop - entries already read are flushed through to the writers until the drain timeout runs
+        out, and the call returns once the loop has finished. Executor threads still stuck in a blocking write after
+        EXECUTOR_JOIN_TIMEOUT are left behind.
+
+        :param drain_timeout: Time (in seconds) allowed for flushing in-flight entries. Entries still queued when it
+        runs out are dropped. 0 drops them straight away; None flushes everything
+        :return:
+        """
+        self.logger.info("Main thread stopping..")
+        self.is_running = False
+
+        if drain_timeout is not None:
+            self.drain_deadline = time.time() + drain_timeout
+
+        for reader in self.readers:
+            reader.stop()
+
+        for reader in self.readers:
+            if not reader.join(READER_JOIN_TIMEOUT):
+                self.logger.warning("Reader [%s] is blocked reading - leaving it behind", reader.logger.name)
+
+        self.read_queue.close()
+
+        if self.process_thread.is_alive():
+            self.loop.call_soon_threadsafe(self._begin_shutdown)
+            self.process_thread.join()
+
+        self.logger.info("Main thread stopped")
+
+    def _wake(self):
+        # Called from the reader threads - only one drain needs to be scheduled at a time
+        if not self.wake_pending:
+            self.wake_pending = True
+            self.loop.call_soon_threadsafe(self._drain_read_queue)
+
+    def _drain_read_queue(self):
+        self.wake_pending = False
+
+        while True:
+            try:
+                entries = self.read_queue.get_batch(self.batch_size, block=False)
+            except Empty:
+                return
+
+            if len(entries) == 0:
+                return
+
+            try:
+                for writer, writer_entries in self._route(entries).iteritems():
+                    self._get_async_writer(writer).add_entries(writer_entries)
+            except Exception:
+                self.logger.exception("Entries could not be dispatched")
+
+            self.read_queue.task_done(len(entries))
+
+    def _get_async_writer(self, writer):
+        async_writer = self.async_writers.get(writer)
+
+        if async_writer is None:
+            async_writer = AsyncWriter(writer, self.loop, self._check_finished)
+            self.async_writers[writer] = async_writer
+
+        return async_writer
+
+    def _begin_shutdown(self):
+        self.is_stopping = True
+
+        for writer in self.writers:
+            writer[0].is_running = False
+
+        drain_time = self._get_drain_time()
+        if drain_time is None or drain_time > 0:
+            self._drain_read_queue()
+        else:
+            self.read_queue.drop_remaining()
+
+        if drain_time is not None:
+            self.loop.call_later(drain_time, self._abandon)
+
+        self._check_finished()
+
+    def _check_finished(self):
+        if not self.is_stopping:
+            return
+
+        for async_writer in self.async_writers.values():
+            if not async_writer.is_idle():
+                return
+
+        self.loop.stop()
+
+    def _abandon(self):
+        # Drain time is up - drop whatever hasn't been written
+        for writer in self.writers:
+            dropped = writer[0].write_queue.drop_remaining()
+            if dropped > 0:
+                self.logger.warning("Drain time is up - dropping %d entries for [%s]", dropped, writer[0].get_id())
+
+        self.loop.stop()
@@ -1,7 +1,9 @@
 from SinkNode.Formatter import Formatter
 import logging
 import datetime
-from netaddr import *
+from SinkNode.Registry import lazy_import
+
+netaddr = lazy_import("netaddr")
 
 
 class BluetoothFormatter(Formatter):
@@ -37,9 +39,9 @@ class BluetoothFormatter(Formatter):
                     # Grab the MAC vendor while we're here
                     if j == 0:
                         try:
-                            vendor = EUI(fields[j]).oui.registration().org
+                            vendor = netaddr.EUI(fields[j]).oui.registration().org
 
-                        except NotRegisteredError:
+                        except netaddr.NotRegisteredError:
                             vendor = 'Unregistered'
                         output += ",{}".format(vendor.replace(",", ""))
 
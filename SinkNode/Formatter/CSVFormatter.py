@@ -5,47 +5,38 @@ __author__ = 'Leenix'
 
 
 class CSVFormatter(Formatter):
-    def __init__(self, outbox=None, logger_level=logging.FATAL, columns=[]):
+    def __init__(self, outbox=None, logger_level=logging.FATAL, columns=None):
         super(CSVFormatter, self).__init__(outbox=outbox, logger_level=logger_level, formatter_id="CSVFormatter")
 
+        if columns is None:
+            columns = []
         self.columns = columns
 
     def format_entry(self, entry):
         """
         Processes JSON entries into CSV format
+        The entry is left untouched; it may be shared with other writers.
 
         :param entry: JSON entry in 'column':'value' format
         :return: CSV entry in 'value','value','value' format
         """
 
-        output = ""
-
-        new_columns = len(self.columns) > 0
-
-        # See if a column order has been established
-        if new_columns:
-            # Order already established - put values into columns
-            for key in self.columns:
-                if key in entry.keys():
-                    output += str(entry.pop(key))
-                else:
-                    output += "-"
-                output += ","
+        # Put values into the established column order
+        values = [str(entry[key]) if key in entry else "-" for key in self.columns]
 
         # Check for any left-over columns that need to be added
-        new_columns = len(entry) > 0
-
-        if new_columns:
-            self.logger.info("New columns added - %s", entry.keys())
-            keys = entry.keys()
-            for key in keys:
+        new_columns = [key for key in entry.keys() if key not in self.columns]
 
+        if len(new_columns) > 0:
+            self.logger.info("New columns added - %s", new_columns)
+            for key in new_columns:
                 self.columns.append(str(key))
-                output += str(entry.pop(key))
-                output += ","
+                values.append(str(entry[key]))
+
+        output = ",".join(values)
 
+        if len(new_columns) > 0:
             # Prepend the headings
             output = "{0}\n{1}".format(str(self.columns).strip('[]').replace(" ", ""), output)
 
-        # Trim the extra comma at the end
-        return output[:-1]
+        return output
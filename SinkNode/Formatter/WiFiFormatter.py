@@ -1,7 +1,5 @@
 from SinkNode.Formatter import Formatter
 import logging
-import datetime
-from netaddr import *
 import json
 
 
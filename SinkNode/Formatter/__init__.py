@@ -1,25 +1,62 @@
+from itertools import count
 from threading import Thread
+from time import time as _time
 
 __author__ = 'Leenix'
 
 LOGGER_FORMAT = "%(asctime)s - %(name)s - %(levelname)s: %(message)s"
 
-from Queue import Queue
+from Queue import Queue, Empty, Full
+from SinkNode.EntryQueue import EntryQueue, DEFAULT_BATCH_SIZE, entry_id
+from SinkNode.Metrics import StageMetrics
 import logging
 
+# Batches waiting for each worker process before the formatter holds off sending more
+WORKER_QUEUE_SIZE = 16
+
+# How often the worker processes are checked on while waiting for them (in seconds). Workers that have died are
+# treated as finished, and whatever they had been sent is counted as errors
+WORKER_CHECK_INTERVAL = 0.5
+
+
+def _worker_loop(formatter, index, batches, results):
+    """
+    Format batches in a worker process until told to stop
+    :param formatter: Formatter doing the work
+    :param index: Number of the worker, sent back with every result
+    :param batches: Multiprocessing queue of (entries, stamps) batches. None marks the end
+    :param results: Multiprocessing queue for the (worker, (formatted entries, stamps, errors)) results. The result
+    is None once the worker has finished
+    :return: None
+    """
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+        results.put((index, formatter._format_batch(*batch)))
+
+    results.put((index, None))
+
 
 class Formatter(object):
     """
     Parent class.
     Transforms incoming JSON data packets to another format for writing or uploading.
     Output format is dictated by the child class.
+
+    CPU-heavy formatters can be run in a pool of worker processes instead of the format thread (see set_processes).
+    Entries with the same id always go to the same worker, so they come out in the order they went in. Each worker
+    has its own copy of the formatter, so any state kept by format_entry is only shared between entries of the
+    same id.
     """
-    def __init__(self, outbox=None, logger_level=logging.FATAL, formatter_id=__name__, logger_format=LOGGER_FORMAT):
+    def __init__(self, outbox=None, logger_level=logging.FATAL, formatter_id=__name__, logger_format=LOGGER_FORMAT,
+                 batch_size=DEFAULT_BATCH_SIZE, processes=0):
         self.logger = logging.getLogger(__name__)
 
         # The inbox queue can be either internal or externally passed in. The outbox must be specified
-        self.inbox = Queue()
+        self.inbox = EntryQueue()
         self.outbox = outbox
+        self.batch_size = batch_size
 
         # Set up logging stuff...
         self.logger = logging.getLogger(formatter_id)
@@ -29,16 +66,80 @@ class Formatter(object):
         self.logger.setLevel(logger_level)
 
         self.is_running = True
+        self.drain_deadline = None
         self.format_thread = Thread(target=self._format_loop)
 
-    def stop(self):
+        # Worker process pool - only used if processes have been requested
+        self.processes = processes
+        self.workers = []
+        self.worker_queues = []
+        self.worker_sent = []
+        self.worker_returned = []
+        self.results = None
+        self.collect_thread = None
+        self.worker_counter = count()
+
+        self.metrics = StageMetrics(formatter_id, self.inbox)
+
+    def __getstate__(self):
+        # Threads, queues and loggers can't be pickled; worker processes only need the formatting settings
+        state = self.__dict__.copy()
+        for key in ("logger", "inbox", "outbox", "format_thread", "workers", "worker_queues", "worker_sent",
+                    "worker_returned", "results",
+                    "collect_thread", "worker_counter", "metrics"):
+            state.pop(key, None)
+
+        state["logger_name"] = self.logger.name
+        state["logger_level"] = self.logger.level
+        return state
+
+    def __setstate__(self, state):
+        self.logger = logging.getLogger(state.pop("logger_name"))
+        self.logger.setLevel(state.pop("logger_level"))
+        self.__dict__.update(state)
+
+    def set_processes(self, processes):
+        """
+        Run the formatter in a pool of worker processes
+        Must be set before the formatter is started.
+        :param processes: Number of worker processes. 0 formats in the formatter thread
+        :return: None
+        """
+        assert not self.format_thread.is_alive()
+        self.processes = processes
+
+    def stop(self, drain_timeout=0):
         """
         Stop processing incoming packets
+        The inbox is closed straight away. Entries already in it are formatted until the drain timeout runs out;
+        whatever is left after that is dropped. The outbox is closed once the formatter has finished.
+
+        :param drain_timeout: Time (in seconds) allowed for flushing queued entries. None flushes everything
         :return: None
         """
         self.logger.fatal("Stopping formatter")
         self.is_running = False
 
+        if drain_timeout is not None:
+            self.drain_deadline = _time() + drain_timeout
+
+        self.inbox.close()
+
+    def join(self, timeout=None):
+        """
+        Wait for the formatter thread to finish
+        :param timeout: Maximum time to wait (in seconds). None waits until the thread has exited
+        :return: None
+        """
+        if self.format_thread.is_alive():
+            self.format_thread.join(timeout)
+
+        if self.collect_thread is not None and self.collect_thread.is_alive():
+            self.collect_thread.join(timeout)
+
+        for worker in self.workers:
+            worker.join(timeout)
+
     def start(self):
         """
         Start processing incoming packets
@@ -46,33 +147,202 @@ class Formatter(object):
         """
         self.logger.debug("Starting formatter")
         # Ensure that the queues have been defined before continuing
-        assert isinstance(self.inbox, Queue)
-        assert isinstance(self.outbox, Queue)
+        assert isinstance(self.inbox, EntryQueue)
+        assert isinstance(self.outbox, EntryQueue)
 
         # On with the show
         self.is_running = True
+
+        if self.processes > 0:
+            self._start_workers()
+
         self.format_thread.start()
 
+    def _start_workers(self):
+        """
+        Start the worker processes and the thread that collects their results
+        :return: None
+        """
+        # Only pulled in when processes are asked for; most pipelines never need it
+        import multiprocessing
+
+        self.logger.debug("Starting %d worker processes", self.processes)
+        self.results = multiprocessing.Queue()
+
+        for i in range(self.processes):
+            batches = multiprocessing.Queue(WORKER_QUEUE_SIZE)
+            worker = multiprocessing.Process(target=_worker_loop, args=(self, i, batches, self.results),
+                                             name="{}-{}".format(self.logger.name, i))
+            worker.daemon = True
+            worker.start()
+
+            self.worker_queues.append(batches)
+            self.workers.append(worker)
+
+            # Entries sent to and returned by each worker, so anything lost with a dead worker can be counted
+            self.worker_sent.append(0)
+            self.worker_returned.append(0)
+
+        self.collect_thread = Thread(target=self._collect_loop)
+        self.collect_thread.start()
+
+    def _send_to_workers(self, raw_entries, stamps):
+        """
+        Split the batch between the worker processes
+        Entries are assigned by id so each id is always formatted by the same worker, in order.
+        :param raw_entries: List of incoming packets
+        :param stamps: Ingest timestamps of the packets
+        :return: None
+        """
+        worker_batches = [([], []) for _ in self.worker_queues]
+
+        for entry, stamp in zip(raw_entries, stamps):
+            key = entry_id(entry)
+            if key is None:
+                index = next(self.worker_counter) % len(worker_batches)
+            else:
+                index = hash(key) % len(worker_batches)
+            worker_batches[index][0].append(entry)
+            worker_batches[index][1].append(stamp)
+
+        for index, worker_batch in enumerate(worker_batches):
+            if len(worker_batch[0]) > 0:
+                if self._put_to_worker(index, worker_batch):
+                    self.worker_sent[index] += len(worker_batch[0])
+                else:
+                    self.metrics.count_errors(len(worker_batch[0]))
+
+    def _put_to_worker(self, index, item):
+        """
+        Put a batch (or the end marker) on a worker's queue, waiting for room as long as the worker is alive
+        :param index: Number of the worker
+        :param item: Item to put on the queue
+        :return: False if the worker has died
+        """
+        worker = self.workers[index]
+        while worker.is_alive():
+            try:
+                self.worker_queues[index].put(item, timeout=WORKER_CHECK_INTERVAL)
+                return True
+            except Full:
+                pass
+
+        return False
+
+    def _collect_loop(self):
+        """
+        Pass formatted batches from the worker processes to the outbox
+        The outbox is closed once every worker has finished, or died.
+        :return: None
+        """
+        running = set(range(len(self.workers)))
+
+        while len(running) > 0:
+            try:
+                index, result = self.results.get(timeout=WORKER_CHECK_INTERVAL)
+            except Empty:
+                self._check_workers(running)
+                continue
+
+            if result is None:
+                running.discard(index)
+            else:
+                formatted_entries, stamps, errors = result
+                self.worker_returned[index] += len(formatted_entries) + errors
+                self._pass_on(formatted_entries, stamps, errors)
+
+        self.outbox.close()
+
+    def _check_workers(self, running):
+        """
+        Give up on any running worker that has died, counting whatever it was sent but didn't return as errors
+        :param running: Set of the numbers of the workers that haven't finished yet
+        :return: None
+        """
+        for index in list(running):
+            worker = self.workers[index]
+            if worker.is_alive():
+                continue
+
+            running.discard(index)
+            lost = self.worker_sent[index] - self.worker_returned[index]
+            self.metrics.count_errors(lost)
+            self.logger.error("Worker [%s] died (exit code %s) - %d entries lost", worker.name, worker.exitcode,
+                              lost)
+
     def _format_loop(self):
         """
         Format incoming entries and pass them on
         JSON entries come in via the inbox queue and formatted entries are placed in the outbox queue
         :return:
         """
-        while self.is_running:
-            # Process away and pass the entry to the out pile
+        while True:
+            # Sleep until there's something to do. An empty batch means the inbox has been closed and drained
+            raw_entries, stamps = self.inbox.get_stamped_batch(self.batch_size)
+            if len(raw_entries) == 0:
+                break
 
-            try:
-                raw_entry = self.inbox.get(block=True, timeout=2)
-                formatted_entry = self.format_entry(raw_entry)
-                self.logger.debug("Formatted entry: [%s]", str(formatted_entry))
-                self.outbox.put(formatted_entry)
+            if self.drain_deadline is not None and _time() >= self.drain_deadline:
+                self.logger.warning("Drain time is up - dropping %d entries", self.inbox.drop_remaining(len(raw_entries)))
+                break
 
-                # Job done; cross it off the inbox to-do list
-                self.inbox.task_done()
+            # Process away and pass the entries to the out pile
+            self.metrics.count_received(len(raw_entries))
+            if len(self.workers) > 0:
+                self._send_to_workers(raw_entries, stamps)
+            else:
+                self._pass_on(*self._format_batch(raw_entries, stamps))
 
-            except:
-                pass
+            # Job done; cross them off the inbox to-do list
+            self.inbox.task_done(len(raw_entries))
+
+        if len(self.workers) > 0:
+            # The collector closes the outbox once the workers have finished what they've been sent
+            for index in range(len(self.worker_queues)):
+                self._put_to_worker(index, None)
+        else:
+            # Nothing more is coming out of this formatter
+            self.outbox.close()
+
+    def _pass_on(self, formatted_entries, stamps, errors):
+        """
+        Put formatted entries in the outbox, along with the ingest timestamps of the entries they came from
+        :param formatted_entries: List of processed packets
+        :param stamps: Ingest timestamps of the packets
+        :param errors: Number of packets in the batch that couldn't be formatted
+        :return: None
+        """
+        self.logger.debug("Formatted %d entries", len(formatted_entries))
+        self.metrics.count_sent(len(formatted_entries))
+        self.metrics.count_errors(errors)
+        self.metrics.record_latency(stamps)
+        self.outbox.put_batch(formatted_entries, stamps=stamps)
+
+    def _format_batch(self, raw_entries, stamps=None):
+        """
+        Format a batch of entries, leaving out any that can't be formatted
+        :param raw_entries: List of incoming packets
+        :param stamps: Ingest timestamps of the packets
+        :return: Tuple of (processed packets, their ingest timestamps, number of packets left out)
+        """
+        if stamps is None:
+            stamps = [None] * len(raw_entries)
+
+        try:
+            return self.format_entries(raw_entries), stamps, 0
+
+        except Exception:
+            # Something in the batch is bad - go entry-by-entry so the rest still get through
+            formatted_entries = []
+            formatted_stamps = []
+            for raw_entry, stamp in zip(raw_entries, stamps):
+                try:
+                    formatted_entries.append(self.format_entry(raw_entry))
+                    formatted_stamps.append(stamp)
+                except Exception:
+                    self.logger.exception("Entry could not be formatted: %s", raw_entry)
+
+            return formatted_entries, formatted_stamps, len(raw_entries) - len(formatted_entries)
 
     def format_entry(self, entry):
         """
@@ -83,6 +353,15 @@ class Formatter(object):
         """
         raise Exception("Method [process_entry] not implemented")
 
+    def format_entries(self, entries):
+        """
+        Transform a batch of incoming entries
+        Child classes can override this if a batch can be formatted more cheaply than entry-by-entry.
+        :param entries: List of incoming packets
+        :return: List of processed packets, in the same order
+        """
+        return [self.format_entry(entry) for entry in entries]
+
     def add_to_inbox(self, entry):
         """
         Manually add an entry to the formatter queue.
@@ -93,14 +372,24 @@ class Formatter(object):
         """
         self.inbox.put(entry)
 
+    def add_batch_to_inbox(self, entries):
+        """
+        Manually add a batch of entries to the formatter queue.
+
+        :param entries: List of JSON entries to be formatted
+        :return:
+        """
+        self.inbox.put_batch(entries)
+
     def set_inbox(self, in_queue):
         """
         Set the incoming packet queue
         :param in_queue: Queue of packets needing to be processed
         :return: None
         """
-        assert isinstance(in_queue, Queue)
+        assert isinstance(in_queue, EntryQueue)
         self.inbox = in_queue
+        self.metrics.queue = in_queue
 
     def set_outbox(self, out_queue):
         """
@@ -108,5 +397,5 @@ class Formatter(object):
         :param out_queue: Queue of packets that have been processed
         :return: None
         """
-        assert isinstance(out_queue, Queue)
+        assert isinstance(out_queue, EntryQueue)
         self.outbox = out_queue
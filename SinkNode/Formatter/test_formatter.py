@@ -0,0 +1,81 @@
+import os
+import pickle
+import logging
+from unittest import TestCase
+from SinkNode.Entry import freeze
+from SinkNode.EntryQueue import EntryQueue
+from SinkNode.Formatter import Formatter
+
+__author__ = 'Leenix'
+
+
+class TagFormatter(Formatter):
+    """
+    Formatter that tags each entry with the process that formatted it
+    """
+    def format_entry(self, entry):
+        return entry["id"], entry["sequence"], os.getpid()
+
+
+class CrashFormatter(TagFormatter):
+    """
+    Formatter whose worker process dies on the first entry from the crashing station
+    """
+    def format_entry(self, entry):
+        if entry["id"] == "crash":
+            os._exit(1)
+        return TagFormatter.format_entry(self, entry)
+
+
+class TestFormatter(TestCase):
+
+    def setUp(self):
+        self.formatter = TagFormatter(outbox=EntryQueue(), logger_level=logging.FATAL, formatter_id="TagFormatter")
+        self.entries = [freeze({"id": "station{}".format(i % 5), "sequence": i}) for i in xrange(500)]
+
+    def run_formatter(self):
+        self.formatter.start()
+        self.formatter.add_batch_to_inbox(self.entries)
+        self.formatter.stop(drain_timeout=None)
+        self.formatter.join()
+
+        formatted = []
+        batch = self.formatter.outbox.get_batch(1000)
+        while len(batch) > 0:
+            formatted.extend(batch)
+            batch = self.formatter.outbox.get_batch(1000)
+        return formatted
+
+    def test_thread_format(self):
+        formatted = self.run_formatter()
+        self.assertEquals([(e["id"], e["sequence"], os.getpid()) for e in self.entries], formatted)
+
+    def test_process_format(self):
+        self.formatter.set_processes(2)
+        formatted = self.run_formatter()
+
+        self.assertEquals(len(self.entries), len(formatted))
+        self.assertNotIn(os.getpid(), set(pid for _, _, pid in formatted))
+
+        # Each id is handled by a single worker and keeps its order
+        for station in set(e["id"] for e in self.entries):
+            station_formatted = [f for f in formatted if f[0] == station]
+            self.assertEquals(1, len(set(pid for _, _, pid in station_formatted)))
+            self.assertEquals(sorted(f[1] for f in station_formatted), [f[1] for f in station_formatted])
+
+    def test_pickle(self):
+        unpickled = pickle.loads(pickle.dumps(self.formatter))
+        self.assertEquals("TagFormatter", unpickled.logger.name)
+        self.assertEquals((u"a", 1, os.getpid()), unpickled.format_entry({"id": u"a", "sequence": 1}))
+
+    def test_dead_worker(self):
+        self.formatter = CrashFormatter(outbox=EntryQueue(), logger_level=logging.FATAL, formatter_id="CrashFormatter")
+        self.formatter.set_processes(2)
+        self.entries.append(freeze({"id": "crash", "sequence": len(self.entries)}))
+
+        # The formatter still finishes, with everything given to the dead worker counted as errors
+        formatted = self.run_formatter()
+        self.assertFalse(self.formatter.collect_thread.is_alive())
+        snapshot = self.formatter.metrics.get_snapshot()
+        self.assertLess(len(formatted), len(self.entries))
+        self.assertEquals(len(self.entries), len(formatted) + snapshot["errors"])
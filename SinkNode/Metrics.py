@@ -0,0 +1,215 @@
+import time
+from threading import Lock
+
+__author__ = 'Leenix'
+
+# Clock used for entry timestamps. Python 2 has no monotonic clock, so fall back to wall time there
+monotonic = getattr(time, "monotonic", time.time)
+
+# Latency histogram buckets - upper bounds (in seconds) doubling from 0.1ms up to about 14 minutes
+LATENCY_BUCKETS = tuple(0.0001 * 2 ** i for i in range(24))
+
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of latencies with fixed, exponentially-sized buckets.
+    Recording is constant time and memory no matter how many entries go through, so it can be left on under load.
+    Percentiles are reported as the upper bound of the bucket they fall in.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, latency):
+        """
+        Add a latency to the histogram
+        :param latency: Latency (in seconds)
+        :return: None
+        """
+        index = 0
+        for bound in self.buckets:
+            if latency <= bound:
+                break
+            index += 1
+
+        self.counts[index] += 1
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def merge(self, other):
+        """
+        Add another histogram's latencies to this one
+        :param other: LatencyHistogram with the same buckets
+        :return: None
+        """
+        assert self.buckets == other.buckets
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """
+        Get the latency that the given percentage of entries came in under
+        :param percent: Percentage, e.g. 99
+        :return: Bucket bound (in seconds), or the maximum for the overflow bucket. None if nothing has been recorded
+        """
+        if self.count == 0:
+            return None
+
+        threshold = self.count * percent / 100.0
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= threshold and bucket_count > 0:
+                if index < len(self.buckets):
+                    return min(self.buckets[index], self.max)
+                break
+
+        return self.max
+
+    def get_summary(self):
+        """
+        Get the headline numbers of the histogram
+        :return: Dictionary of count, mean, max and percentiles (p50, p90, p99), all in seconds
+        """
+        summary = {"count": self.count, "max": self.max, "mean": None}
+        if self.count > 0:
+            summary["mean"] = self.total / self.count
+
+        for percent in PERCENTILES:
+            summary["p{}".format(percent)] = self.percentile(percent)
+
+        return summary
+
+
+class StageMetrics(object):
+    """
+    Counters for one stage of the pipeline (a reader, a formatter, a writer or the dispatcher).
+    Entries in, entries out and errors are counted by the stage itself. Drops and queue depth are read from the
+    stage's queue, if it has one; stages that throw entries away before they get to a queue count those drops too.
+    The latency histogram records how long entries took to get through the stage, measured from when they were read
+    in.
+    """
+
+    def __init__(self, name, queue=None):
+        """
+        :param name: Name of the stage, used when the metrics are dumped
+        :param queue: EntryQueue the stage takes its entries from
+        """
+        self.name = name
+        self.queue = queue
+        self.lock = Lock()
+
+        self.received = 0
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.latency = LatencyHistogram()
+
+    def count_received(self, count=1):
+        self.lock.acquire()
+        try:
+            self.received += count
+        finally:
+            self.lock.release()
+
+    def count_sent(self, count=1):
+        self.lock.acquire()
+        try:
+            self.sent += count
+        finally:
+            self.lock.release()
+
+    def count_errors(self, count=1):
+        self.lock.acquire()
+        try:
+            self.errors += count
+        finally:
+            self.lock.release()
+
+    def count_dropped(self, count=1):
+        self.lock.acquire()
+        try:
+            self.dropped += count
+        finally:
+            self.lock.release()
+
+    def record_latency(self, stamps, now=None):
+        """
+        Record how long entries have taken to get this far
+        :param stamps: Ingest timestamps of the entries (from monotonic). Entries without one (None) are skipped
+        :param now: Time the entries got through the stage. Defaults to the current time
+        :return: None
+        """
+        if now is None:
+            now = monotonic()
+
+        self.lock.acquire()
+        try:
+            for stamp in stamps:
+                if stamp is not None:
+                    self.latency.record(max(0.0, now - stamp))
+        finally:
+            self.lock.release()
+
+    def get_dropped(self):
+        if self.queue is None:
+            return self.dropped
+        return self.dropped + self.queue.dropped
+
+    def get_queue_depth(self):
+        if self.queue is None:
+            return 0
+        return self.queue.qsize()
+
+    def get_snapshot(self):
+        """
+        Get the current values of the stage's counters
+        :return: Dictionary of received, sent, errors, dropped, queue_depth and latency (see LatencyHistogram)
+        """
+        self.lock.acquire()
+        try:
+            return {
+                "received": self.received,
+                "sent": self.sent,
+                "errors": self.errors,
+                "dropped": self.get_dropped(),
+                "queue_depth": self.get_queue_depth(),
+                "latency": self.latency.get_summary(),
+            }
+        finally:
+            self.lock.release()
+
+
+def format_metrics(stages):
+    """
+    Lay out a set of stage snapshots as a text table
+    :param stages: List of (stage name, snapshot) tuples
+    :return: Table as a string, one line per stage
+    """
+    columns = ["stage", "in", "out", "errors", "dropped", "queued", "p50 ms", "p90 ms", "p99 ms", "max ms"]
+    rows = [columns]
+
+    for name, snapshot in stages:
+        latency = snapshot["latency"]
+        row = [name, snapshot["received"], snapshot["sent"], snapshot["errors"], snapshot["dropped"],
+               snapshot["queue_depth"]]
+        for key in ("p50", "p90", "p99", "max"):
+            row.append("-" if latency["count"] == 0 else "{:.1f}".format(latency[key] * 1000))
+        rows.append([str(value) for value in row])
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    lines = []
+    for row in rows:
+        cells = [row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+        lines.append("  ".join(cells))
+
+    return "\n".join(lines)
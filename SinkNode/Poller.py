@@ -0,0 +1,157 @@
+import errno
+import math
+import select
+
+__author__ = 'Leenix'
+
+# Events to watch for on a file descriptor
+READ = 0x01
+WRITE = 0x04
+
+
+class Poller(object):
+    """
+    Waits on many file descriptors at once.
+    Uses epoll where the platform has it, then poll, then plain select, so the same code runs on the gateway boards
+    and on a development machine.
+    """
+
+    def __init__(self):
+        self.events = {}
+
+        if hasattr(select, "epoll"):
+            self.backend = "epoll"
+            self.epoll = select.epoll()
+        elif hasattr(select, "poll"):
+            self.backend = "poll"
+            self.poll_object = select.poll()
+        else:
+            self.backend = "select"
+
+    def register(self, fd, events):
+        """
+        Start watching a file descriptor
+        :param fd: File descriptor (or object with a fileno method)
+        :param events: Bitmask of READ and WRITE
+        :return: None
+        """
+        fd = get_fd(fd)
+        self.events[fd] = events
+
+        if self.backend == "epoll":
+            self.epoll.register(fd, _to_native(events, select.EPOLLIN, select.EPOLLOUT))
+        elif self.backend == "poll":
+            self.poll_object.register(fd, _to_native(events, select.POLLIN, select.POLLOUT))
+
+    def modify(self, fd, events):
+        """
+        Change the events watched on a file descriptor
+        :param fd: File descriptor (or object with a fileno method)
+        :param events: Bitmask of READ and WRITE
+        :return: None
+        """
+        fd = get_fd(fd)
+        self.events[fd] = events
+
+        if self.backend == "epoll":
+            self.epoll.modify(fd, _to_native(events, select.EPOLLIN, select.EPOLLOUT))
+        elif self.backend == "poll":
+            self.poll_object.modify(fd, _to_native(events, select.POLLIN, select.POLLOUT))
+
+    def unregister(self, fd):
+        """
+        Stop watching a file descriptor
+        :param fd: File descriptor (or object with a fileno method)
+        :return: None
+        """
+        fd = get_fd(fd)
+        if self.events.pop(fd, None) is None:
+            return
+
+        try:
+            if self.backend == "epoll":
+                self.epoll.unregister(fd)
+            elif self.backend == "poll":
+                self.poll_object.unregister(fd)
+        except (IOError, OSError, ValueError, KeyError):
+            # Already closed - the kernel has forgotten about it anyway
+            pass
+
+    def poll(self, timeout=None):
+        """
+        Wait for events on the watched file descriptors
+        Errors and hang-ups are reported as both READ and WRITE, so the owner finds out on its next read or write.
+        :param timeout: Maximum time to wait (in seconds). None waits indefinitely
+        :return: List of (fd, events) tuples
+        """
+        try:
+            if self.backend == "epoll":
+                ready = self.epoll.poll(-1 if timeout is None else timeout)
+                return [(fd, _from_native(flags, select.EPOLLIN, select.EPOLLOUT, select.EPOLLERR | select.EPOLLHUP))
+                        for fd, flags in ready]
+
+            if self.backend == "poll":
+                ready = self.poll_object.poll(None if timeout is None else int(math.ceil(timeout * 1000)))
+                return [(fd, _from_native(flags, select.POLLIN, select.POLLOUT,
+                                          select.POLLERR | select.POLLHUP | select.POLLNVAL))
+                        for fd, flags in ready]
+
+            readers = [fd for fd, events in self.events.items() if events & READ]
+            writers = [fd for fd, events in self.events.items() if events & WRITE]
+            readable, writable, failed = select.select(readers, writers, readers + writers, timeout)
+
+            ready = {}
+            for fd in readable:
+                ready[fd] = ready.get(fd, 0) | READ
+            for fd in writable:
+                ready[fd] = ready.get(fd, 0) | WRITE
+            for fd in failed:
+                ready[fd] = READ | WRITE
+            return list(ready.items())
+
+        except (IOError, OSError, select.error) as err:
+            # Interrupted by a signal - nothing is ready
+            if err.args[0] == errno.EINTR:
+                return []
+            raise
+
+    def close(self):
+        """
+        Release the poller
+        :return: None
+        """
+        if self.backend == "epoll":
+            self.epoll.close()
+        self.events.clear()
+
+
+def get_fd(fd):
+    """
+    Get the file descriptor number of a file-like object
+    :param fd: File descriptor or object with a fileno method
+    :return: File descriptor number
+    """
+    if hasattr(fd, "fileno"):
+        return fd.fileno()
+    return fd
+
+
+def _to_native(events, read_flag, write_flag):
+    flags = 0
+    if events & READ:
+        flags |= read_flag
+    if events & WRITE:
+        flags |= write_flag
+    return flags
+
+
+def _from_native(flags, read_flag, write_flag, error_flags):
+    if flags & error_flags:
+        return READ | WRITE
+
+    events = 0
+    if flags & read_flag:
+        events |= READ
+    if flags & write_flag:
+        events |= WRITE
+    return events
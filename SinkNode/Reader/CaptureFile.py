@@ -0,0 +1,189 @@
+import mmap
+import struct
+
+__author__ = 'Leenix'
+
+# Link types of the captured frames
+LINKTYPE_IEEE802_11 = 105
+LINKTYPE_IEEE802_11_RADIOTAP = 127
+
+# pcap file magic numbers, as read little-endian - microsecond and nanosecond timestamps, in either byte order
+PCAP_MAGIC = {0xa1b2c3d4: ("<", 1e-6), 0xd4c3b2a1: (">", 1e-6), 0xa1b23c4d: ("<", 1e-9), 0x4d3cb2a1: (">", 1e-9)}
+PCAP_HEADER_SIZE = 24
+PCAP_RECORD_SIZE = 16
+
+# pcapng block types
+SECTION_HEADER_BLOCK = 0x0a0d0d0a
+INTERFACE_DESCRIPTION_BLOCK = 1
+PACKET_BLOCK = 2
+SIMPLE_PACKET_BLOCK = 3
+ENHANCED_PACKET_BLOCK = 6
+BYTE_ORDER_MAGIC = 0x1a2b3c4d
+
+# pcapng interface option holding the timestamp resolution
+IF_TSRESOL = 9
+DEFAULT_RESOLUTION = 1e-6
+
+
+class CaptureFileError(Exception):
+    pass
+
+
+def read_capture(path):
+    """
+    Read the frames in a .pcap or .pcapng capture file, in order
+    The file is memory-mapped and read as it's iterated, so captures of any size can be read without loading them.
+    :param path: Capture file
+    :return: Generator of (timestamp, link type, frame) tuples. Timestamps are Unix time in seconds, or None for
+    pcapng simple packets, which don't have one
+    """
+    with open(path, "rb") as capture_file:
+        try:
+            data = mmap.mmap(capture_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file - nothing to map
+            return
+
+    try:
+        if len(data) < 4:
+            raise CaptureFileError("{} is too short to be a capture file".format(path))
+
+        magic = struct.unpack_from("<I", data)[0]
+        if magic in PCAP_MAGIC:
+            frames = _read_pcap(data, *PCAP_MAGIC[magic])
+        elif magic == SECTION_HEADER_BLOCK:
+            frames = _read_pcapng(data)
+        else:
+            raise CaptureFileError("{} isn't a pcap or pcapng file".format(path))
+
+        for frame in frames:
+            yield frame
+    finally:
+        data.close()
+
+
+def _read_pcap(data, byte_order, resolution):
+    """
+    Read the frames in a pcap file
+    :param data: Memory-mapped file
+    :param byte_order: struct byte order of the file
+    :param resolution: Size of a timestamp fraction (in seconds)
+    :return: Generator of (timestamp, link type, frame) tuples
+    """
+    linktype = struct.unpack_from(byte_order + "I", data, 20)[0]
+    record = struct.Struct(byte_order + "IIII")
+
+    position = PCAP_HEADER_SIZE
+    end = len(data)
+
+    while position + PCAP_RECORD_SIZE <= end:
+        seconds, fraction, captured_length, _ = record.unpack_from(data, position)
+        position += PCAP_RECORD_SIZE
+
+        if position + captured_length > end:
+            # Capture was cut off part way through a frame
+            break
+
+        yield seconds + fraction * resolution, linktype, data[position:position + captured_length]
+        position += captured_length
+
+
+def _read_pcapng(data):
+    """
+    Read the frames in a pcapng file, across all of its sections and interfaces
+    :param data: Memory-mapped file
+    :return: Generator of (timestamp, link type, frame) tuples
+    """
+    byte_order = "<"
+    interfaces = []
+
+    position = 0
+    end = len(data)
+
+    while position + 12 <= end:
+        block_type = struct.unpack_from(byte_order + "I", data, position)[0]
+
+        if block_type == SECTION_HEADER_BLOCK:
+            # Each section sets its own byte order and starts its own list of interfaces
+            if struct.unpack_from("<I", data, position + 8)[0] == BYTE_ORDER_MAGIC:
+                byte_order = "<"
+            else:
+                byte_order = ">"
+            interfaces = []
+
+        block_length = struct.unpack_from(byte_order + "I", data, position + 4)[0]
+        if block_length < 12 or position + block_length > end:
+            break
+
+        body = position + 8
+
+        if block_type == INTERFACE_DESCRIPTION_BLOCK:
+            linktype = struct.unpack_from(byte_order + "H", data, body)[0]
+            resolution = _get_resolution(data, byte_order, body + 8, position + block_length - 4)
+            interfaces.append((linktype, resolution))
+
+        elif block_type == ENHANCED_PACKET_BLOCK:
+            interface, high, low, captured_length = struct.unpack_from(byte_order + "IIII", data, body)
+            linktype, resolution = interfaces[interface]
+            yield ((high << 32) | low) * resolution, linktype, data[body + 20:body + 20 + captured_length]
+
+        elif block_type == SIMPLE_PACKET_BLOCK:
+            captured_length = min(struct.unpack_from(byte_order + "I", data, body)[0], block_length - 16)
+            yield None, interfaces[0][0], data[body + 4:body + 4 + captured_length]
+
+        elif block_type == PACKET_BLOCK:
+            interface, _, high, low, captured_length = struct.unpack_from(byte_order + "HHIII", data, body)
+            linktype, resolution = interfaces[interface]
+            yield ((high << 32) | low) * resolution, linktype, data[body + 20:body + 20 + captured_length]
+
+        position += block_length
+
+
+def _get_resolution(data, byte_order, position, end):
+    """
+    Find the timestamp resolution in an interface description block's options
+    :param data: Memory-mapped file
+    :param byte_order: struct byte order of the section
+    :param position: Start of the options
+    :param end: End of the options
+    :return: Size of a timestamp unit (in seconds)
+    """
+    while position + 4 <= end:
+        code, length = struct.unpack_from(byte_order + "HH", data, position)
+        if code == 0:
+            break
+
+        if code == IF_TSRESOL and length >= 1:
+            value = ord(data[position + 4])
+            if value & 0x80:
+                return 2.0 ** -(value & 0x7f)
+            return 10.0 ** -value
+
+        # Options are padded to 32 bits
+        position += 4 + (length + 3) // 4 * 4
+
+    return DEFAULT_RESOLUTION
+
+
+def write_pcap(path, packets, linktype=LINKTYPE_IEEE802_11_RADIOTAP, snap_length=65535):
+    """
+    Write frames to a pcap file, e.g. to make captures for tests and benchmarks
+    :param path: File to write
+    :param packets: Iterable of (timestamp, frame) tuples. Timestamps are Unix time in seconds
+    :param linktype: Link type of the frames
+    :param snap_length: Longest frame the capture says it could hold
+    :return: Number of frames written
+    """
+    record = struct.Struct("<IIII")
+    count = 0
+
+    with open(path, "wb") as capture_file:
+        capture_file.write(struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, snap_length, linktype))
+
+        for timestamp, frame in packets:
+            seconds = int(timestamp)
+            capture_file.write(record.pack(seconds, int(round((timestamp - seconds) * 1e6)), len(frame), len(frame)))
+            capture_file.write(frame)
+            count += 1
+
+    return count
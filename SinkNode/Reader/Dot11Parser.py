@@ -0,0 +1,139 @@
+import binascii
+import ctypes
+import socket
+import struct
+
+__author__ = 'Leenix'
+
+# 802.11 management frame subtypes that identify devices
+PROBE_REQUEST_SUBTYPE = 4
+PROBE_RESPONSE_SUBTYPE = 5
+SSID_BEACON_FRAME = 8
+
+MANAGEMENT_TYPE = 0
+SSID_ELEMENT = 0
+
+# Capture filter for the frames above, for capture tools that take a pcap filter expression
+CAPTURE_FILTER = "type mgt and (subtype probe-req or subtype probe-resp or subtype beacon)"
+
+# Most bytes of a frame handed over by the kernel. Management frames are well under this
+SNAP_LENGTH = 4096
+
+# The same filter as a classic BPF program for radiotap-headed frames - [(code, jump if true, jump if false, k)].
+# The kernel runs it on every frame before it's copied to the capture socket, so nothing else wakes the reader
+# up. Written out by hand so capturing doesn't need libpcap or tcpdump to compile it.
+MANAGEMENT_FILTER = [
+    (0x30, 0, 0, 0x00000003),   # ldb [3]           radiotap header length (little-endian)...
+    (0x64, 0, 0, 0x00000008),   # lsh #8
+    (0x07, 0, 0, 0x00000000),   # tax
+    (0x30, 0, 0, 0x00000002),   # ldb [2]
+    (0x4c, 0, 0, 0x00000000),   # or x
+    (0x07, 0, 0, 0x00000000),   # tax               ...is where the 802.11 header starts
+    (0x50, 0, 0, 0x00000000),   # ldb [x + 0]       frame control: subtype, type, version
+    (0x54, 0, 0, 0x000000fc),   # and #0xfc         ignore the protocol version
+    (0x15, 3, 0, 0x00000040),   # jeq #0x40         management, probe request
+    (0x15, 2, 0, 0x00000050),   # jeq #0x50         management, probe response
+    (0x15, 1, 0, 0x00000080),   # jeq #0x80         management, beacon
+    (0x06, 0, 0, 0x00000000),   # ret #0            drop
+    (0x06, 0, 0, SNAP_LENGTH),  # ret #SNAP_LENGTH  keep
+]
+
+# Linux socket option for attaching a BPF program (not exposed by the socket module)
+SO_ATTACH_FILTER = 26
+
+# Capture every protocol on a packet socket
+ETH_P_ALL = 0x0003
+
+RADIOTAP_HEADER = struct.Struct("<BxH")
+MAC_HEADER_SIZE = 24
+
+# Radiotap header with no fields, for frames captured without one
+EMPTY_RADIOTAP_HEADER = RADIOTAP_HEADER.pack(0, 8) + "\x00" * 4
+
+# Management frame bodies that start with fixed fields (timestamp, beacon interval, capabilities) before the
+# tagged elements
+FIXED_FIELDS_SIZE = {PROBE_RESPONSE_SUBTYPE: 12, SSID_BEACON_FRAME: 12}
+
+
+def parse_frame(frame):
+    """
+    Pull the fields the device scan needs out of a radiotap-headed 802.11 frame
+    Only the bytes needed are looked at; nothing else in the frame is decoded.
+    :param frame: Raw captured frame, starting with the radiotap header
+    :return: Tuple of (subtype, addr1, addr2, ssid) with the addresses as 6-byte strings and the SSID as a string or
+    None, or None if the frame isn't a management frame
+    """
+    if len(frame) < RADIOTAP_HEADER.size:
+        return None
+
+    version, radiotap_length = RADIOTAP_HEADER.unpack_from(frame)
+    if version != 0 or len(frame) < radiotap_length + MAC_HEADER_SIZE:
+        return None
+
+    frame_control = ord(frame[radiotap_length])
+    if (frame_control >> 2) & 0x03 != MANAGEMENT_TYPE:
+        return None
+
+    subtype = frame_control >> 4
+    addr1 = frame[radiotap_length + 4:radiotap_length + 10]
+    addr2 = frame[radiotap_length + 10:radiotap_length + 16]
+
+    # Walk the tagged elements for the SSID - it's almost always the first one
+    ssid = None
+    position = radiotap_length + MAC_HEADER_SIZE + FIXED_FIELDS_SIZE.get(subtype, 0)
+    end = len(frame)
+
+    while position + 2 <= end:
+        element_id = ord(frame[position])
+        length = ord(frame[position + 1])
+        if element_id == SSID_ELEMENT:
+            ssid = frame[position + 2:position + 2 + length]
+            break
+        position += 2 + length
+
+    return subtype, addr1, addr2, ssid
+
+
+def format_mac(address):
+    """
+    Format a raw MAC address the same way netaddr does, e.g. "00-1C-B3-09-85-15"
+    :param address: 6-byte address
+    :return: Formatted address
+    """
+    digits = binascii.hexlify(address).upper()
+    return "-".join([digits[0:2], digits[2:4], digits[4:6], digits[6:8], digits[8:10], digits[10:12]])
+
+
+def attach_filter(sock, program=MANAGEMENT_FILTER):
+    """
+    Attach a classic BPF program to a socket, so the kernel drops unwanted packets before they're queued on it
+    :param sock: Socket to filter
+    :param program: List of (code, jump if true, jump if false, k) instructions
+    :return: None
+    """
+    instructions = "".join(struct.pack("HBBI", code, jt, jf, k) for code, jt, jf, k in program)
+    buffer = ctypes.create_string_buffer(instructions, len(instructions))
+
+    # struct sock_fprog - the kernel copies the program, so the buffer only has to outlive the call
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, struct.pack("HL", len(program), ctypes.addressof(buffer)))
+
+
+def open_capture_socket(interface, timeout=None, program=MANAGEMENT_FILTER):
+    """
+    Open a filtered packet socket on a monitor-mode interface (Linux only)
+    :param interface: Interface to capture on
+    :param timeout: Longest a receive waits (in seconds). None waits indefinitely
+    :param program: BPF program to attach, or None to capture everything
+    :return: Socket that receives raw radiotap-headed frames
+    """
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+    try:
+        if program is not None:
+            attach_filter(sock, program)
+        sock.bind((interface, ETH_P_ALL))
+        sock.settimeout(timeout)
+    except Exception:
+        sock.close()
+        raise
+
+    return sock
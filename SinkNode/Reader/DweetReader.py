@@ -1,39 +1,626 @@
-from SinkNode.Reader import *
-import dweepy
-from requests import ConnectionError
+import errno
+import logging
+import random
+import socket
+import ssl
+import urllib
+import urlparse
+from threading import Thread
+from SinkNode.Reader import Reader, LOGGER_FORMAT
+from SinkNode.Reader.FrameBuffer import FrameBuffer
+from SinkNode.Metrics import monotonic
+from SinkNode.Poller import Poller, READ, WRITE
+
+__author__ = 'Leenix'
+
+# Dweet streams are requested from here, followed by the thing name
+SERVER_ADDRESS = "https://dweet.io/listen/for/dweets/from/"
+
+# Longest the read thread waits for data before checking whether it has been stopped (in seconds)
+POLL_TIMEOUT = 0.5
+
+RECEIVE_SIZE = 65536
+
+# Time allowed to connect and get the response headers back (in seconds)
+CONNECT_TIMEOUT = 10
+
+# How long the server's address is used before it's looked up again (in seconds)
+ADDRESS_TTL = 300.0
+
+# Longest the read thread waits between checks on a server lookup (in seconds)
+LOOKUP_POLL_TIMEOUT = 0.05
+
+# Longest a stream can go quiet before it's assumed to be dead and reconnected (in seconds)
+STREAM_TIMEOUT = 300
+
+# Delay before the first reconnect after a failure, and the most it can grow to (in seconds)
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+# Longest response head that will be buffered (in bytes)
+MAX_HEADER_SIZE = 65536
+
+# Most streaming connections open at once. dweet.io streams one thing per connection, so things beyond this take
+# turns at the connections
+MAX_CONNECTIONS = 64
+
+# Shortest turn a stream gets at a connection before making way for a thing that's waiting for one (in seconds)
+ROTATE_INTERVAL = 60.0
+
+
+class StreamError(Exception):
+    pass
+
+
+def backoff_delay(failures, retry_delay=RETRY_DELAY, max_retry_delay=MAX_RETRY_DELAY):
+    """
+    Work out how long to wait before reconnecting
+    The delay doubles with each failure in a row, up to the limit. Half of it is random, so streams that dropped at
+    the same time (e.g. when the network went down) don't all come back at the same time.
+    :param failures: Number of failures in a row, counting the latest one
+    :param retry_delay: Delay after the first failure (in seconds)
+    :param max_retry_delay: Most the delay can grow to (in seconds)
+    :return: Time to wait (in seconds)
+    """
+    delay = float(min(max_retry_delay, retry_delay * 2 ** min(failures - 1, 32)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class DweetStream(object):
+    """
+    Streaming connection for one thing.
+    Sends the listen request and cuts the response into lines as it arrives. Chunked responses are decoded; any other
+    response is read until the server closes the connection. With an SSL context, the TLS handshake is done without
+    blocking once the connection is up.
+    """
+
+    def __init__(self, thing, host, port, path, ssl_context=None):
+        """
+        :param thing: Thing name being listened to
+        :param host: Server name
+        :param port: Server port
+        :param path: Request path for the thing's stream
+        :param ssl_context: ssl.SSLContext to stream over TLS with. None streams over plain HTTP
+        """
+        self.thing = thing
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+
+        default_port = 80 if ssl_context is None else 443
+        host_header = host if port == default_port else "{}:{}".format(host, port)
+        self.request = "GET {} HTTP/1.1\r\nHost: {}\r\nAccept: application/json\r\nConnection: close\r\n\r\n".format(
+            path, host_header)
+
+        self.sock = None
+        self.connecting = False
+        self.handshaking = False
+        self.outgoing = ""
+        self.head = None
+        self.chunked = False
+        self.chunk_buffer = ""
+        self.chunk_left = 0
+        self.skip = 0
+        self.lines = FrameBuffer(None, '\n')
+
+        # Failed connections in a row, when the next connection is due, and when the current one is given up on
+        self.failures = 0
+        self.retry_time = 0.0
+        self.deadline = None
+
+        # When the current connection was started
+        self.connect_time = None
+
+        # Dweets received over the current connection
+        self.received = 0
+
+    def connect(self, now, address_info):
+        """
+        Start connecting without blocking
+        :param now: Current time, as from monotonic()
+        :param address_info: Server address, as one of the tuples from socket.getaddrinfo
+        :return: Socket being connected
+        """
+        family, sock_type, protocol, _, address = address_info
+
+        sock = socket.socket(family, sock_type, protocol)
+        sock.setblocking(0)
+
+        result = sock.connect_ex(address)
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            sock.close()
+            raise socket.error(result, errno.errorcode.get(result, "connect failed"))
+
+        self.sock = sock
+        self.connecting = True
+        self.handshaking = False
+        self.outgoing = self.request
+        self.head = ""
+        self.chunked = False
+        self.chunk_buffer = ""
+        self.chunk_left = 0
+        self.skip = 0
+        self.lines.clear()
+        self.received = 0
+        self.deadline = now + CONNECT_TIMEOUT
+        self.connect_time = now
+
+        return sock
+
+    def send(self):
+        """
+        Finish connecting, and send as much of the request as the socket will take
+        :return: Events to wait for next - WRITE while there's more to send, READ once the request has gone (or while
+        the TLS handshake is waiting for the server)
+        """
+        if self.connecting:
+            error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error != 0:
+                raise socket.error(error, errno.errorcode.get(error, "connect failed"))
+
+            self.connecting = False
+            if self.ssl_context is not None:
+                self.sock = self.ssl_context.wrap_socket(self.sock, server_hostname=self.host,
+                                                         do_handshake_on_connect=False)
+                self.handshaking = True
+
+        try:
+            if self.handshaking:
+                self.sock.do_handshake()
+                self.handshaking = False
+
+            sent = self.sock.send(self.outgoing)
+        except ssl.SSLWantReadError:
+            return READ
+        except ssl.SSLWantWriteError:
+            return WRITE
+
+        self.outgoing = self.outgoing[sent:]
+        return WRITE if self.outgoing else READ
+
+    def receive(self):
+        """
+        Read whatever has arrived
+        :return: Bytes read, an empty string once the server has closed the connection, or None if nothing has come
+        through yet
+        """
+        try:
+            data = self.sock.recv(RECEIVE_SIZE)
+            if self.ssl_context is not None:
+                # Data already decrypted by the SSL layer doesn't wake the poller, so it's all taken now
+                while len(data) > 0 and self.sock.pending() > 0:
+                    data += self.sock.recv(RECEIVE_SIZE)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return None
+
+        return data
+
+    def feed(self, data):
+        """
+        Take in data read from the socket
+        :param data: Bytes read
+        :return: List of complete lines of the response body
+        """
+        if self.head is not None:
+            self.head += data
+            end = self.head.find("\r\n\r\n")
+            if end < 0:
+                if len(self.head) > MAX_HEADER_SIZE:
+                    raise StreamError("Response headers are too long")
+                return []
+
+            head, data = self.head[:end], self.head[end + 4:]
+            self.head = None
+            self._read_head(head)
+
+        if self.chunked:
+            data = self._dechunk(data)
+
+        return [line.rstrip("\r") for line in self.lines.feed(data)]
+
+    def _read_head(self, head):
+        """
+        Check the response status and find out how the body is sent
+        :param head: Status line and headers
+        :return: None
+        """
+        lines = head.split("\r\n")
+        try:
+            status = int(lines[0].split(" ", 2)[1])
+        except (IndexError, ValueError):
+            raise StreamError("Bad response: {}".format(lines[0][:80]))
+
+        if status != 200:
+            raise StreamError("Server responded with HTTP {}".format(status))
+
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "transfer-encoding" and "chunked" in value.lower():
+                self.chunked = True
+
+    def _dechunk(self, data):
+        """
+        Strip the chunked transfer encoding from the body
+        :param data: Bytes read
+        :return: Body bytes
+        """
+        buffer = self.chunk_buffer + data
+        body = []
+
+        while len(buffer) > 0:
+            if self.chunk_left > 0:
+                piece = buffer[:self.chunk_left]
+                body.append(piece)
+                buffer = buffer[len(piece):]
+                self.chunk_left -= len(piece)
+                if self.chunk_left == 0:
+                    # Each chunk is followed by a line break
+                    self.skip = 2
+                continue
+
+            if self.skip > 0:
+                skipped = min(self.skip, len(buffer))
+                buffer = buffer[skipped:]
+                self.skip -= skipped
+                continue
+
+            end = buffer.find("\r\n")
+            if end < 0:
+                break
+
+            try:
+                size = int(buffer[:end].split(";", 1)[0], 16)
+            except ValueError:
+                raise StreamError("Bad chunk size: {}".format(buffer[:end][:80]))
+
+            buffer = buffer[end + 2:]
+            if size == 0:
+                # Last chunk - the server closes the connection from here
+                buffer = ""
+                break
+            self.chunk_left = size
+
+        self.chunk_buffer = buffer
+        return "".join(body)
+
+    def close(self):
+        """
+        Close the connection
+        :return: Unfinished line left at the end of the body, or None
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+        self.deadline = None
+        last_line = self.lines.flush()
+        return last_line.rstrip("\r") if last_line else None
 
 
 class DweetReader(Reader):
-    def __init__(self, thing_name=None, outbox=None, logger_level=logging.FATAL, logger_format=LOGGER_FORMAT, reader_name="DweetReader"):
-        super(DweetReader, self).__init__(outbox=outbox, logger_level=logger_level, logger_format=logger_format, reader_id=reader_name)
+    """
+    Streams dweets for any number of things.
+    dweet.io streams one thing per request, so every thing needs a streaming connection of its own. At most
+    max_connections of them are open at once, all read by the read thread itself, only when data has arrived. When
+    there are more things than that, they take turns: once a stream has been open for rotate_interval, it makes way
+    for a thing that's waiting. Dweets for a thing that's waiting for its turn are missed. Each dweet's content is
+    decoded once as it comes off the stream and handed on as it is, in batches.
+
+    Connections that fail or get dropped are reconnected, backing off exponentially with some jitter while they keep
+    failing (see backoff_delay). Streams that end after delivering dweets are reconnected straight away.
+
+    Streams go over TLS for https server addresses (dweet.io's included), with the certificate checked against the
+    system's trusted authorities unless an SSL context is given.
+    """
+
+    def __init__(self, thing_name=None, outbox=None, logger_level=logging.FATAL, logger_format=LOGGER_FORMAT,
+                 reader_name="DweetReader", server_address=SERVER_ADDRESS, retry_delay=RETRY_DELAY,
+                 max_retry_delay=MAX_RETRY_DELAY, stream_timeout=STREAM_TIMEOUT, thing_key=None,
+                 max_connections=MAX_CONNECTIONS, rotate_interval=ROTATE_INTERVAL, ssl_context=None):
+        """
+        :param thing_name: Thing name, or list of thing names, to listen to
+        :param server_address: URL the thing names are added to for their streams
+        :param retry_delay: Delay before reconnecting after the first failure (in seconds)
+        :param max_retry_delay: Most the reconnect delay can grow to (in seconds)
+        :param stream_timeout: Longest a stream can go quiet before it's reconnected (in seconds)
+        :param thing_key: Key each entry's thing name is stored under. None leaves entries as they were dweeted
+        :param max_connections: Most streaming connections open at once
+        :param rotate_interval: Shortest time a stream stays connected before making way for a waiting thing (in
+        seconds)
+        :param ssl_context: ssl.SSLContext used for https server addresses. None uses the default context, which checks
+        the server's certificate
+        """
+        super(DweetReader, self).__init__(outbox=outbox, logger_level=logger_level, logger_format=logger_format,
+                                          reader_id=reader_name)
+
+        if thing_name is None:
+            raise ValueError("No thing names to listen to")
+        if isinstance(thing_name, basestring):
+            thing_name = [thing_name]
+        if max_connections < 1:
+            raise ValueError("At least one connection is needed")
+
+        url = urlparse.urlsplit(server_address)
+        if url.scheme == "https":
+            if ssl_context is None:
+                ssl_context = ssl.create_default_context()
+            default_port = 443
+        elif url.scheme == "http":
+            ssl_context = None
+            default_port = 80
+        else:
+            raise ValueError("Dweets can only be streamed over HTTP or HTTPS: {}".format(server_address))
+
         self.thing_name = thing_name
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.stream_timeout = stream_timeout
+        self.thing_key = thing_key
+        self.max_connections = max_connections
+        self.rotate_interval = rotate_interval
+
+        self.host = url.hostname
+        self.port = url.port or default_port
+        self.streams = [DweetStream(thing, self.host, self.port, url.path + urllib.quote(thing), ssl_context)
+                        for thing in thing_name]
+
+        # Every stream goes to the same server. Its address is looked up on a thread of its own, so a slow lookup
+        # doesn't hold up the streams that are already connected
+        self.address = None
+        self.address_expiry = 0
+        self.lookup_thread = None
+        self.lookup_error = None
+
+        self.poller = Poller()
+
+        # Streams with an open connection, keyed by file descriptor, and the streams without one, in the order they
+        # get a connection in
+        self.connections = {}
+        self.idle = list(self.streams)
+
+    def _read_loop(self):
+        super(DweetReader, self)._read_loop()
 
-        self.listener_thread = Thread(target=self.listener_loop)
-        self.listener_thread.setDaemon(True)
+        # Connections are only touched by the read thread, so it's the one to close them
+        for fd in self.connections.keys():
+            self._disconnect(fd)
+        self.poller.close()
 
-        self.dweet_queue = Queue()
+    def read_entries(self):
+        """
+        Wait for dweets on any of the streams, reconnecting the streams that are due
+        :return: List of dweet contents
+        """
+        now = monotonic()
+        timeout = POLL_TIMEOUT
 
-    def start(self):
-        self.listener_thread.start()
-        super(DweetReader, self).start()
+        for fd, stream in self.connections.items():
+            if stream.deadline < now:
+                self.logger.warning("Stream for [%s] timed out", stream.thing)
+                self._fail(fd, now)
 
-    def read_entry(self):
-        raw_dweet = self.dweet_queue.get()
-        self.dweet_queue.task_done()
+        lookup_error, self.lookup_error = self.lookup_error, None
+        if lookup_error is not None and self.address is None:
+            # Nothing to connect to - the streams that were waiting to connect back off as if they'd failed
+            self.logger.warning("Server [%s] could not be looked up: %s", self.host, lookup_error)
+            for stream in self.idle:
+                if stream.retry_time <= now:
+                    self._schedule_retry(stream, now)
 
-        self.logger.debug("Raw Dweet: {}".format(raw_dweet))
+        idle = self.idle
+        self.idle = []
+        waiting = 0
 
-        entry = json.dumps(raw_dweet["content"])
+        for stream in idle:
+            if stream.retry_time > now:
+                timeout = min(timeout, stream.retry_time - now)
+            elif len(self.connections) < self.max_connections:
+                address = self._get_address(now)
+                if address is None:
+                    timeout = min(timeout, LOOKUP_POLL_TIMEOUT)
+                elif self._connect(stream, now, address):
+                    continue
+                else:
+                    timeout = min(timeout, stream.retry_time - now)
+            else:
+                waiting += 1
+            self.idle.append(stream)
 
-        return entry
+        if waiting > 0:
+            timeout = min(timeout, self._rotate(waiting, now))
+
+        entries = []
+
+        for fd, events in self.poller.poll(max(timeout, 0)):
+            stream = self.connections.get(fd)
+            if stream is None:
+                continue
 
-    def listener_loop(self):
-        self.logger.debug("Starting listener thread")
-        while self.is_running:
             try:
-                for dweet in dweepy.listen_for_dweets_from(thing_name=self.thing_name):
-                    self.dweet_queue.put(dweet)
+                if stream.outgoing:
+                    self.poller.modify(fd, stream.send())
+                    continue
+
+                data = stream.receive()
+                if data is None:
+                    continue
+                if len(data) == 0:
+                    self._end_stream(fd, entries)
+                    continue
+
+                lines = stream.feed(data)
+
+            except socket.error as err:
+                if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    continue
+                self.logger.warning("Stream for [%s] failed: %s", stream.thing, err)
+                self._fail(fd, monotonic())
+                continue
+
+            except (StreamError, ssl.CertificateError) as err:
+                self.logger.warning("Stream for [%s] failed: %s", stream.thing, err)
+                self._fail(fd, monotonic())
+                continue
+
+            stream.deadline = monotonic() + self.stream_timeout
+            for line in lines:
+                self._add_dweet(stream, line, entries)
+
+        return entries
+
+    def convert_entries(self, raw_entries):
+        """
+        Dweets are decoded as they come off the stream, so there's nothing left to convert
+        :param raw_entries: List of dweet contents
+        :return: The same list
+        """
+        return raw_entries
+
+    def decode_dweet(self, line):
+        """
+        Decode a line of a dweet stream
+        dweet.io sends each dweet as a JSON string holding the JSON-encoded dweet; plain JSON dweets are taken too.
+        :param line: Line of the stream
+        :return: Dweet dictionary, or None if the line isn't a dweet
+        """
+        try:
+            dweet = self.decoder.loads(line)
+            if isinstance(dweet, basestring):
+                dweet = self.decoder.loads(dweet)
+        except (ValueError, TypeError):
+            return None
+
+        if not isinstance(dweet, dict):
+            return None
+        return dweet
+
+    def _add_dweet(self, stream, line, entries):
+        if len(line) == 0:
+            return
+
+        dweet = self.decode_dweet(line)
+        content = dweet.get("content") if dweet is not None else None
+
+        if not isinstance(content, dict):
+            self.logger.warning("Not a dweet: %s", line)
+            # Counted as an error by the read loop
+            entries.append(None)
+            return
+
+        stream.received += 1
+        stream.failures = 0
+        if self.thing_key is not None:
+            content[self.thing_key] = stream.thing
+        entries.append(content)
+
+    def _get_address(self, now):
+        """
+        Get the server's address without blocking
+        The address is kept for ADDRESS_TTL, then looked up again in the background; the old one is used until the
+        new one comes in.
+        :param now: Current time, as from monotonic()
+        :return: Address tuple (see socket.getaddrinfo), or None until the server has been looked up
+        """
+        if now >= self.address_expiry and self.lookup_thread is None:
+            self.lookup_thread = Thread(name="DweetLookup", target=self._look_up_address)
+            self.lookup_thread.setDaemon(True)
+            self.lookup_thread.start()
+
+        return self.address
+
+    def _look_up_address(self):
+        try:
+            self.address = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0]
+            self.address_expiry = monotonic() + ADDRESS_TTL
+        except socket.error as err:
+            # Tried again once the first reconnect delay is up. Until then, any old address is kept on
+            self.address_expiry = monotonic() + self.retry_delay
+            self.lookup_error = err
+        finally:
+            self.lookup_thread = None
+
+    def _connect(self, stream, now, address):
+        """
+        Start connecting a stream
+        :param stream: DweetStream without a connection
+        :param now: Current time, as from monotonic()
+        :param address: Server address (see _get_address)
+        :return: True if the stream is connecting; otherwise its retry has been scheduled
+        """
+        try:
+            sock = stream.connect(now, address)
+        except socket.error as err:
+            self.logger.warning("Stream for [%s] could not connect: %s", stream.thing, err)
+            self._schedule_retry(stream, now)
+            return False
+
+        self.connections[sock.fileno()] = stream
+        self.poller.register(sock, WRITE)
+        self.logger.debug("Connecting stream for [%s]", stream.thing)
+        return True
+
+    def _rotate(self, waiting, now):
+        """
+        Close streams that have had their turn, so things waiting for a connection can have one
+        Streams that have been connected the longest go first. They're reconnected as soon as a connection is free.
+        :param waiting: Number of things waiting for a connection
+        :param now: Current time, as from monotonic()
+        :return: Time until the next stream's turn is up (in seconds), or 0 if connections have been freed
+        """
+        streams = sorted(self.connections.items(), key=lambda item: item[1].connect_time)
+        timeout = POLL_TIMEOUT
+
+        for fd, stream in streams[:waiting]:
+            turn_left = stream.connect_time + self.rotate_interval - now
+            if turn_left > 0:
+                return min(timeout, turn_left)
+
+            self.logger.debug("Stream for [%s] is making way for a waiting thing", stream.thing)
+            self._disconnect(fd)
+            stream.retry_time = now
+            timeout = 0
+
+        return timeout
+
+    def _end_stream(self, fd, entries):
+        """
+        Deal with the server closing a stream
+        Streams that delivered dweets are reconnected straight away; anything else counts as a failure.
+        :param fd: File descriptor of the stream
+        :param entries: List the stream's unfinished last line is added to
+        :return: None
+        """
+        stream = self.connections[fd]
+        last_line = self._disconnect(fd)
+        if last_line:
+            self._add_dweet(stream, last_line, entries)
+
+        now = monotonic()
+        if stream.received > 0:
+            self.logger.info("Stream for [%s] ended - reconnecting", stream.thing)
+            stream.retry_time = now
+        else:
+            self.logger.warning("Stream for [%s] ended without any dweets", stream.thing)
+            self._schedule_retry(stream, now)
+
+    def _fail(self, fd, now):
+        stream = self.connections[fd]
+        self._disconnect(fd)
+        self._schedule_retry(stream, now)
 
-            except ConnectionError:
-                self.logger.debug("Listener timed out. Restarting...")
+    def _schedule_retry(self, stream, now):
+        stream.failures += 1
+        delay = backoff_delay(stream.failures, self.retry_delay, self.max_retry_delay)
+        stream.retry_time = now + delay
+        self.logger.info("Reconnecting stream for [%s] in %.1f seconds", stream.thing, delay)
 
+    def _disconnect(self, fd):
+        """
+        Stop reading a stream and close its connection
+        :param fd: File descriptor of the stream
+        :return: Unfinished line left at the end of the body, or None
+        """
+        stream = self.connections.pop(fd)
+        self.poller.unregister(fd)
+        self.idle.append(stream)
+        return stream.close()
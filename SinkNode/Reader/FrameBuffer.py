@@ -0,0 +1,142 @@
+__author__ = 'Leenix'
+
+# Longest frame that will be buffered (in bytes). Anything longer is assumed to be line noise and thrown away
+MAX_FRAME_SIZE = 65536
+
+
+class FrameBuffer(object):
+    """
+    Cuts a byte stream into frames.
+    Data is fed in as it arrives, in chunks of any size, and every frame completed by a chunk is handed back. Frames
+    are bounded by a start and a stop delimiter (neither is included in the frame); without a start delimiter, a
+    frame is everything up to the next stop delimiter. Anything between a stop delimiter and the next start
+    delimiter is skipped.
+
+    Delimiters can be split across chunks. The buffer is reused between chunks and each byte is only scanned once, so
+    the cost is per chunk rather than per byte.
+    """
+
+    def __init__(self, start_delimiter=None, stop_delimiter='\n', max_frame_size=MAX_FRAME_SIZE):
+        """
+        :param start_delimiter: Bytes that mark the start of a frame. None if frames follow straight on from each other
+        :param stop_delimiter: Bytes that mark the end of a frame
+        :param max_frame_size: Longest frame that will be buffered. Longer frames are dropped
+        """
+        assert stop_delimiter
+        self.start_delimiter = start_delimiter or None
+        self.stop_delimiter = stop_delimiter
+        self.max_frame_size = max_frame_size
+
+        self.buffer = bytearray()
+        self.in_frame = self.start_delimiter is None
+        self.scanned = 0
+
+        # Without a start delimiter, the rest of a frame that was too long is thrown away up to its stop delimiter
+        self.discarding = False
+
+        # Number of frames thrown away for being too long
+        self.oversized = 0
+
+    def feed(self, data):
+        """
+        Add data to the buffer and take out any frames it completes
+        :param data: Bytes read from the stream
+        :return: List of complete frames, in order
+        """
+        buffer = self.buffer
+        buffer += data
+
+        if self.start_delimiter is None:
+            return self._feed_stop_only()
+
+        frames = []
+        position = 0
+
+        while True:
+            if not self.in_frame:
+                index = buffer.find(self.start_delimiter, position)
+                if index < 0:
+                    # Keep just enough of the tail to catch a start delimiter split across chunks
+                    position = max(position, len(buffer) - len(self.start_delimiter) + 1)
+                    break
+
+                position = index + len(self.start_delimiter)
+                self.scanned = position
+                self.in_frame = True
+
+            index = buffer.find(self.stop_delimiter, self.scanned)
+            if index < 0:
+                # Don't scan the same bytes again next time, apart from a possible split stop delimiter
+                self.scanned = max(position, len(buffer) - len(self.stop_delimiter) + 1)
+
+                if len(buffer) - position > self.max_frame_size:
+                    self.oversized += 1
+                    position = len(buffer)
+                    self.scanned = position
+                    self.in_frame = False
+                break
+
+            frames.append(str(buffer[position:index]))
+            position = index + len(self.stop_delimiter)
+            self.scanned = position
+            self.in_frame = False
+
+        # Drop everything that has been dealt with; what's left is the start of the next frame
+        del buffer[:position]
+        self.scanned -= position
+
+        return frames
+
+    def _feed_stop_only(self):
+        """
+        Take out the frames completed by the last chunk when there's no start delimiter
+        Every complete frame is in front of the last stop delimiter, so they can all be split off in one go.
+        :return: List of complete frames, in order
+        """
+        buffer = self.buffer
+        # Bytes kept back in case a stop delimiter is split across chunks
+        tail = len(self.stop_delimiter) - 1
+
+        if self.discarding:
+            index = buffer.find(self.stop_delimiter)
+            if index < 0:
+                del buffer[:max(0, len(buffer) - tail)]
+                return []
+            del buffer[:index + len(self.stop_delimiter)]
+            self.discarding = False
+
+        end = buffer.rfind(self.stop_delimiter)
+        frames = []
+
+        if end >= 0:
+            frames = str(buffer[:end]).split(self.stop_delimiter)
+            del buffer[:end + len(self.stop_delimiter)]
+
+        if len(buffer) > self.max_frame_size:
+            self.oversized += 1
+            self.discarding = True
+            del buffer[:len(buffer) - tail]
+
+        return frames
+
+    def flush(self):
+        """
+        Take out the unfinished frame at the end of the stream, if there is one
+        :return: The unfinished frame, or None if there isn't one
+        """
+        frame = None
+        if self.in_frame and not self.discarding and len(self.buffer) > 0:
+            frame = str(self.buffer)
+
+        self.clear()
+        return frame
+
+    def clear(self):
+        """
+        Throw away anything buffered
+        :return: None
+        """
+        del self.buffer[:]
+        self.in_frame = self.start_delimiter is None
+        self.scanned = 0
+        self.discarding = False
@@ -0,0 +1,436 @@
+import errno
+import logging
+import socket
+from SinkNode.Reader import Reader, LOGGER_FORMAT
+from SinkNode.Poller import Poller, READ, WRITE
+
+__author__ = 'Leenix'
+
+MAX_CONNECT_REQUESTS = 128
+BUFFER_SIZE = 65536
+
+# Longest the read thread waits for activity before checking whether it has been stopped (in seconds)
+POLL_TIMEOUT = 0.5
+
+# Largest request head and body that will be taken (in bytes)
+MAX_HEADER_SIZE = 65536
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 405: "Method Not Allowed", 411: "Length Required",
+           413: "Payload Too Large", 431: "Request Header Fields Too Large"}
+
+
+class RequestError(Exception):
+    """
+    Request that can't be taken. The connection is closed once the error response has been sent
+    """
+
+    def __init__(self, status, message):
+        super(RequestError, self).__init__(message)
+        self.status = status
+
+
+class HTTPClient(object):
+    """
+    Connection to an HTTP client.
+    Requests are cut out of the stream as they arrive; any number can be sent over the connection, one after the
+    other, and they can be pipelined.
+    """
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+
+        # Head of the request being received, or None once it's complete and the body is being received
+        self.head = ""
+        self.body = []
+        self.body_left = 0
+
+        # Whether the connection stays open after the request being received, and whether the client is waiting to
+        # be told to send the body
+        self.keep_alive = True
+        self.expect_continue = False
+
+        # Responses waiting to go out, whether the connection is closed once they have, and the request that couldn't
+        # be taken, if there was one
+        self.outgoing = ""
+        self.closing = False
+        self.error = None
+
+    def feed(self, data, max_body_size=MAX_BODY_SIZE):
+        """
+        Take in data read from the connection
+        A request that can't be taken stops the connection being read any further; it's left in error.
+        :param data: Bytes read
+        :param max_body_size: Largest body that will be taken
+        :return: List of (body, keep alive) tuples for the complete requests
+        """
+        bodies = []
+
+        while len(data) > 0:
+            if self.head is not None:
+                self.head += data
+                end = self.head.find("\r\n\r\n")
+                if end < 0:
+                    if len(self.head) > MAX_HEADER_SIZE:
+                        self.error = RequestError(431, "Request headers are too long")
+                    break
+
+                head, data = self.head[:end], self.head[end + 4:]
+                self.head = None
+                self.body = []
+                try:
+                    self.body_left = self._read_head(head, max_body_size)
+                except RequestError as err:
+                    self.error = err
+                    break
+
+                # Clients like curl hold back bigger bodies until they're told to go ahead. Not done for pipelined
+                # requests, as it would go out ahead of the responses to the requests before them
+                if self.expect_continue and len(bodies) == 0 and len(data) == 0:
+                    self.outgoing += "HTTP/1.1 100 Continue\r\n\r\n"
+
+            piece = data[:self.body_left]
+            self.body.append(piece)
+            self.body_left -= len(piece)
+            data = data[len(piece):]
+
+            if self.body_left == 0:
+                bodies.append(("".join(self.body), self.keep_alive))
+                self.body = []
+                self.head = ""
+                if not self.keep_alive:
+                    # Anything after the last request is ignored
+                    break
+
+        return bodies
+
+    def _read_head(self, head, max_body_size):
+        """
+        Check the request and find out how long its body is
+        :param head: Request line and headers
+        :param max_body_size: Largest body that will be taken
+        :return: Body length (in bytes)
+        """
+        lines = head.lstrip("\r\n").split("\r\n")
+        try:
+            method, _, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise RequestError(400, "Bad request line: {}".format(lines[0][:80]))
+
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        self.expect_continue = headers.get("expect", "").lower() == "100-continue"
+
+        # HTTP/1.1 connections are kept open unless the client says otherwise; HTTP/1.0 ones are the other way round
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            self.keep_alive = connection == "keep-alive"
+        else:
+            self.keep_alive = connection != "close"
+
+        if method != "POST":
+            raise RequestError(405, "Only POST requests are taken, not {}".format(method[:16]))
+        if "chunked" in headers.get("transfer-encoding", "").lower() or "content-length" not in headers:
+            raise RequestError(411, "Requests need a Content-Length")
+
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise RequestError(400, "Bad Content-Length")
+
+        if length < 0:
+            raise RequestError(400, "Bad Content-Length")
+        if length > max_body_size:
+            raise RequestError(413, "Body is bigger than {} bytes".format(max_body_size))
+        return length
+
+    def respond(self, status, body, keep_alive=True):
+        """
+        Queue a JSON response and send as much of it as the connection will take
+        :param status: HTTP status code
+        :param body: JSON response body
+        :param keep_alive: False if the connection is closed after the response
+        :return: True if all of it has been sent
+        """
+        if not keep_alive:
+            self.closing = True
+
+        self.outgoing += "HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n{}\r\n{}".format(
+            status, REASONS.get(status, ""), len(body), "" if keep_alive else "Connection: close\r\n", body)
+        return self.send()
+
+    def send(self):
+        """
+        Send as much of the queued response as the connection will take
+        :return: True if all of it has been sent
+        """
+        sent = self.sock.send(self.outgoing)
+        self.outgoing = self.outgoing[sent:]
+        return len(self.outgoing) == 0
+
+
+class HTTPReader(Reader):
+    """
+    Embedded HTTP server that takes bulk uploads of entries.
+    Each POST body holds any number of entries, either one JSON object per line or a JSON array of objects, and is
+    decoded in one go. Connections are kept alive between requests, and every connection is handled by the read
+    thread, as with SocketReader.
+
+    Each request is answered with the number of entries taken and rejected, e.g. {"accepted": 500, "rejected": 0}.
+    Bodies with no valid entries at all get a 400.
+    """
+
+    def __init__(self, server_address='localhost', listening_port=8080, outbox=None, logger_level=logging.FATAL,
+                 logger_format=LOGGER_FORMAT, reader_id="HTTPReader", allow_reuse=True, max_body_size=MAX_BODY_SIZE):
+        """
+        :param server_address: Address to listen on
+        :param listening_port: Port to listen on. 0 picks a free port
+        :param max_body_size: Largest request body that will be taken (in bytes)
+        """
+        super(HTTPReader, self).__init__(outbox=outbox, logger_level=logger_level, logger_format=logger_format,
+                                         reader_id=reader_id)
+
+        self.listening_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if allow_reuse:
+            self.listening_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+        self.server_address = server_address
+        self.listening_port = listening_port
+        self.max_body_size = max_body_size
+
+        self.poller = Poller()
+        self.listening_fd = None
+
+        # Connected clients, keyed by file descriptor
+        self.clients = {}
+
+    def start(self):
+        self.listening_socket.bind((self.server_address, self.listening_port))
+        self.listening_socket.listen(MAX_CONNECT_REQUESTS)
+        self.listening_socket.setblocking(0)
+
+        self.listening_fd = self.listening_socket.fileno()
+        self.poller.register(self.listening_fd, READ)
+        self.logger.info("Listening on %s", self.listening_socket.getsockname())
+        super(HTTPReader, self).start()
+
+    def stop(self):
+        super(HTTPReader, self).stop()
+
+        # Shutting down the listening socket wakes the read thread up so it can close the connections
+        try:
+            self.listening_socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.listening_socket.close()
+
+    def get_client_count(self):
+        """
+        Get the number of clients currently connected
+        :return: Number of open client connections
+        """
+        return len(self.clients)
+
+    def _read_loop(self):
+        super(HTTPReader, self)._read_loop()
+
+        # Connections are only touched by the read thread, so it's the one to close them
+        for fd in self.clients.keys():
+            self._disconnect(fd)
+        self.poller.close()
+
+    def read_entries(self):
+        """
+        Wait for activity on any of the connections, then take in and answer every request that has arrived
+        :return: List of decoded entries, with None in place of each one that couldn't be decoded
+        """
+        entries = []
+
+        for fd, events in self.poller.poll(POLL_TIMEOUT):
+            if fd == self.listening_fd:
+                self._accept_clients()
+                continue
+
+            client = self.clients.get(fd)
+            if client is None:
+                continue
+
+            if events & WRITE and len(client.outgoing) > 0:
+                self._send(fd, client)
+            if events & READ and fd in self.clients:
+                self._receive(fd, client, entries)
+
+        return entries
+
+    def convert_entries(self, raw_entries):
+        """
+        Request bodies are decoded as they come in, so there's nothing left to convert
+        :param raw_entries: List of decoded entries
+        :return: The same list
+        """
+        return raw_entries
+
+    def decode_body(self, body):
+        """
+        Decode every entry in a request body
+        Bodies of one entry per line are decoded as a single array, so the whole body is parsed in one call. If that
+        fails, the body is tried as a single (e.g. pretty-printed) entry, then the lines are decoded one at a time so
+        the good entries in the body can still be taken.
+        :param body: Request body - one JSON object per line, or a JSON array of objects
+        :return: List of entries, with None in place of each one that couldn't be decoded
+        """
+        body = body.strip()
+        if len(body) == 0:
+            return []
+
+        if body[0] == "[":
+            try:
+                entries = self.decoder.loads(body)
+            except (ValueError, TypeError):
+                return [None]
+            if not isinstance(entries, list):
+                return [None]
+        else:
+            try:
+                entries = self.decoder.loads("[" + body.replace("\n", ",") + "]")
+            except (ValueError, TypeError):
+                entries = self.decoder.decode_batch([body])
+                if entries[0] is None:
+                    entries = self.decoder.decode_batch([line for line in body.split("\n") if len(line.strip()) > 0])
+                return entries
+
+        return [entry if type(entry) is dict else None for entry in entries]
+
+    def _accept_clients(self):
+        """
+        Accept every connection waiting on the listening socket
+        :return: None
+        """
+        while self.is_running:
+            try:
+                sock, address = self.listening_socket.accept()
+            except socket.error as err:
+                if err.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK) and self.is_running:
+                    self.logger.warning("Connection could not be accepted: %s", err)
+                return
+
+            sock.setblocking(0)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            fd = sock.fileno()
+            self.clients[fd] = HTTPClient(sock, address)
+            self.poller.register(fd, READ)
+            self.logger.debug("Connection started [%s]", address)
+
+    def _receive(self, fd, client, entries):
+        """
+        Read from a client, then take in and answer any requests it has completed
+        :param fd: File descriptor of the client
+        :param client: HTTPClient of the connection
+        :param entries: List the decoded entries are added to
+        :return: None
+        """
+        try:
+            data = client.sock.recv(BUFFER_SIZE)
+        except socket.error as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self.logger.debug("Connection lost: %s", err)
+            data = ""
+
+        if len(data) == 0 or client.closing:
+            # Client has hung up, or is sending more after a request that closes the connection
+            if len(data) == 0:
+                self._disconnect(fd)
+            return
+
+        bodies = client.feed(data, self.max_body_size)
+
+        if len(bodies) == 0 and client.error is None:
+            # Nothing complete yet - there may be a go-ahead for the body to send
+            if len(client.outgoing) > 0:
+                self._send(fd, client)
+            return
+
+        for body, keep_alive in bodies:
+            decoded = self.decode_body(body)
+            rejected = decoded.count(None)
+            entries.extend(decoded)
+
+            if rejected > 0:
+                self.logger.warning("%d of %d entries from [%s] could not be decoded", rejected, len(decoded),
+                                    client.address[0])
+
+            status = 400 if rejected > 0 and rejected == len(decoded) else 200
+            response = '{{"accepted": {}, "rejected": {}}}'.format(len(decoded) - rejected, rejected)
+            if not self._respond(fd, client, status, response, keep_alive):
+                return
+
+        if client.error is not None:
+            error = client.error
+            self.logger.warning("Request from [%s] rejected: %s", client.address[0], error)
+            self._respond(fd, client, error.status, '{{"error": "{}"}}'.format(str(error).replace('"', "'")), False)
+
+    def _respond(self, fd, client, status, body, keep_alive=True):
+        """
+        Answer a request
+        :param fd: File descriptor of the client
+        :param client: HTTPClient of the connection
+        :param status: HTTP status code
+        :param body: JSON response body
+        :param keep_alive: False if the connection is closed after the response
+        :return: False if the connection has been closed
+        """
+        try:
+            sent = client.respond(status, body, keep_alive)
+        except socket.error as err:
+            if err.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                self.logger.debug("Connection lost: %s", err)
+                self._disconnect(fd)
+                return False
+            sent = False
+
+        return self._after_send(fd, client, sent)
+
+    def _send(self, fd, client):
+        try:
+            sent = client.send()
+        except socket.error as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self.logger.debug("Connection lost: %s", err)
+            self._disconnect(fd)
+            return
+
+        self._after_send(fd, client, sent)
+
+    def _after_send(self, fd, client, sent):
+        """
+        Wait for the rest of a response to go out, or close the connection once the last response has gone
+        :return: False if the connection has been closed
+        """
+        if not sent:
+            self.poller.modify(fd, READ | WRITE)
+            return True
+
+        if client.closing:
+            self._disconnect(fd)
+            return False
+
+        if self.poller.events.get(fd) != READ:
+            self.poller.modify(fd, READ)
+        return True
+
+    def _disconnect(self, fd):
+        """
+        Close a client connection
+        :param fd: File descriptor of the client
+        :return: None
+        """
+        client = self.clients.pop(fd)
+        self.poller.unregister(fd)
+        client.sock.close()
+        self.logger.debug("Connection closed [%s]", client.address)
@@ -0,0 +1,87 @@
+__author__ = 'Leenix'
+
+import importlib
+
+# JSON libraries that can decode entries, fastest first. The first one that's installed is used by default
+LIBRARIES = ("ujson", "simplejson", "json")
+
+
+def find_library(libraries=LIBRARIES):
+    """
+    Find the first JSON library that can be imported
+    :param libraries: Names of the JSON libraries to try, in order
+    :return: Tuple of (name, module)
+    """
+    for name in libraries:
+        try:
+            return name, importlib.import_module(name)
+        except ImportError:
+            continue
+    raise ImportError("None of the JSON libraries {} are installed".format(libraries))
+
+
+class JSONDecoder(object):
+    """
+    Decodes raw entries into dictionaries.
+    Uses the fastest JSON library installed (see LIBRARIES); the standard library's json module is always there to
+    fall back on. Entries are decoded straight from the bytes that were read in, without being copied or cleaned up
+    first.
+
+    Entries must be JSON objects. Anything that isn't - including lines that don't decode at all - is invalid and
+    comes back as None, so it can be thrown away with a single check.
+    """
+
+    def __init__(self, library=None):
+        """
+        :param library: Name of the JSON library to decode with, or None for the fastest one installed
+        """
+        if library is None:
+            self.library, module = find_library()
+        else:
+            self.library, module = library, importlib.import_module(library)
+
+        self.loads = module.loads
+
+    def decode(self, raw_entry):
+        """
+        Decode a single entry
+        :param raw_entry: JSON-encoded entry
+        :return: Dictionary, or None if the entry is invalid
+        """
+        return self.decode_batch([raw_entry])[0]
+
+    def decode_batch(self, raw_entries):
+        """
+        Decode a batch of entries in one go
+        :param raw_entries: List of JSON-encoded entries
+        :return: List of dictionaries in the same order, with None in place of each invalid entry
+        """
+        loads = self.loads
+        entries = []
+        append = entries.append
+
+        for raw_entry in raw_entries:
+            try:
+                entry = loads(raw_entry)
+            except (ValueError, TypeError):
+                entry = self._decode_line_breaks(raw_entry)
+
+            append(entry if type(entry) is dict else None)
+
+        return entries
+
+    def _decode_line_breaks(self, raw_entry):
+        """
+        Decode an entry that has line breaks inside its strings
+        Some devices split long values over several lines, which isn't valid JSON. Each line break is taken to
+        separate values, so it's replaced with a '|'. This is only tried once the entry has failed to decode, so valid
+        entries never pay for it.
+        :param raw_entry: JSON-encoded entry that failed to decode
+        :return: Decoded entry, or None if it still can't be decoded
+        """
+        try:
+            if "\r\n" in raw_entry:
+                return self.loads(str(raw_entry).replace("\r\n", "|"))
+        except (ValueError, TypeError):
+            pass
+        return None
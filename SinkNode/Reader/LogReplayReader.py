@@ -0,0 +1,350 @@
+import ast
+import datetime
+import glob
+import json
+import logging
+import mmap
+import os
+import re
+import time
+from SinkNode.Reader import Reader, LOGGER_FORMAT
+from SinkNode.Metrics import monotonic
+
+__author__ = 'Leenix'
+
+# Most bytes of a log file taken in one go. Lines are split out of each block in a single pass
+READ_SIZE = 1024 * 1024
+
+# Most entries passed on in one batch
+BATCH_SIZE = 4096
+
+# How much of a second's worth of entries goes out in one batch when the replay rate is limited (in seconds)
+RATE_INTERVAL = 0.1
+
+# Longest the read thread sleeps for the rate limit before checking whether it has been stopped (in seconds)
+SLEEP_INTERVAL = 0.5
+
+# Least time between saved checkpoints (in seconds)
+CHECKPOINT_INTERVAL = 1.0
+
+# Rotated copies of a log file, numbered the way logrotate does it (the higher the number, the older the file)
+ROTATED_SUFFIX = re.compile(r"\.(\d+)$")
+
+
+def find_log_files(filename, path="", file_time_prefix=None):
+    """
+    Find the files written by a LogFileWriter, oldest first
+    With a file_time_prefix, the writer starts a new file whenever the prefix changes, so every file ending in the
+    filename whose prefix matches the format is part of the series. Without one, the file and any numbered rotated
+    copies of it (filename.1, filename.2, ...) are.
+    :param filename: Log file name, as given to the writer
+    :param path: Directory prefix, as given to the writer
+    :param file_time_prefix: strftime format of the file name prefix, as given to the writer
+    :return: List of file paths, in the order they were written
+    """
+    base = path + filename
+
+    if file_time_prefix is not None:
+        series = []
+        for candidate in glob.glob(path + "*" + filename):
+            try:
+                started = datetime.datetime.strptime(candidate[len(path):-len(filename)], file_time_prefix)
+            except ValueError:
+                continue
+            series.append((started, candidate))
+        return [candidate for _, candidate in sorted(series)]
+
+    rotated = []
+    for candidate in glob.glob(base + ".*"):
+        match = ROTATED_SUFFIX.search(candidate[len(base):])
+        if match is not None and match.start() == 0:
+            rotated.append((int(match.group(1)), candidate))
+
+    files = [candidate for _, candidate in sorted(rotated, reverse=True)]
+    if os.path.isfile(base):
+        files.append(base)
+    return files
+
+
+class LogReplayReader(Reader):
+    """
+    Reads back the entries written by a LogFileWriter, e.g. to backfill a sink that has been down. Lines can be JSON,
+    or the Python dictionary literals the writer puts out for dictionary entries.
+    Every file in the series is memory-mapped and replayed in order, oldest first. Lines are split out of large
+    blocks of the file in one go rather than being read one at a time. Timestamps added by the writer can be stripped
+    off again.
+
+    Entries go out as fast as they can be taken, or at a set rate. The position of the last entry passed on can be
+    saved to a checkpoint file, so a replay that's been stopped picks up where it left off.
+    The reader stops by itself when it gets to the end of the last file.
+    """
+
+    def __init__(self, filename, path="", file_time_prefix=None, timestamp_format=None, outbox=None,
+                 logger_level=logging.FATAL, logger_format=LOGGER_FORMAT, reader_id="LogReplayReader", rate=None,
+                 checkpoint_file=None, files=None, batch_size=BATCH_SIZE, read_size=READ_SIZE):
+        """
+        :param filename: Log file name, as given to the writer
+        :param path: Directory prefix, as given to the writer
+        :param file_time_prefix: strftime format of the file name prefix, as given to the writer
+        :param timestamp_format: strftime format of the timestamps the writer put in front of each line, which are
+        stripped off. None if the lines don't have them
+        :param rate: Most entries passed on per second. None goes as fast as possible
+        :param checkpoint_file: File the replay position is saved to, and resumed from. None doesn't save it
+        :param files: List of files to replay in order, instead of finding the writer's files
+        :param batch_size: Most entries passed on in one batch
+        :param read_size: Most bytes of a file taken in one go
+        """
+        super(LogReplayReader, self).__init__(outbox=outbox, logger_level=logger_level, logger_format=logger_format,
+                                              reader_id=reader_id)
+
+        if files is None:
+            files = find_log_files(filename, path, file_time_prefix)
+
+        self.files = files
+        self.rate = rate
+        self.checkpoint_file = checkpoint_file
+        self.read_size = read_size
+
+        self.batch_size = batch_size
+        if rate is not None:
+            self.batch_size = max(1, min(batch_size, int(rate * RATE_INTERVAL)))
+
+        # Each timestamp is followed by a comma, on top of any in the format itself
+        self.timestamp_fields = None
+        if timestamp_format is not None:
+            self.timestamp_fields = timestamp_format.count(",") + 1
+
+        # File being read, and how far through it the entries passed on so far go
+        self.file_index = 0
+        self.offset = 0
+        self.data = None
+        self.position = None
+
+        # Lines taken from the file but not passed on yet
+        self.pending = []
+        self.pending_index = 0
+
+        self.sent = 0
+        self.start_time = None
+        self.checkpoint_time = 0
+
+        self._load_checkpoint()
+
+    def _read_loop(self):
+        super(LogReplayReader, self)._read_loop()
+
+        # Everything taken has been passed on by now
+        self.save_checkpoint()
+        self._close_file()
+
+    def read_entries(self):
+        """
+        Take the next batch of entries, waiting first if the replay rate is limited
+        :return: List of entries, or an empty list at the end of the last file
+        """
+        now = monotonic()
+        if now - self.checkpoint_time >= CHECKPOINT_INTERVAL:
+            # The last batch has been passed on by the time the next one is asked for
+            self.save_checkpoint()
+            self.checkpoint_time = now
+
+        while self.pending_index >= len(self.pending):
+            if not self._read_block():
+                self.logger.info("End of the log files")
+                self.is_running = False
+                return []
+
+        start = self.pending_index
+        batch = self.pending[start:start + self.batch_size]
+        self.pending_index = start + len(batch)
+
+        if self.rate is not None:
+            self.sent += len(batch)
+            self._wait_for_rate()
+
+        # Every line was followed by a newline, apart from maybe the last one in the file
+        self.offset = min(self.offset + sum(map(len, batch)) + len(batch), len(self.data))
+        self.position = (self.files[self.file_index], self.offset)
+
+        if self.timestamp_fields is not None:
+            fields = self.timestamp_fields
+            batch = [line.split(",", fields)[-1] for line in batch]
+
+        return batch
+
+    def convert_entries(self, raw_entries):
+        """
+        Convert a batch of lines to JSON
+        LogFileWriter writes dictionary entries out as Python literals (e.g. {'id': u'x'}) rather than JSON, so lines
+        that aren't JSON are read back as literals instead.
+        :param raw_entries: List of lines
+        :return: List of converted entries in the same order, with None in place of each line that couldn't be
+        converted
+        """
+        entries = self.decoder.decode_batch(raw_entries)
+
+        if None in entries:
+            for index, entry in enumerate(entries):
+                if entry is None:
+                    entries[index] = self._convert_literal(raw_entries[index])
+
+        return entries
+
+    def _convert_literal(self, line):
+        """
+        Convert a line written as a Python dictionary literal
+        :param line: Line that isn't JSON
+        :return: Dictionary entry, or None if the line isn't a dictionary literal either
+        """
+        entry = None
+        if line.startswith("{"):
+            try:
+                entry = ast.literal_eval(line)
+            except (ValueError, SyntaxError, TypeError):
+                pass
+
+        if type(entry) is not dict:
+            self.logger.warning("Entry could not be converted to JSON: %s", line)
+            return None
+        return entry
+
+    def _read_block(self):
+        """
+        Split the next block of lines out of the current file, moving on to the next file at the end of this one
+        :return: False if there's nothing left to read
+        """
+        if self.data is None or self.offset >= len(self.data):
+            if not self._next_file():
+                return False
+
+        data = self.data
+        start = self.offset
+        end = len(data)
+
+        if start + self.read_size < end:
+            # Blocks end on a line break. Lines longer than a block are taken whole
+            last_break = data.rfind("\n", start, start + self.read_size)
+            if last_break < 0:
+                last_break = data.find("\n", start + self.read_size)
+            if last_break >= 0:
+                end = last_break + 1
+
+        block = data[start:end]
+        if block.endswith("\n"):
+            block = block[:-1]
+
+        # The decoder needs each line as a string of its own, so every line is copied out either way. One split of
+        # the block does that in C; walking the map with find() and slicing each line out is about 4x slower
+        self.pending = block.split("\n")
+        self.pending_index = 0
+        return True
+
+    def _next_file(self):
+        """
+        Move on to the next file that has anything in it
+        The file that was being read is kept open until the end of it has been passed on.
+        :return: False if there are no files left
+        """
+        while True:
+            if self.data is not None:
+                self._close_file()
+                self.file_index += 1
+                self.offset = 0
+
+            if self.file_index >= len(self.files):
+                return False
+
+            path = self.files[self.file_index]
+            try:
+                with open(path, "rb") as log_file:
+                    self.data = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file - nothing to map
+                self.data = None
+                self.file_index += 1
+                continue
+            except (IOError, OSError) as err:
+                self.logger.error("Log file [%s] cannot be read: %s", path, err)
+                self.data = None
+                self.file_index += 1
+                continue
+
+            if self.offset > len(self.data):
+                self.logger.warning("Log file [%s] is shorter than the checkpoint - replaying all of it", path)
+                self.offset = 0
+
+            self.logger.info("Replaying [%s] from byte %d", path, self.offset)
+            if self.offset < len(self.data):
+                return True
+
+    def _close_file(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def _wait_for_rate(self):
+        """
+        Hold the next batch back until it's due at the replay rate
+        Batches are due once the rate has allowed for every entry up to the end of them, so the rate is never beaten.
+        :return: None
+        """
+        now = monotonic()
+        if self.start_time is None:
+            self.start_time = now
+
+        due = self.start_time + float(self.sent) / self.rate
+        while self.is_running and due > now:
+            time.sleep(min(due - now, SLEEP_INTERVAL))
+            now = monotonic()
+
+    def get_position(self):
+        """
+        Get how far the replay has got
+        Once the replay has finished, this is the end of the last file, so replaying again with the same checkpoint
+        only picks up what's been written since.
+        :return: Tuple of (file path, byte offset) just past the last entry passed on, or None if nothing has been
+        """
+        return self.position
+
+    def save_checkpoint(self):
+        """
+        Save how far the replay has got to the checkpoint file, if there is one
+        The file is replaced in one go, so a crash part way through a save can't leave it half-written.
+        :return: None
+        """
+        if self.checkpoint_file is None or self.position is None:
+            return
+
+        checkpoint = {"file": self.position[0], "offset": self.position[1]}
+        temporary_file = self.checkpoint_file + ".tmp"
+        try:
+            with open(temporary_file, "w") as checkpoint_file:
+                json.dump(checkpoint, checkpoint_file)
+            os.rename(temporary_file, self.checkpoint_file)
+        except (IOError, OSError) as err:
+            self.logger.error("Checkpoint cannot be saved: %s", err)
+
+    def _load_checkpoint(self):
+        """
+        Pick up from the saved checkpoint, if there is one
+        :return: None
+        """
+        if self.checkpoint_file is None or not os.path.isfile(self.checkpoint_file):
+            return
+
+        try:
+            with open(self.checkpoint_file) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            path, offset = checkpoint["file"], int(checkpoint["offset"])
+        except (IOError, ValueError, KeyError, TypeError) as err:
+            self.logger.error("Checkpoint cannot be read - replaying everything: %s", err)
+            return
+
+        if path not in self.files:
+            self.logger.warning("Checkpoint file [%s] is no longer there - replaying everything", path)
+            return
+
+        self.file_index = self.files.index(path)
+        self.offset = offset
+        self.position = (path, offset)
+        self.logger.info("Resuming from byte %d of [%s]", offset, path)
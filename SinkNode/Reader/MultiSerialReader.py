@@ -0,0 +1,147 @@
+import errno
+import os
+import logging
+import serial
+from serial import SerialException
+from SinkNode.Reader import Reader, LOGGER_FORMAT
+from SinkNode.Reader.FrameBuffer import FrameBuffer
+from SinkNode.Reader.SerialReader import READ_SIZE
+from SinkNode.Poller import Poller, READ
+
+__author__ = 'Leenix'
+
+# Longest the read thread waits for data before checking whether it has been stopped (in seconds)
+POLL_TIMEOUT = 0.5
+
+
+class MultiSerialReader(Reader):
+    """
+    Reads entries from any number of serial ports on a single thread.
+    Every port is watched at once and only read when data has arrived, so an idle port costs nothing. Each port has
+    its own FrameBuffer, and each entry is tagged with the port it came from.
+
+    Ports that can't be opened, or that go away (e.g. a USB adapter being unplugged), are logged and dropped; the
+    other ports carry on.
+    """
+
+    def __init__(self, ports, baud_rate=57600, start_delimiter=None, stop_delimiter='\n', outbox=None,
+                 logger_level=logging.FATAL, logger_format=LOGGER_FORMAT, reader_id="MultiSerialReader",
+                 read_size=READ_SIZE, port_key='port'):
+        """
+        :param ports: List of serial port names, or dictionary of port names and their baud rates
+        :param baud_rate: Baud rate of the ports that don't have their own
+        :param read_size: Most bytes taken from a port in one read
+        :param port_key: Key each entry's port name is stored under
+        """
+        super(MultiSerialReader, self).__init__(outbox=outbox, logger_level=logger_level,
+                                                logger_format=logger_format, reader_id=reader_id)
+
+        if not isinstance(ports, dict):
+            ports = dict((port, baud_rate) for port in ports)
+
+        self.ports = ports
+        self.start_delimiter = start_delimiter
+        self.stop_delimiter = stop_delimiter
+        self.read_size = read_size
+        self.port_key = port_key
+
+        self.poller = Poller()
+
+        # Open ports, their names and their frame buffers, keyed by file descriptor
+        self.connections = {}
+
+    def start(self):
+        """
+        Open the ports and start reading them
+        :return: None
+        """
+        for port, baud_rate in sorted(self.ports.items()):
+            try:
+                ser = serial.Serial(port, baud_rate, timeout=0)
+            except (SerialException, OSError) as err:
+                self.logger.error("Serial port [%s] cannot be opened: %s", port, err)
+                continue
+
+            fd = ser.fileno()
+            self.connections[fd] = (ser, port, FrameBuffer(self.start_delimiter, self.stop_delimiter))
+            self.poller.register(fd, READ)
+            self.logger.debug("Opened serial port [%s] with %d baud", port, baud_rate)
+
+        if len(self.connections) == 0:
+            self.logger.error("None of the serial ports could be opened")
+
+        super(MultiSerialReader, self).start()
+
+    def get_open_ports(self):
+        """
+        Get the ports currently being read
+        :return: Sorted list of port names
+        """
+        return sorted(port for _, port, _ in self.connections.values())
+
+    def _read_loop(self):
+        super(MultiSerialReader, self)._read_loop()
+
+        # Ports are only touched by the read thread, so it's the one to close them
+        for fd in self.connections.keys():
+            self._close_port(fd)
+        self.poller.close()
+
+    def read_entries(self):
+        """
+        Wait for data on any of the ports and cut whatever has arrived into entries
+        :return: List of (port name, entry line) tuples. Partial entries are kept until the rest arrives
+        """
+        entries = []
+
+        for fd, events in self.poller.poll(POLL_TIMEOUT):
+            if fd not in self.connections:
+                continue
+
+            ser, port, frames = self.connections[fd]
+            try:
+                chunk = os.read(fd, self.read_size)
+            except OSError as err:
+                if err.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    continue
+                self.logger.error("Serial port [%s] failed: %s", port, err)
+                chunk = ""
+
+            if len(chunk) == 0:
+                # Port has gone away - pass on anything it didn't finish
+                last_entry = self._close_port(fd)
+                if last_entry:
+                    entries.append((port, last_entry))
+                continue
+
+            entries.extend((port, line) for line in frames.feed(chunk))
+
+        return entries
+
+    def convert_entries(self, raw_entries):
+        """
+        Convert a batch of entries to JSON and tag each one with its port
+        :param raw_entries: List of (port name, entry line) tuples
+        :return: List of converted entries in the same order, with None in place of each entry that couldn't be converted
+        """
+        entries = super(MultiSerialReader, self).convert_entries([line for _, line in raw_entries])
+
+        port_key = self.port_key
+        for (port, _), entry in zip(raw_entries, entries):
+            if isinstance(entry, dict):
+                entry[port_key] = port
+
+        return entries
+
+    def _close_port(self, fd):
+        """
+        Stop reading a port and close it
+        :param fd: File descriptor of the port
+        :return: Unfinished entry left in the port's buffer, or None
+        """
+        ser, port, frames = self.connections.pop(fd)
+        self.poller.unregister(fd)
+        ser.close()
+
+        self.logger.info("Closed serial port [%s]", port)
+        return frames.flush()
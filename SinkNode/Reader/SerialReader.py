@@ -2,23 +2,31 @@ import sys
 import logging
 from Queue import Queue
 import serial
-from serial import SerialException, portNotOpenError
+from serial import SerialException
 from SinkNode.Reader import Reader
+from SinkNode.Reader.FrameBuffer import FrameBuffer
+
+# Most bytes taken from the port in one read
+READ_SIZE = 4096
 
 
 class SerialReader(Reader):
     """
     Serial reader that sorts the incoming stream into packets.
+    Whatever is waiting in the port is read in one go and cut into packets with a FrameBuffer, so a busy link costs
+    one read per chunk instead of one per byte.
     """
 
     def __init__(self, port, baud_rate, start_delimiter=None, stop_delimiter='\n',
-                 outbox=None, logger_level=logging.FATAL, reader_id=__name__):
+                 outbox=None, logger_level=logging.FATAL, reader_id=__name__, read_size=READ_SIZE):
 
         self.port = port
         self.baud_rate = baud_rate
         self.ser = serial.Serial()
         self.start_delimiter = start_delimiter
         self.stop_delimiter = stop_delimiter
+        self.read_size = read_size
+        self.frames = FrameBuffer(start_delimiter, stop_delimiter)
 
         self.reader_id = reader_id
 
@@ -62,34 +70,24 @@ class SerialReader(Reader):
         self.ser.close()
         super(SerialReader, self).stop()
 
-    def read_entry(self):
+    def read_entries(self):
         """
-        Reading loop to be run by thread.
-        Loop will run until manually stopped
+        Read whatever is waiting in the port and cut it into entries
+        Waits up to the port timeout for data if nothing is waiting.
 
-        :return: Entry line
+        :return: List of complete entry lines found in the data. Partial entries are kept for the next read
         """
-        recording_entry = False
-        received = ""
-
         try:
-            # Wait for the 'packet start' signal to start recording the entry
-            while self.is_running and not recording_entry:
-                c = self.ser.read()
-                if c == self.start_delimiter:
-                    recording_entry = True
-
-            # Entry started - record until it stops
-            # TODO - hide the serial read inside the is_running check
-            c = self.ser.read()
-            while self.is_running and c != self.stop_delimiter:
-                    received += c
-                    c = self.ser.read()
-
-        except portNotOpenError:
-            pass
-
-        return received
+            # Block for the first byte, then take everything else that has arrived along with it
+            chunk = self.ser.read(max(1, min(self.ser.in_waiting, self.read_size)))
+        except SerialException:
+            # Port has been closed by stop()
+            return []
+
+        if len(chunk) == 0:
+            return []
+
+        return self.frames.feed(chunk)
 
 if __name__ == '__main__':
     read_queue = Queue()
@@ -1,15 +1,29 @@
 __author__ = 'Leenix'
 
 from SinkNode.Reader import *
+from SinkNode.Reader.FrameBuffer import FrameBuffer
+from SinkNode.Poller import Poller, READ
+import errno
 import socket
 import logging
 
-MAX_CONNECT_REQUESTS = 5
-BUFFER_SIZE = 1024
+MAX_CONNECT_REQUESTS = 128
+BUFFER_SIZE = 65536
+
+# Longest the read thread waits for activity before checking whether it has been stopped (in seconds)
+POLL_TIMEOUT = 0.5
 
 
 class SocketReader(Reader):
-    def __init__(self, start_delimiter=' ', stop_delimiter='\n', server_address='localhost', listening_port=8888, outbox=None, logger_level=logging.FATAL, logger_format=LOGGER_FORMAT, allow_reuse=True):
+    """
+    TCP server that reads entries from any number of long-lived client connections.
+    A single read thread waits on the listening socket and every client at once, so sensors can stay connected and
+    send reading after reading without connecting each time. Each connection is cut into entries on the delimiters
+    with its own FrameBuffer; an unfinished entry is passed on when its client disconnects, so clients that connect
+    for a single reading don't need to end it with the stop delimiter.
+    """
+
+    def __init__(self, start_delimiter=None, stop_delimiter='\n', server_address='localhost', listening_port=8888, outbox=None, logger_level=logging.FATAL, logger_format=LOGGER_FORMAT, allow_reuse=True):
         super(SocketReader, self).__init__(outbox=outbox, logger_level=logger_level, logger_format=logger_format)
         self.logger.name = 'SocketReader'
 
@@ -22,14 +36,114 @@ class SocketReader(Reader):
         self.start_delimiter = start_delimiter
         self.stop_delimiter = stop_delimiter
 
+        self.poller = Poller()
+        self.listening_fd = None
+
+        # Connected clients and their frame buffers, keyed by file descriptor
+        self.clients = {}
+
     def start(self):
         self.listening_socket.bind((self.server_address, self.listening_port))
         self.listening_socket.listen(MAX_CONNECT_REQUESTS)
+        self.listening_socket.setblocking(0)
+
+        self.listening_fd = self.listening_socket.fileno()
+        self.poller.register(self.listening_fd, READ)
         super(SocketReader, self).start()
 
-    def read_entry(self):
-        client, address = self.listening_socket.accept()
-        self.logger.debug('Connection started [{}]'.format(address))
-        received_data = client.recv(BUFFER_SIZE)
-        return received_data
+    def stop(self):
+        super(SocketReader, self).stop()
+
+        # Shutting down the listening socket wakes the read thread up so it can close the connections
+        try:
+            self.listening_socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.listening_socket.close()
+
+    def get_client_count(self):
+        """
+        Get the number of clients currently connected
+        :return: Number of open client connections
+        """
+        return len(self.clients)
+
+    def _read_loop(self):
+        super(SocketReader, self)._read_loop()
+
+        # Connections are only touched by the read thread, so it's the one to close them
+        for fd in self.clients.keys():
+            self._disconnect(fd)
+        self.poller.close()
+
+    def read_entries(self):
+        """
+        Wait for activity on any of the connections and read in whatever has arrived
+        :return: List of complete entries received. Partial entries are kept until the rest arrives
+        """
+        entries = []
+
+        for fd, events in self.poller.poll(POLL_TIMEOUT):
+            if fd == self.listening_fd:
+                self._accept_clients()
+            elif fd in self.clients:
+                entries.extend(self._receive(fd))
+
+        return entries
+
+    def _accept_clients(self):
+        """
+        Accept every connection waiting on the listening socket
+        :return: None
+        """
+        while self.is_running:
+            try:
+                client, address = self.listening_socket.accept()
+            except socket.error as err:
+                if err.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK) and self.is_running:
+                    self.logger.warning("Connection could not be accepted: %s", err)
+                return
+
+            client.setblocking(0)
+            fd = client.fileno()
+            self.clients[fd] = (client, FrameBuffer(self.start_delimiter, self.stop_delimiter))
+            self.poller.register(fd, READ)
+            self.logger.debug("Connection started [%s]", address)
+
+    def _receive(self, fd):
+        """
+        Read from a client and cut what has arrived into entries
+        :param fd: File descriptor of the client
+        :return: List of complete entries
+        """
+        client, frames = self.clients[fd]
+
+        try:
+            data = client.recv(BUFFER_SIZE)
+        except socket.error as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+            self.logger.debug("Connection lost: %s", err)
+            data = ""
+
+        if len(data) > 0:
+            return frames.feed(data)
+
+        # Client has hung up - pass on anything it didn't finish
+        last_entry = self._disconnect(fd)
+        if last_entry is None or len(last_entry.strip()) == 0:
+            return []
+        return [last_entry]
+
+    def _disconnect(self, fd):
+        """
+        Close a client connection
+        :param fd: File descriptor of the client
+        :return: Unfinished entry left in the client's buffer, or None
+        """
+        client, frames = self.clients.pop(fd)
+        self.poller.unregister(fd)
+        client.close()
 
+        self.logger.debug("Connection closed")
+        return frames.flush()
@@ -1,48 +1,78 @@
+import errno
+import os
 import sys
 import logging
 
 from SinkNode.Reader import Reader
+from SinkNode.Reader.FrameBuffer import FrameBuffer
+
+# Most bytes taken from the input in one read
+READ_SIZE = 65536
 
 
 class StandardInReader(Reader):
     """
-    Serial reader that sorts the incoming stream into packets.
+    Reader that sorts the console input (or any other stream) into packets.
+    Input is cut into packets with a FrameBuffer. By default it's read through the stream object a line at a time (or
+    a character at a time, if packets don't end in a line break), so any stream works, including ones that have
+    already been read from.
+
+    For piping in millions of lines, raw mode reads large blocks straight from the stream's file descriptor instead,
+    costing one read per block rather than one per line, and passes every packet in a block on in a single batch.
+    Raw mode needs a stream with a file descriptor, and skips anything the stream object has already buffered.
+
+    The reader stops by itself when it gets to the end of the input.
     """
 
-    def __init__(self, start_delimiter=None, stop_delimiter='\n', logger_level=logging.FATAL):
+    def __init__(self, start_delimiter=None, stop_delimiter='\n', logger_level=logging.FATAL, stream=None,
+                 read_size=READ_SIZE, raw=False):
+        """
+        :param start_delimiter: Bytes that mark the start of a packet. None if packets follow straight on
+        :param stop_delimiter: Bytes that mark the end of a packet
+        :param stream: Stream to read from. None reads standard input
+        :param read_size: Most bytes taken in one read in raw mode
+        :param raw: Read blocks straight from the stream's file descriptor
+        """
         self.start_delimiter = start_delimiter
         self.stop_delimiter = stop_delimiter
+        self.stream = stream if stream is not None else sys.stdin
+        self.read_size = read_size
+        self.raw = raw
+        self.frames = FrameBuffer(start_delimiter, stop_delimiter)
+
+        if raw:
+            self.fd = self.stream.fileno()
 
         super(StandardInReader, self).__init__(logger_level=logger_level)
 
         self.logger.name = 'StandardInReader'
 
-    def read_entry(self):
+    def read_entries(self):
         """
-        Read in an entry from the console
-        :return:
+        Read in the next line (or block, in raw mode) of input and cut it into entries
+        Returns as soon as any input is available; it doesn't wait for a whole block.
+        :return: List of complete entries read. Partial entries are kept for the next read
         """
-
-        is_recording = False
-
-        if self.start_delimiter is None:
-            is_recording = True
-
-        output = ""
-
-        # Wait for the entry to start...
-        while not is_recording:
-            c = sys.stdin.read(1)
-            if c == self.start_delimiter:
-                is_recording = True
-
-        # Read the entry until we get a stop character
-        c = sys.stdin.read(1)
-        while c != self.stop_delimiter:
-            output += c
-            c = sys.stdin.read(1)
-
-        return str(output)
-
-
-
+        try:
+            if self.raw:
+                block = os.read(self.fd, self.read_size)
+            elif self.stop_delimiter.endswith('\n'):
+                block = self.stream.readline()
+            else:
+                block = self.stream.read(1)
+        except (OSError, IOError) as err:
+            if err.errno == errno.EINTR:
+                return []
+            raise
+
+        if len(block) == 0:
+            # End of the input - pass on the last entry, even if it was never finished
+            self.logger.info("End of input")
+            self.is_running = False
+
+            last_entry = self.frames.flush()
+            if last_entry is None:
+                return []
+            return [last_entry]
+
+        return self.frames.feed(block)
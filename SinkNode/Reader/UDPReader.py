@@ -0,0 +1,154 @@
+__author__ = 'Leenix'
+
+from SinkNode.Reader import *
+from SinkNode.Poller import Poller, READ
+from SinkNode.EntryQueue import DEFAULT_BATCH_SIZE
+import errno
+import os
+import socket
+import logging
+
+# Largest datagram that will be read in (in bytes). Longer datagrams are dropped
+MAX_DATAGRAM_SIZE = 8192
+
+# Kernel receive buffer asked for (in bytes) - holds bursts that arrive while the read thread is busy. The kernel
+# caps this at net.core.rmem_max
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Longest the read thread waits for a datagram before checking whether it has been stopped (in seconds)
+POLL_TIMEOUT = 0.5
+
+# Socket table used to look up the datagrams the kernel has had to drop (Linux only)
+PROC_NET_UDP = ("/proc/net/udp", "/proc/net/udp6")
+
+
+class UDPReader(Reader):
+    """
+    Reads entries from UDP datagrams, one entry per datagram.
+    Datagrams are received in batches, straight into a set of buffers allocated up front, then decoded with
+    convert_to_json like any other reader's entries. Every datagram waiting on the socket is taken in one go (up to
+    the batch size) and passed on as one batch.
+
+    Datagrams are dropped if they're too big for the receive buffers, or by the kernel if they arrive faster than
+    they can be read; both are counted (see get_dropped).
+    """
+
+    def __init__(self, server_address='0.0.0.0', listening_port=8889, outbox=None, logger_level=logging.FATAL,
+                 logger_format=LOGGER_FORMAT, reader_id="UDPReader", batch_size=DEFAULT_BATCH_SIZE,
+                 max_datagram_size=MAX_DATAGRAM_SIZE, receive_buffer_size=RECEIVE_BUFFER_SIZE):
+        """
+        :param server_address: Address to listen on
+        :param listening_port: Port to listen on. 0 picks a free port
+        :param batch_size: Most datagrams received in one go
+        :param max_datagram_size: Largest datagram that will be read in (in bytes)
+        :param receive_buffer_size: Size of the kernel receive buffer to ask for (in bytes)
+        """
+        super(UDPReader, self).__init__(outbox=outbox, logger_level=logger_level, logger_format=logger_format,
+                                        reader_id=reader_id)
+
+        self.server_address = server_address
+        self.listening_port = listening_port
+        self.max_datagram_size = max_datagram_size
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer_size)
+        self.sock.setblocking(0)
+
+        # One slot per datagram in a batch. Each slot has a spare byte so oversized datagrams can be spotted
+        slot_size = max_datagram_size + 1
+        self.receive_buffer = bytearray(slot_size * batch_size)
+        view = memoryview(self.receive_buffer)
+        self.slots = [view[i * slot_size:(i + 1) * slot_size] for i in range(batch_size)]
+
+        self.poller = Poller()
+
+        # Datagrams thrown away for being too big
+        self.oversized = 0
+
+    def start(self):
+        self.sock.bind((self.server_address, self.listening_port))
+        self.poller.register(self.sock, READ)
+
+        receive_buffer_size = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        self.logger.info("Listening on %s with a %d byte receive buffer", self.sock.getsockname(), receive_buffer_size)
+
+        super(UDPReader, self).start()
+
+    def _read_loop(self):
+        # The read thread notices it has been stopped within POLL_TIMEOUT, then closes the socket itself
+        super(UDPReader, self)._read_loop()
+        self.poller.close()
+        self.sock.close()
+
+    def read_entries(self):
+        """
+        Receive every datagram waiting on the socket, up to a batch
+        Waits up to POLL_TIMEOUT for a datagram if none are waiting.
+        :return: List of datagram contents
+        """
+        lengths = self._receive_batch()
+
+        if len(lengths) == 0:
+            self.poller.poll(POLL_TIMEOUT)
+            lengths = self._receive_batch()
+
+        entries = []
+        for slot, length in zip(self.slots, lengths):
+            if length > self.max_datagram_size:
+                self.oversized += 1
+                self.metrics.count_dropped()
+                self.logger.warning("Datagram dropped - bigger than %d bytes", self.max_datagram_size)
+            else:
+                entries.append(slot[:length].tobytes())
+
+        return entries
+
+    def _receive_batch(self):
+        """
+        Receive waiting datagrams into the slots without blocking
+        :return: List of the number of bytes received into each slot, in order
+        """
+        lengths = []
+
+        for slot in self.slots:
+            try:
+                length, address = self.sock.recvfrom_into(slot)
+            except socket.error as err:
+                if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    break
+                if not self.is_running:
+                    break
+                raise
+            lengths.append(length)
+
+        return lengths
+
+    def get_kernel_drops(self):
+        """
+        Get the number of datagrams the kernel has dropped because the receive buffer was full
+        :return: Number of dropped datagrams, or None if the platform doesn't report them
+        """
+        try:
+            inode = str(os.fstat(self.sock.fileno()).st_ino)
+        except (OSError, socket.error):
+            return None
+
+        for path in PROC_NET_UDP:
+            try:
+                with open(path) as table:
+                    next(table)
+                    for line in table:
+                        fields = line.split()
+                        if fields[9] == inode:
+                            return int(fields[-1])
+            except (IOError, IndexError, ValueError, StopIteration):
+                continue
+
+        return None
+
+    def get_dropped(self):
+        """
+        Get the number of datagrams that never made it in
+        :return: Datagrams dropped for being too big, plus those dropped by the kernel
+        """
+        return self.oversized + (self.get_kernel_drops() or 0)
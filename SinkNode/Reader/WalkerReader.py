@@ -1,57 +1,130 @@
-
-from SinkNode.Reader.XbeeReader import XBeeReader
-import datetime
+import logging
 import struct
+import time
+from SinkNode.Reader.XbeeReader import XBeeReader
+from SinkNode.Registry import lazy_import
+
+numpy = lazy_import("numpy")
+
+# Walker packet layout: station id, timestamp, air/wall/surface/case temperature, humidity, illuminance, sound,
+# current, battery percentage and firmware version. Compiled once rather than on every packet
+PACKET = struct.Struct(">BIHHHHHHHHBB")
+PACKET_SIZE = PACKET.size
+
+# Walkers count time from 2000-01-01 00:00 UTC; this is how many seconds after the Unix epoch that is
+EPOCH_OFFSET = 946684800
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M"
+
+# Where a raw frame came from (see XbeeReader.frame_to_entry), carried over to the decoded entry
+FRAME_DETAILS = ('source', 'source_short', 'rssi')
+
+# Readings sent as hundredths, which are scaled back to their real values
+SCALED_FIELDS = ('air_temp', 'wall_temp', 'surface_temp', 'case_temp', 'humidity', 'current')
+SCALE = 100.0
+
+# Packet layout as a NumPy structured type, for decoding recorded packets in bulk. Same order as PACKET
+PACKET_FIELDS = [('station_id', '>u1'), ('timestamp', '>u4'), ('air_temp', '>u2'), ('wall_temp', '>u2'),
+                 ('surface_temp', '>u2'), ('case_temp', '>u2'), ('humidity', '>u2'), ('illuminance', '>u2'),
+                 ('sound', '>u2'), ('current', '>u2'), ('battery', 'u1'), ('version', 'u1')]
+
+# Decoded readings as a NumPy structured type. Timestamps are Unix time in seconds
+READING_FIELDS = [('station_id', 'u1'), ('timestamp', 'i8'), ('air_temp', 'f8'), ('wall_temp', 'f8'),
+                  ('surface_temp', 'f8'), ('case_temp', 'f8'), ('humidity', 'f8'), ('illuminance', 'u2'),
+                  ('sound', 'u2'), ('current', 'f8'), ('battery', 'u1'), ('version', 'u1')]
+
+
+def decode_packet(packet):
+    """
+    Decode a single Walker data packet
+    :param packet: Raw 23-byte packet from the unit
+    :return: Decoded entry dictionary, or None if the packet is the wrong size
+    """
+    if len(packet) != PACKET_SIZE:
+        return None
+
+    station_id, ts, air_temp, wall_temp, surface_temp, case_temp, humidity, lux, sound, current, battery_percent, \
+        version = PACKET.unpack(packet)
+
+    return {
+        'id': WalkerReader.UNIT_CLASS + str(station_id),
+        'timestamp': time.strftime(TIMESTAMP_FORMAT, time.gmtime(ts + EPOCH_OFFSET)),
+        'air_temp': air_temp / SCALE,
+        'wall_temp': wall_temp / SCALE,
+        'surface_temp': surface_temp / SCALE,
+        'case_temp': case_temp / SCALE,
+        'humidity': humidity / SCALE,
+        'illuminance': lux,
+        'sound': sound,
+        'current': current / SCALE,
+        'battery': battery_percent,
+        'version': version
+    }
+
+
+def decode_packets(data):
+    """
+    Decode many Walker data packets at once, e.g. when backfilling recorded data
+    Needs NumPy. The packets are decoded in place as a structured array and scaled a whole field at a time.
+    :param data: Packets laid end to end, as a string or buffer, or a list of packets. A partial packet at the end
+    is ignored
+    :return: NumPy structured array of readings (see READING_FIELDS), one per packet
+    """
+    if isinstance(data, (list, tuple)):
+        data = "".join(data)
+
+    count = len(data) // PACKET_SIZE
+    packets = numpy.frombuffer(data, dtype=numpy.dtype(PACKET_FIELDS), count=count)
+
+    readings = numpy.empty(count, dtype=numpy.dtype(READING_FIELDS))
+    for name, _ in READING_FIELDS:
+        readings[name] = packets[name]
+
+    readings['timestamp'] += EPOCH_OFFSET
+    for name in SCALED_FIELDS:
+        readings[name] /= SCALE
+
+    return readings
+
+
+def read_recording(path):
+    """
+    Decode a file of recorded Walker packets
+    :param path: File holding packets laid end to end
+    :return: NumPy structured array of readings (see decode_packets)
+    """
+    with open(path, "rb") as recording:
+        return decode_packets(recording.read())
 
 
 class WalkerReader(XBeeReader):
     UNIT_CLASS = "stalker"
 
-    def __init__(self, port, baud_rate, logger_name=__name__):
-        super(WalkerReader, self).__init__(self, port, baud_rate)
+    def __init__(self, port, baud_rate, logger_name=__name__, logger_level=logging.FATAL):
+        # Packets are decoded straight from the raw frame payloads
+        super(WalkerReader, self).__init__(port, baud_rate, logger_level=logger_level, raw_frames=True)
 
     def convert_to_json(self, entry_line):
         """
         Convert the Walker data packet into a readable format
-        :param entry_line: Raw byte-encoded data from the unit
-        :return: decoded data dictionary
+        :param entry_line: Raw frame entry from the unit (see frame_to_entry), or the raw packet data on its own
+        :return: decoded data dictionary, with the sender's address and signal strength if the frame had them, or
+        None if the packet couldn't be decoded
         """
-        if len(entry_line) == 23:
-
-            offset = self.total_seconds((datetime.datetime(2000, 1, 1, 0, 0, 0, 0) - datetime.datetime(1970, 1, 1, 0, 0, 0, 0)))
-
-            try:
-                station_id, ts, air_temp, wall_temp, surface_temp, case_temp, humidity, lux, sound, current, \
-                battery_percent, version = struct.unpack(">BIHHHHHHHHBB", entry_line)
-                ts_time = datetime.datetime.utcfromtimestamp(ts + offset).strftime("%Y-%m-%d %H:%M")
-
-                new_entry = {
-                    'id': self.UNIT_CLASS + str(station_id),
-                    'timestamp': ts_time,
-                    'air_temp': float(air_temp) / 100,
-                    'wall_temp': float(wall_temp) / 100,
-                    'surface_temp': float(surface_temp) / 100,
-                    'case_temp': float(case_temp) / 100,
-                    'humidity': float(humidity) / 100,
-                    'illuminance': lux,
-                    'sound': sound,
-                    'current': float(current) / 100,
-                    'battery': battery_percent,
-                    'version': version
-                }
-            except Exception:
-                new_entry = 0
-                pass
-
-        self.logger.info("Received Data: {}".format(new_entry))
-        return new_entry
+        frame = None
+        if isinstance(entry_line, dict):
+            frame, entry_line = entry_line, entry_line['data']
 
-    def total_seconds(deltatime):
-        """
-        Convert the date into the total number of seconds since the epoch
-        :param deltatime: Date object to be converted
-        :return: Total number of seconds from epoch to date.
-        """
-        return (deltatime.microseconds + (deltatime.seconds + deltatime.days * 24 * 3600) * 10 ** 6) / 10 ** 6
+        new_entry = decode_packet(entry_line)
+
+        if new_entry is None:
+            self.logger.warning("Packet is %d bytes instead of %d", len(entry_line), PACKET_SIZE)
+            return None
 
+        if frame is not None:
+            for key in FRAME_DETAILS:
+                if key in frame:
+                    new_entry[key] = frame[key]
 
+        self.logger.info("Received Data: %s", new_entry)
+        return new_entry
@@ -3,31 +3,132 @@ from datetime import datetime
 
 sys.path.append('/mnt/sda1/netaddr')
 
+import heapq
 import json
-from threading import Thread
+import socket
+import time
+from collections import OrderedDict
+from threading import Thread, Event, Lock, Condition
+from json.encoder import encode_basestring_ascii
 from time import sleep
-from netaddr import *
-from scapy.all import *
 import logging
-from Queue import Queue
+from Queue import Queue, Empty
 from SinkNode.Reader import Reader
+from SinkNode.Reader.Dot11Parser import PROBE_REQUEST_SUBTYPE, PROBE_RESPONSE_SUBTYPE, SSID_BEACON_FRAME, \
+    CAPTURE_FILTER, SNAP_LENGTH, EMPTY_RADIOTAP_HEADER, parse_frame, format_mac, open_capture_socket
+from SinkNode.Reader.CaptureFile import LINKTYPE_IEEE802_11, LINKTYPE_IEEE802_11_RADIOTAP, read_capture
+from SinkNode.EntryQueue import EntryQueue, BLOCK, DROP_NEWEST, DEFAULT_BATCH_SIZE
+from SinkNode.Metrics import monotonic
+from SinkNode.Registry import lazy_import
+
+# Heavy optional dependencies - only loaded once the reader is actually used
+netaddr = lazy_import("netaddr")
+scapy = lazy_import("scapy.all")
 
 
-PROBE_REQUEST_SUBTYPE = 4
-PROBE_RESPONSE_SUBTYPE = 5
-SSID_BEACON_FRAME = 8
 ASSOCIATION_REQUEST = 0
 ASSOCIATION_RESPONSE = 1
 DATA = 0x00
 
+# Captured packets waiting to be processed. The sniffer can't be held up, so packets are dropped when this fills up
+PACKET_QUEUE_SIZE = 10000
+
+# Longest the capture thread waits for a frame before checking whether it has been stopped (in seconds)
+CAPTURE_TIMEOUT = 0.5
+
+# How often the device table is checked for devices that haven't been seen for a while (in seconds)
+EXPIRY_INTERVAL = 1.0
+
+# Device entry as dumped. Addresses and times are always plain ASCII; the vendor and SSID are JSON-encoded first
+DEVICE_JSON = '{"eui": "%s", "vendor": %s, "last_seen": "%s", "ssid": %s}'
+LAST_SEEN_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Number of OUIs (the vendor part of a MAC address) whose vendor is remembered
+VENDOR_CACHE_SIZE = 4096
+MAX_VENDOR_LENGTH = 20
+UNREGISTERED_VENDOR = 'Unregistered'
+
+
+def lookup_vendor(oui):
+    """
+    Look up who an OUI is registered to in netaddr's database
+    :param oui: First three octets of a MAC address, e.g. "00-1C-B3"
+    :return: Vendor name, shortened to MAX_VENDOR_LENGTH and without commas, or UNREGISTERED_VENDOR
+    """
+    try:
+        vendor = netaddr.OUI(oui).registration().org
+    except (netaddr.NotRegisteredError, netaddr.AddrFormatError):
+        return UNREGISTERED_VENDOR
+    return vendor[0:MAX_VENDOR_LENGTH].replace(',', '')
+
+
+class VendorCache(object):
+    """
+    Least-recently-used cache of device vendors, keyed by OUI.
+    Looking a vendor up means searching netaddr's OUI database, which is far too slow to do for every new device.
+    Devices made by the same vendor share an OUI, so only the first device from each vendor pays for the lookup.
+    Locally administered addresses (which is what randomised MACs are) don't have a vendor, so they're never looked
+    up or cached.
+    """
+
+    def __init__(self, size=VENDOR_CACHE_SIZE):
+        """
+        :param size: Most OUIs to remember
+        """
+        self.size = size
+        self.vendors = OrderedDict()
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_vendor(self, mac_address):
+        """
+        Get the vendor of a device
+        :param mac_address: MAC address in "xx-xx-xx-xx-xx-xx" format
+        :return: Vendor name, or UNREGISTERED_VENDOR
+        """
+        if int(mac_address[0:2], 16) & 0x02:
+            return UNREGISTERED_VENDOR
+
+        oui = mac_address[0:8].upper().replace(':', '-')
+
+        with self.lock:
+            vendor = self.vendors.pop(oui, None)
+            if vendor is not None:
+                # Put it back as the most recently used
+                self.vendors[oui] = vendor
+                self.hits += 1
+                return vendor
+
+        # Looked up outside the lock so other readers aren't held up
+        vendor = lookup_vendor(oui)
+
+        with self.lock:
+            self.misses += 1
+            self.vendors[oui] = vendor
+            if len(self.vendors) > self.size:
+                self.vendors.popitem(last=False)
+
+        return vendor
+
+
+# Shared by every reader
+VENDOR_CACHE = VendorCache()
+
 
 class WifiDeviceReader(Reader):
     """
     Read in WiFi-enabled devices using a monitor-mode transceiver
+
+    Recorded captures (.pcap or .pcapng, with radiotap or plain 802.11 frames) can be replayed through the same
+    device tracking instead, e.g. to reprocess archived traffic or to benchmark without a monitor-mode card. Replays
+    run as fast as the frames can be processed unless a replay speed is given.
     """
 
     def __init__(self, interface='wlan0', entry_separator='|', dump_period=None, include_access_points=False, id='WiFi',
-                 cumulative_list=False, logger_level=logging.FATAL, outbox=None):
+                 cumulative_list=False, logger_level=logging.FATAL, outbox=None, queue_size=PACKET_QUEUE_SIZE,
+                 queue_policy=DROP_NEWEST, capture_files=None, replay_speed=None, device_ttl=None, max_devices=None):
         """
         Make a WiFi scanner object to search for surrounding WiFi-enabled devices.
         Your wireless interface needs to be in monitor mode for this class to function properly.
@@ -38,12 +139,22 @@ class WifiDeviceReader(Reader):
         Ubuntu: sudo ifconfig wlan0 up
 
         :param entry_separator: Separator character between devices when dumping device list
-        :param dump_period: Amount of time between device list dumps (in seconds)
+        :param dump_period: Amount of time between device list dumps (in seconds). Replays dump by the time in the
+        capture, however fast they're replayed
         :param include_access_points: Include fixed AP in the device scan (true == yes)
         :param id: Data tag for the device dump (important for SinkNode logging later on)
         :param cumulative_list: Keep the device list after every dump or scrap. (true == keep; false == scrap)
         :param logger_level: Logger level for class debugging and information
         :param outbox: Queue where processed device lists will be dumped
+        :param queue_size: Maximum number of captured packets waiting to be processed. 0 is unbounded
+        :param queue_policy: What to do with captured packets when the packet queue is full (see EntryQueue.POLICIES)
+        :param capture_files: Capture file, or list of capture files, to replay instead of listening to the interface.
+        Replayed packets are never dropped - the replay waits for room in the packet queue instead
+        :param replay_speed: How many times faster than real time to replay captures. None replays as fast as possible
+        :param device_ttl: Time a device stays in the device list after it was last seen (in seconds), by the time in
+        the capture for replays. None keeps devices until they're dumped (or forever, with a cumulative list)
+        :param max_devices: Most devices kept in the device list. The devices seen longest ago make way for new ones.
+        None is unlimited
         :return:
         """
         self.interface = interface
@@ -55,15 +166,39 @@ class WifiDeviceReader(Reader):
 
         self.listener_thread = Thread(target=self.start_wifi_scan)
         self.listener_thread.setDaemon(True)
-        self.packet_queue = Queue()
+        if isinstance(capture_files, basestring):
+            capture_files = [capture_files]
+        self.capture_files = capture_files
+        self.replay_speed = replay_speed
+
+        # Set once every capture file has been replayed
+        self.replay_finished = Event()
+
+        # Replays run on the capture's clock - the time of the latest frame processed, when the next dump is due by
+        # that clock, and whether every replayed frame has been processed
+        self.capture_time = 0
+        self.next_dump = None
+        self.replay_processed = False
+
+        if capture_files is not None:
+            queue_policy = BLOCK
+        self.packet_queue = EntryQueue(queue_size, queue_policy)
 
         self.process_thread = Thread(target=self.process_packets)
         self.process_thread.setDaemon(True)
 
+        # Guards the device list, which is filled by the processing thread and dumped by the read thread. Notified
+        # when new devices are found and when the reader is stopped
+        self.device_condition = Condition()
+
         self.device_list = {}
+        self.device_ttl = device_ttl
+        self.max_devices = max_devices
+        self.next_expiry = 0
         self.outbox = outbox
 
         super(WifiDeviceReader, self).__init__(outbox=outbox, logger_level=logger_level, reader_id=self.id)
+        self.metrics.queue = self.packet_queue
 
     def start(self):
         """
@@ -84,74 +219,192 @@ class WifiDeviceReader(Reader):
         super(WifiDeviceReader, self).stop()
         self.logger.info("Stopping Wifi listener")
 
+        # Wake up a dump that's waiting for devices
+        with self.device_condition:
+            self.device_condition.notify_all()
+
     def read_entry(self):
         """
         Periodically dump the device list.
         If no dump period is specified, devices information will be transmitted as soon as it comes in.
+        Sleeps until the dump is due or a device is found rather than checking the list, and wakes up when the reader
+        is stopped.
 
-        :return: List of keys(MAC addresses) of collected devices. Can be used to pull Device data from the list.
+        :return: Snapshot of the collected devices (list of Device objects), or None if the reader has been stopped
         """
+        with self.device_condition:
+            if self.dump_period is not None and self.capture_files is not None:
+                # Dumps are due by the capture's clock. Once the replay is over, what's left goes straight away
+                while self.is_running and not self.replay_processed and \
+                        (self.next_dump is None or self.capture_time < self.next_dump):
+                    self.device_condition.wait()
+
+                if self.next_dump is not None:
+                    while self.next_dump <= self.capture_time:
+                        self.next_dump += self.dump_period
+
+            # Set up a periodic write if specified
+            elif self.dump_period is not None:
+                self.logger.debug("Sleeping for %s seconds...", self.dump_period)
+                dump_time = monotonic() + self.dump_period
+
+                while self.is_running:
+                    remaining = dump_time - monotonic()
+                    if remaining <= 0:
+                        break
+                    self.device_condition.wait(remaining)
+
+            # Waiting time is over - send whatever you got. If there's nothing, wait until there's something
+            while len(self.device_list) < 1:
+                if not self.is_running:
+                    return None
+                self.device_condition.wait()
+
+            return self.take_snapshot()
+
+    def take_snapshot(self):
+        """
+        Take the devices to be dumped
+        Without a cumulative list, the whole list is swapped for an empty one, so devices found while the dump is
+        being serialised go into the next dump. A cumulative list is copied.
+        :return: List of Device objects
+        """
+        with self.device_condition:
+            snapshot = self.device_list.values()
+            if not self.cumulative_list:
+                self.device_list = {}
 
-        # Set up a periodic write if specified
-        if self.dump_period is not None:
-            self.logger.debug("Sleeping for {} seconds...".format(self.dump_period))
-            sleep(self.dump_period)
-
-        # Waiting time is over - send whatever you got. If there's nothing, wait until there's something
-        while len(self.device_list) < 1:
-            sleep(0.5)
-
-        self.logger.info("Found {} device(s)".format(len(self.device_list)))
-        return self.device_list.keys()
+        self.logger.info("Found %d device(s)", len(snapshot))
+        return snapshot
 
     def convert_to_json(self, entry_line):
         """
         Convert the device list into a transmissible JSON string
+        The devices are serialised in a single pass over the snapshot, which the other threads no longer touch.
 
-        :param entry_line: List of device MAC addresses. Can be used to pull data from the device list
+        :param entry_line: Snapshot of devices to dump (see take_snapshot)
         :return: JSON string containing all current device information.
         The device list is contained under the 'payload' key as a separated string.
         """
-        s = ""
-        for d in entry_line:
-
-            # Get the device info from the list, either destructively or cumulatively
-            if self.cumulative_list:
-                entry = self.device_list[d]
-            else:
-                entry = self.device_list.pop(d).to_json()
+        separator = self.entry_separator
+        times = {}
 
-            entry.replace(self.entry_separator, '')
-            s += entry + self.entry_separator
-        payload = json.dumps({"id": self.id, "payload": s})
+        entries = [device.to_json(times).replace(separator, '') for device in entry_line]
+        entries.append('')
+        payload = json.dumps({"id": self.id, "payload": separator.join(entries)})
 
-        self.logger.debug("Dumping: {}".format(payload))
+        self.logger.debug("Dumping: %s", payload)
         return payload
 
     def start_wifi_scan(self):
         """
         Start listening to surrounding wifi signals to identify APs and devices.
-        Received packets are processed in the 'handle_packet' callback function.
+        The kernel filters out everything but probes and beacons, and the few fields needed are pulled straight out of
+        the raw frames (see Dot11Parser). Where a filtered packet socket isn't available, scapy is used to capture
+        instead, with the same filter.
         No packets are stored so the scan can run continuously.
 
         :return: None
         """
+        if self.capture_files is not None:
+            self.replay_captures()
+            return
+
         try:
-            sniff(iface=self.interface, prn=self.handle_packet, store=0)
-        except KeyboardInterrupt:
-            sys.exit(0)
+            sock = open_capture_socket(self.interface, CAPTURE_TIMEOUT)
+        except (AttributeError, socket.error, OSError) as err:
+            self.logger.warning("Raw capture unavailable (%s) - capturing with scapy", err)
+            try:
+                scapy.sniff(iface=self.interface, filter=CAPTURE_FILTER, prn=self.handle_packet, store=0,
+                            stop_filter=lambda pkt: not self.is_running)
+            except KeyboardInterrupt:
+                sys.exit(0)
+            return
+
+        try:
+            while self.is_running:
+                try:
+                    frame = sock.recv(SNAP_LENGTH)
+                except socket.timeout:
+                    continue
+                self.handle_frame(frame)
+        finally:
+            sock.close()
+
+    def replay_captures(self):
+        """
+        Feed the frames in the capture files through the device scan, as if they were being captured
+        :return: Number of frames replayed
+        """
+        count = 0
+        start_time = None
+        first_timestamp = None
+
+        for path in self.capture_files:
+            self.logger.info("Replaying %s", path)
+
+            for timestamp, linktype, frame in read_capture(path):
+                if not self.is_running:
+                    break
+
+                if linktype == LINKTYPE_IEEE802_11:
+                    frame = EMPTY_RADIOTAP_HEADER + frame
+                elif linktype != LINKTYPE_IEEE802_11_RADIOTAP:
+                    continue
+
+                if self.replay_speed and timestamp is not None:
+                    # Wait until the frame is due, relative to the first frame of the replay
+                    if start_time is None:
+                        start_time = monotonic()
+                        first_timestamp = timestamp
+                    delay = (timestamp - first_timestamp) / self.replay_speed - (monotonic() - start_time)
+                    if delay > 0:
+                        sleep(delay)
+
+                self.handle_frame(frame, timestamp)
+                count += 1
+
+        self.logger.info("Replayed %d frames", count)
+        self.replay_finished.set()
+        return count
+
+    def handle_frame(self, frame, timestamp=None):
+        """
+        Pass the device details in a raw captured frame on to the packet queue
+        :param frame: Raw radiotap-headed 802.11 frame
+        :param timestamp: Time the frame was captured, as from time.time(). None is now
+        :return: None
+        """
+        fields = parse_frame(frame)
+        if fields is None:
+            return
+
+        subtype, addr1, addr2, ssid = fields
+
+        # Grab address from frame. Different frame types change the location of the device address (src/dst).
+        if subtype == PROBE_REQUEST_SUBTYPE or subtype == SSID_BEACON_FRAME:
+            address = addr2
+        elif subtype == PROBE_RESPONSE_SUBTYPE:
+            address = addr1
+        else:
+            return
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        self.packet_queue.put((subtype, format_mac(address), ssid, timestamp))
 
     def handle_packet(self, pkt):
         """
-        Callback function for wifi scanning.
+        Callback function for wifi scanning with scapy.
         Probe packets are examined for device information.
         Only 802.11 Packets are passed into the packet queue for examination.
 
         :param pkt: Packet to be examined
         :return: None
         """
-        if pkt.haslayer(Dot11):
-            self.packet_queue.put(pkt)
+        if pkt.haslayer(scapy.Dot11):
+            self.packet_queue.put((pkt.subtype, self.get_device_address(pkt), self.get_ssid(pkt), pkt.time))
             self.logger.debug("Packet received")
 
     def process_packets(self):
@@ -164,24 +417,95 @@ class WifiDeviceReader(Reader):
         :return:
         """
         while self.is_running:
-            new_packet = self.packet_queue.get()
+            try:
+                new_packets = self.packet_queue.get_batch(DEFAULT_BATCH_SIZE, timeout=EXPIRY_INTERVAL)
+            except Empty:
+                if self.capture_files is None:
+                    # Nothing has been captured for a while, but devices still have to age out of the list
+                    self.expire_devices()
+                elif self.replay_finished.is_set() and not self.replay_processed:
+                    # The capture's clock has stopped - the last dump doesn't have to wait for it
+                    with self.device_condition:
+                        self.replay_processed = True
+                        self.device_condition.notify_all()
+                continue
+
+            if self.capture_files is not None:
+                self.capture_time = max(self.capture_time, new_packets[-1][3])
+                now = self.capture_time
+            else:
+                now = time.time()
+
+            # The whole batch goes in under the lock - dumps only hold it long enough to swap the list out
+            with self.device_condition:
+                device_list = self.device_list
+                found = len(device_list)
 
-            ssid = self.get_ssid(new_packet)
-            eui = self.get_device_address(new_packet)
-            is_ap = self.is_access_point(new_packet)
+                for subtype, eui, ssid, seen in new_packets:
+                    if eui is None:
+                        continue
 
-            # Only accept devices with valid addresses that are not already in the device list
-            if eui is not None and eui not in self.device_list:
+                    # Devices already in the list only need to be marked as seen
+                    device = device_list.get(eui)
+                    if device is not None:
+                        device.time_last_seen = seen
+                        continue
 
-                if is_ap:
-                    if self.include_access_points:
-                        ssid += " (AP)"
-                        self.device_list[eui] = self.Device(eui, ssid)
+                    if subtype == SSID_BEACON_FRAME:
+                        if self.include_access_points:
+                            ssid = (ssid or "") + " (AP)"
+                            device_list[eui] = self.Device(eui, ssid, seen=seen)
 
-                else:
-                    self.device_list[eui] = self.Device(eui, ssid)
+                    else:
+                        device_list[eui] = self.Device(eui, ssid, seen=seen)
 
-            self.packet_queue.task_done()
+                if now >= self.next_expiry or (self.max_devices is not None and len(device_list) > self.max_devices):
+                    self.expire_devices(now)
+
+                dump_due = False
+                if self.capture_files is not None and self.dump_period is not None:
+                    # The first dump of a replay is due a dump period into the capture
+                    if self.next_dump is None:
+                        self.next_dump = now + self.dump_period
+                    dump_due = now >= self.next_dump
+
+                if len(device_list) > found or dump_due:
+                    self.device_condition.notify_all()
+
+            self.packet_queue.task_done(len(new_packets))
+
+    def expire_devices(self, now=None):
+        """
+        Remove devices that haven't been seen within the device TTL, then the devices seen longest ago if there are
+        still too many
+        :param now: Current time, as from time.time(), or the capture's time for replays
+        :return: Number of devices removed
+        """
+        if now is None:
+            now = time.time()
+        self.next_expiry = now + EXPIRY_INTERVAL
+
+        with self.device_condition:
+            device_list = self.device_list
+
+            expired = []
+            if self.device_ttl is not None:
+                oldest_allowed = now - self.device_ttl
+                expired = [eui for eui, device in device_list.iteritems() if device.time_last_seen < oldest_allowed]
+                for eui in expired:
+                    del device_list[eui]
+
+            if self.max_devices is not None and len(device_list) > self.max_devices:
+                # Make some room at the same time, so a busy table isn't trimmed on every batch
+                excess = len(device_list) - self.max_devices + self.max_devices // 10
+                oldest = heapq.nsmallest(excess, device_list.iteritems(), key=lambda item: item[1].time_last_seen)
+                for eui, _ in oldest:
+                    del device_list[eui]
+                expired.extend(oldest)
+
+        if len(expired) > 0:
+            self.logger.debug("Removed %d device(s) from the device list", len(expired))
+        return len(expired)
 
     @staticmethod
     def get_ssid(pkt):
@@ -192,10 +516,10 @@ class WifiDeviceReader(Reader):
         """
         ssid = None
 
-        if pkt.haslayer(Dot11Elt):
-            p = pkt[Dot11Elt]
+        if pkt.haslayer(scapy.Dot11Elt):
+            p = pkt[scapy.Dot11Elt]
 
-            while isinstance(p, Dot11Elt):
+            while isinstance(p, scapy.Dot11Elt):
                 if p.ID == 0:
                     ssid = p.info
                 p = p.payload
@@ -222,16 +546,18 @@ class WifiDeviceReader(Reader):
 
         # Put MAC address in standard format
         if address is not None and len(address) > 0:
-            address = str(EUI(address))
+            address = str(netaddr.EUI(address))
 
         return address
 
-    class Device:
+    class Device(object):
         """
         Data model object for wireless devices or access points
+        Devices are slotted so that a table of many thousands of them stays small.
         """
+        __slots__ = ('mac_address', 'vendor', 'ssid', 'packet_type', 'time_last_seen')
 
-        def __init__(self, mac_address, ssid=None, packet_type=None):
+        def __init__(self, mac_address, ssid=None, packet_type=None, seen=None):
             """
             Create a new device.
             Vendor ID is determined based on the first three octets of the MAC address
@@ -239,45 +565,45 @@ class WifiDeviceReader(Reader):
             :param mac_address: Mac address of device in "xx-xx-xx-xx-xx-xx" format
             :param ssid: Network ID associated with the device
             :param packet_type: Subtype of the 802.11 packet that the device was discovered
+            :param seen: Time the device was seen, as from time.time(). None is now
             :return:
             """
-            self.mac_address = EUI(mac_address)
-            self.time_last_seen = datetime.now()
+            self.mac_address = mac_address
+            self.time_last_seen = seen or time.time()
 
             self.ssid = None
             self.set_ssid(ssid)
 
             self.packet_type = packet_type
 
-            # Attempt to find the MAC address; Not all devices have registered vendor IDs
-            try:
-                self.vendor = self.mac_address.oui.registration().org
-                if len(self.vendor) > 20:
-                    self.vendor = self.vendor[0:20]
-            except NotRegisteredError:
-                self.vendor = 'Unregistered'
-            self.vendor.replace(',', '')  # Sanitise commas
+            # Not all devices have registered vendor IDs
+            self.vendor = VENDOR_CACHE.get_vendor(mac_address)
 
         def __str__(self):
-            return "eui: {}, vendor: {}, last_seen: {}, ssid: {}".format(str(self.mac_address),
+            return "eui: {}, vendor: {}, last_seen: {}, ssid: {}".format(self.mac_address,
                                                                          self.vendor,
-                                                                         self.time_last_seen.isoformat(),
+                                                                         self.get_time_last_seen().isoformat(),
                                                                          self.ssid)
 
-        def to_json(self):
+        def to_json(self, times=None):
             """
             Output the device entry in JSON format
+            :param times: Dictionary of last-seen times already formatted, keyed by second. Shared between the devices
+            in a dump, as most of them were last seen in the same few seconds
             :return: JSON formatted string of the device entry
             """
-            output = {'eui': str(self.mac_address),
-                      'vendor': self.vendor,
-                      'last_seen': self.time_last_seen.strftime("%Y-%m-%d %H:%M:%S"),
-                      'ssid': self.ssid
-                      }
+            second = int(self.time_last_seen)
+            if times is None:
+                times = {}
+
+            last_seen = times.get(second)
+            if last_seen is None:
+                last_seen = times[second] = time.strftime(LAST_SEEN_FORMAT, time.localtime(second))
 
             json_string = ""
             try:
-                json_string = json.dumps(output)
+                json_string = DEVICE_JSON % (self.mac_address, encode_basestring_ascii(self.vendor), last_seen,
+                                             "null" if self.ssid is None else encode_basestring_ascii(self.ssid))
             except UnicodeDecodeError as err:
                 print("\n\nUnicode error: {}\n\n".format(str(self)))
 
@@ -285,12 +611,12 @@ class WifiDeviceReader(Reader):
 
         def update_last_seen(self, dt=None):
             if dt is not None:
-                self.time_last_seen = dt
+                self.time_last_seen = time.mktime(dt.timetuple()) + dt.microsecond / 1e6
             else:
-                self.time_last_seen = datetime.now()
+                self.time_last_seen = time.time()
 
         def get_time_last_seen(self):
-            return self.time_last_seen
+            return datetime.fromtimestamp(self.time_last_seen)
 
         def set_ssid(self, ssid):
             """
@@ -1,35 +1,96 @@
-from xbee import ZigBee
 from SinkNode.Reader.SerialReader import *
+from SinkNode.Registry import lazy_import
 import json
 
+xbee = lazy_import("xbee")
 
-# This if statement removes errors when building the documentation
-if 'api_responses' in ZigBee.__dict__:
-    ZigBee.api_responses[b'\xa1'] = {'name': 'route_record_indicator', 'structure': [{'name': 'data', 'len': None}]}
-    ZigBee.api_responses[b'\xa2'] = {'name': 'device_authenticated_indicator',
-                                     'structure': [{'name': 'data', 'len': None}]}
-    ZigBee.api_responses[b'\xa3'] = {'name': 'many_to_one_route_request_indicator',
-                                     'structure': [{'name': 'data', 'len': None}]}
-    ZigBee.api_responses[b'\xa4'] = {'name': 'register_joining_device_indicator',
-                                     'structure': [{'name': 'data', 'len': None}]}
-    ZigBee.api_responses[b'\xa5'] = {'name': 'join_notification_status', 'structure': [{'name': 'data', 'len': None}]}
+# Frames that carry data sent by another node
+DATA_FRAMES = ('rx', 'rx_explicit')
+
+
+def _add_api_responses():
+    """
+    Teach the XBee library about the extra frame types sent by the network
+    Done when the first reader is created rather than on import, so the xbee library is only loaded if it's used.
+    :return: None
+    """
+    # This if statement removes errors when building the documentation
+    if 'api_responses' in xbee.ZigBee.__dict__ and b'\xa1' not in xbee.ZigBee.api_responses:
+        xbee.ZigBee.api_responses[b'\xa1'] = {'name': 'route_record_indicator', 'structure': [{'name': 'data', 'len': None}]}
+        xbee.ZigBee.api_responses[b'\xa2'] = {'name': 'device_authenticated_indicator',
+                                              'structure': [{'name': 'data', 'len': None}]}
+        xbee.ZigBee.api_responses[b'\xa3'] = {'name': 'many_to_one_route_request_indicator',
+                                              'structure': [{'name': 'data', 'len': None}]}
+        xbee.ZigBee.api_responses[b'\xa4'] = {'name': 'register_joining_device_indicator',
+                                              'structure': [{'name': 'data', 'len': None}]}
+        xbee.ZigBee.api_responses[b'\xa5'] = {'name': 'join_notification_status', 'structure': [{'name': 'data', 'len': None}]}
+
+
+def frame_to_entry(frame):
+    """
+    Turn a received XBee data frame into an entry
+    The payload is passed on as the bytes that were received, without being copied or encoded.
+    :param frame: Frame dictionary from the xbee library
+    :return: Entry dictionary with the payload under 'data', the frame type under 'frame', and the sender's 64-bit
+    and 16-bit addresses (as hex) under 'source' and 'source_short', plus 'rssi' (in dBm) if the frame reports it
+    """
+    entry = {'data': frame['rf_data'], 'frame': frame['id']}
+
+    if 'source_addr_long' in frame:
+        entry['source'] = frame['source_addr_long'].encode('hex')
+    if 'source_addr' in frame:
+        entry['source_short'] = frame['source_addr'].encode('hex')
+    if 'rssi' in frame:
+        entry['rssi'] = -ord(frame['rssi'])
+
+    return entry
 
 
 class XBeeReader(SerialReader):
     """
     XBeeReader listens for incoming packets on an XBee running in API mode.
     Individual packets parsed over serial port.
+
+    By default each payload is passed on hex-encoded, as {"data": "<hex>"}. With raw_frames, each frame is passed on
+    as a structured entry holding the payload bytes and where it came from instead (see frame_to_entry), which skips
+    encoding the payload and decoding it again.
     """
-    def __init__(self, port, baud_rate, logger_level=logging.FATAL):
+    def __init__(self, port, baud_rate, logger_level=logging.FATAL, raw_frames=False):
+        """
+        :param raw_frames: Pass frames on as structured entries with the raw payload rather than hex-encoded JSON
+        """
         super(XBeeReader, self).__init__(port, baud_rate, logger_level=logger_level)
-        self.xbee = ZigBee(self.ser, escaped=True)
+        _add_api_responses()
+        self.xbee = xbee.ZigBee(self.ser, escaped=True)
         self.logger.name = "XBeeReader"
+        self.raw_frames = raw_frames
+
+    def read_entries(self):
+        """
+        Read in the next packet
+        Packets are framed by the XBee library rather than by delimiters, so this skips the serial reader's framing.
+        :return: List holding the data payload, or an empty list if the frame wasn't a data packet
+        """
+        return Reader.read_entries(self)
 
     def read_entry(self):
         """
         Read in a packet from the XBee
-        :return: Received data payload from XBee packet
+        :return: Received data payload from XBee packet - a structured entry if reading raw frames
         """
         frame = self.xbee.wait_read_frame()  # Data packet - read in the data
-        if frame['id'] == 'rx' or frame['id'] == 'rx_explicit':
-            return json.dumps({"data": str(frame['rf_data']).encode('hex')})
\ No newline at end of file
+        if frame['id'] in DATA_FRAMES:
+            if self.raw_frames:
+                return frame_to_entry(frame)
+            return json.dumps({"data": str(frame['rf_data']).encode('hex')})
+
+    def convert_to_json(self, entry_line):
+        """
+        Convert the entry line to JSON
+        Raw frames are already structured entries, so they're passed straight on.
+        :param entry_line: Structured entry, or JSON-formatted string
+        :return: Entry dictionary, or None if it couldn't be converted
+        """
+        if isinstance(entry_line, dict):
+            return entry_line
+        return super(XBeeReader, self).convert_to_json(entry_line)
@@ -1,7 +1,11 @@
 import logging
 from threading import Thread
 from Queue import Queue
-import json
+
+from SinkNode.Entry import freeze
+from SinkNode.EntryQueue import EntryQueue
+from SinkNode.Metrics import StageMetrics, monotonic
+from SinkNode.Reader.JSONDecoder import JSONDecoder
 
 LOGGER_FORMAT = "%(asctime)s - %(name)s - %(levelname)s: %(message)s"
 
@@ -15,18 +19,29 @@ class Reader(object):
     Data is converted into JSON format, then placed in a queue for processing.
     """
 
-    def __init__(self, outbox=None, logger_level=logging.FATAL, reader_id=__name__, logger_format=LOGGER_FORMAT):
+    def __init__(self, outbox=None, logger_level=logging.FATAL, reader_id=__name__, logger_format=LOGGER_FORMAT,
+                 decoder=None):
+        """
+        :param decoder: JSONDecoder used to convert entries. None uses the fastest JSON library installed
+        """
         self.outbox = outbox
+        self.decoder = decoder or JSONDecoder()
 
         self.is_running = False
         self.read_thread = Thread(target=self._read_loop)
 
+        # Sources can block indefinitely (e.g. stdin), so a stuck reader mustn't keep the process alive
+        self.read_thread.setDaemon(True)
+
         self.logger = logging.getLogger(reader_id)
         log_handler = logging.StreamHandler()
         log_handler.setFormatter(logging.Formatter(logger_format))
         self.logger.addHandler(log_handler)
         self.logger.setLevel(logger_level)
 
+        # Entries read, entries passed on and entries that couldn't be converted
+        self.metrics = StageMetrics(reader_id)
+
     def stop(self):
         """
         Halt the reading process.
@@ -36,6 +51,17 @@ class Reader(object):
         self.logger.info("Stopping reader...")
         self.is_running = False
 
+    def join(self, timeout=None):
+        """
+        Wait for the read thread to finish
+        The thread only finishes once the current read_entry call returns.
+        :param timeout: Maximum time to wait (in seconds). None waits until the thread has exited
+        :return: True if the thread has finished
+        """
+        if self.read_thread.is_alive():
+            self.read_thread.join(timeout)
+        return not self.read_thread.is_alive()
+
     def start(self):
         """
         Read in packets of data and convert them to JSON format
@@ -53,14 +79,68 @@ class Reader(object):
         :return:
         """
         while self.is_running:
-            raw_entry = self.read_entry()
-            self.logger.debug("Raw entry: " + str(raw_entry))
+            raw_entries = self.read_entries()
+            if len(raw_entries) == 0:
+                continue
+
+            self.metrics.count_received(len(raw_entries))
+            processed_entries = []
+            errors = 0
+
+            # Checked once per batch rather than formatting two messages per entry that are usually thrown away
+            if self.logger.isEnabledFor(logging.DEBUG):
+                for raw_entry in raw_entries:
+                    self.logger.debug("Raw entry: %s", raw_entry)
+
+            for processed_entry in self.convert_entries(raw_entries):
+                if isinstance(processed_entry, dict):
+                    # Stamp the entry as it comes in so the later stages can tell how long it has taken to reach them
+                    processed_entry = freeze(processed_entry)
+                    processed_entry.ingest_time = monotonic()
+                elif not processed_entry:
+                    # Conversion failed - there's nothing to pass on
+                    errors += 1
+                    continue
+
+                processed_entries.append(processed_entry)
+
+            if errors > 0:
+                self.metrics.count_errors(errors)
+
+            if self.logger.isEnabledFor(logging.DEBUG):
+                for processed_entry in processed_entries:
+                    self.logger.debug("Processed entry: %s", processed_entry)
+
+            if len(processed_entries) > 0 and self.outbox is not None:
+                self._put_entries(processed_entries)
+                self.metrics.count_sent(len(processed_entries))
+
+    def _put_entries(self, entries):
+        """
+        Pass processed entries on to the outbox
+        Entry queues take the whole lot in one go; plain queues get them one at a time.
+        :param entries: List of processed entries
+        :return:
+        """
+        if isinstance(self.outbox, EntryQueue):
+            self.outbox.put_batch(entries)
+        else:
+            for entry in entries:
+                self.outbox.put(entry)
 
-            processed_entry = self.convert_to_json(raw_entry)
-            self.logger.debug("Processed entry: {}".format(processed_entry))
+    def read_entries(self):
+        """
+        Read in whatever complete entries are available from the source
+        Readers that get their data in chunks should override this to hand back every entry in a chunk at once.
+        By default a single entry is read with read_entry.
+        :return: List of raw entries. Empty if the read was interrupted without reading anything
+        """
+        raw_entry = self.read_entry()
 
-            if processed_entry is not None and self.outbox is not None:
-                self.outbox.put(processed_entry)
+        # Readers give back None when they've been interrupted without reading anything
+        if raw_entry is None:
+            return []
+        return [raw_entry]
 
     def read_entry(self):
         """
@@ -70,6 +150,26 @@ class Reader(object):
         """
         raise Exception("Method [read_entry] not implemented")
 
+    def convert_entries(self, raw_entries):
+        """
+        Convert a batch of raw entries to JSON
+        The whole batch is handed to the decoder in one go. Readers that override convert_to_json have each entry
+        converted with it instead.
+        :param raw_entries: List of raw entries
+        :return: List of converted entries in the same order, with None in place of each entry that couldn't be converted
+        """
+        if self.convert_to_json.im_func is not Reader.convert_to_json.im_func:
+            return [self.convert_to_json(raw_entry) for raw_entry in raw_entries]
+
+        entries = self.decoder.decode_batch(raw_entries)
+
+        if None in entries:
+            for raw_entry, entry in zip(raw_entries, entries):
+                if entry is None:
+                    self.logger.warning("Entry could not be converted to JSON: %s", raw_entry)
+
+        return entries
+
     # TODO - change reader to use a processor class as well - or leave as-is
     def convert_to_json(self, entry_line):
         """
@@ -77,15 +177,12 @@ class Reader(object):
         Entry lines should already be in a JSON string; extract it.
 
         :param entry_line: JSON-formatted string
-        :return: JSON object of the entry string
+        :return: JSON object of the entry string, or None if it isn't a valid JSON object
         """
+        entry = self.decoder.decode(entry_line)
 
-        entry = ""
-        try:
-            entry = json.loads(entry_line.replace("\r\n", "|"))
-
-        except ValueError:
-            self.logger.warning("Entry could not be converted to JSON: {}".format(entry_line))
+        if entry is None:
+            self.logger.warning("Entry could not be converted to JSON: %s", entry_line)
 
         return entry
 
@@ -0,0 +1,113 @@
+import httplib
+import json
+import logging
+import socket
+import time
+from unittest import TestCase
+from SinkNode.EntryQueue import EntryQueue, Empty
+from SinkNode.Reader.HTTPReader import HTTPReader
+
+__author__ = 'Leenix'
+
+
+class TestHTTPReader(TestCase):
+
+    def setUp(self):
+        self.queue = EntryQueue()
+        self.reader = HTTPReader(listening_port=0, outbox=self.queue, max_body_size=65536, logger_level=logging.FATAL)
+        self.reader.start()
+        self.address = self.reader.listening_socket.getsockname()
+
+    def tearDown(self):
+        self.reader.stop()
+        self.reader.join(5)
+
+    def get_entries(self, count):
+        entries = []
+        end_time = time.time() + 5
+        while len(entries) < count and time.time() < end_time:
+            try:
+                entries.extend(self.queue.get_batch(count, timeout=0.1))
+            except Empty:
+                pass
+        return entries
+
+    def post(self, connection, body, headers=None):
+        connection.request("POST", "/", body, headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_keep_alive(self):
+        connection = httplib.HTTPConnection(*self.address)
+
+        for batch in range(10):
+            lines = [json.dumps({'id': 'collector', 'batch': batch, 'value': i}) for i in range(100)]
+            if batch % 2 == 0:
+                body = "\n".join(lines) + "\n"
+            else:
+                body = "[" + ",".join(lines) + "]"
+            self.assertEquals((200, {"accepted": 100, "rejected": 0}), self.post(connection, body))
+
+        entries = self.get_entries(1000)
+        self.assertEquals([(batch, i) for batch in range(10) for i in range(100)],
+                          [(entry['batch'], entry['value']) for entry in entries])
+
+        # Every request went over the one connection
+        self.assertEquals(1, self.reader.get_client_count())
+        connection.close()
+
+    def test_bad_entries(self):
+        connection = httplib.HTTPConnection(*self.address)
+
+        body = '{"value": 1}\r\nnot json\r\n\r\n{"value": 2}\r\n[3]\r\n'
+        self.assertEquals((200, {"accepted": 2, "rejected": 2}), self.post(connection, body))
+        self.assertEquals((400, {"accepted": 0, "rejected": 1}), self.post(connection, '[{"value": '))
+        self.assertEquals((200, {"accepted": 1, "rejected": 0}), self.post(connection, '{\n  "value": 4\n}'))
+
+        self.assertEquals([1, 2, 4], [entry['value'] for entry in self.get_entries(3)])
+        self.assertEquals(3, self.reader.metrics.get_snapshot()["errors"])
+        connection.close()
+
+    def test_rejected_requests(self):
+        connection = httplib.HTTPConnection(*self.address)
+        connection.request("GET", "/")
+        response = connection.getresponse()
+        response.read()
+        self.assertEquals(405, response.status)
+        connection.close()
+
+        # Turned away on the headers, before the body is sent
+        client = socket.create_connection(self.address)
+        client.sendall("POST / HTTP/1.1\r\nContent-Length: 70000\r\n\r\n")
+        self.assertTrue(client.recv(65536).startswith("HTTP/1.1 413 "))
+        self.assertEquals("", client.recv(65536))
+        client.close()
+
+    def test_pipelined_requests(self):
+        body = '{"value": 1}\n{"value": 2}\n'
+        request = "POST / HTTP/1.1\r\nHost: test\r\nContent-Length: {}\r\n\r\n{}".format(len(body), body)
+
+        client = socket.create_connection(self.address)
+        client.sendall(request * 2 + request.replace("Host: test", "Connection: close"))
+
+        responses = ""
+        while True:
+            data = client.recv(65536)
+            if len(data) == 0:
+                break
+            responses += data
+        client.close()
+
+        self.assertEquals(3, responses.count('{"accepted": 2, "rejected": 0}'))
+        self.assertEquals(1, responses.count("Connection: close"))
+        self.assertEquals(6, len(self.get_entries(6)))
+
+    def test_expect_continue(self):
+        body = '{"value": 1}\n'
+        client = socket.create_connection(self.address)
+        client.sendall("POST / HTTP/1.1\r\nContent-Length: {}\r\nExpect: 100-continue\r\n\r\n".format(len(body)))
+
+        self.assertEquals("HTTP/1.1 100 Continue\r\n\r\n", client.recv(65536))
+        client.sendall(body)
+        self.assertIn('{"accepted": 1, "rejected": 0}', client.recv(65536))
+        client.close()
@@ -0,0 +1,54 @@
+import json
+import logging
+import socket
+import time
+from unittest import TestCase
+from SinkNode.EntryQueue import EntryQueue, Empty
+from SinkNode.Reader.UDPReader import UDPReader
+
+__author__ = 'Leenix'
+
+
+class TestUDPReader(TestCase):
+
+    def setUp(self):
+        self.queue = EntryQueue()
+        self.reader = UDPReader(server_address='127.0.0.1', listening_port=0, outbox=self.queue,
+                                max_datagram_size=1024, logger_level=logging.FATAL)
+        self.reader.start()
+        self.address = self.reader.sock.getsockname()
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def tearDown(self):
+        self.sender.close()
+        self.reader.stop()
+        self.reader.join(5)
+
+    def get_entries(self, count):
+        entries = []
+        end_time = time.time() + 5
+        while len(entries) < count and time.time() < end_time:
+            try:
+                entries.extend(self.queue.get_batch(count, timeout=0.1))
+            except Empty:
+                pass
+        return entries
+
+    def test_receive_datagrams(self):
+        for i in xrange(1000):
+            self.sender.sendto(json.dumps({'id': 'udp', 'value': i}), self.address)
+
+        entries = self.get_entries(1000)
+        values = [entry['value'] for entry in entries]
+
+        # Loopback can drop under load, but anything dropped is counted
+        self.assertEquals(1000, len(values) + self.reader.get_dropped())
+        self.assertEquals(sorted(values), values)
+
+    def test_oversized_datagram(self):
+        self.sender.sendto(json.dumps({'id': 'big', 'value': 'x' * 2000}), self.address)
+        self.sender.sendto(json.dumps({'id': 'small'}), self.address)
+
+        self.assertEquals(['small'], [entry['id'] for entry in self.get_entries(1)])
+        self.assertEquals(1, self.reader.oversized)
+        self.assertEquals(1, self.reader.metrics.get_snapshot()["dropped"])
@@ -0,0 +1,83 @@
+import os
+import shutil
+import struct
+import tempfile
+from unittest import TestCase
+from SinkNode.Reader.CaptureFile import LINKTYPE_IEEE802_11, LINKTYPE_IEEE802_11_RADIOTAP, CaptureFileError, \
+    read_capture, write_pcap
+
+__author__ = 'Leenix'
+
+FRAMES = [(1456790400.25, 'first frame'), (1456790401.5, 'second'), (1456790402.0, 'third frame!')]
+
+
+def make_block(block_type, body):
+    body += '\x00' * (-len(body) % 4)
+    return struct.pack("<II", block_type, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+
+
+def make_pcapng(frames):
+    """
+    Build a pcapng capture with one nanosecond-resolution interface, an enhanced packet block for each frame but
+    the last, and a simple packet block for the last
+    """
+    blocks = [make_block(0x0a0d0d0a, struct.pack("<IHHq", 0x1a2b3c4d, 1, 0, -1)),
+              make_block(1, struct.pack("<HHI", LINKTYPE_IEEE802_11, 0, 65535) +
+                         struct.pack("<HHB3x", 9, 1, 9) + struct.pack("<HH", 0, 0))]
+
+    for timestamp, frame in frames[:-1]:
+        nanoseconds = int(round(timestamp * 1e9))
+        blocks.append(make_block(6, struct.pack("<IIIII", 0, nanoseconds >> 32, nanoseconds & 0xffffffff,
+                                                len(frame), len(frame)) + frame))
+
+    blocks.append(make_block(3, struct.pack("<I", len(frames[-1][1])) + frames[-1][1]))
+    return "".join(blocks)
+
+
+class TestCaptureFile(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_path(self, name, contents=None):
+        path = os.path.join(self.directory, name)
+        if contents is not None:
+            with open(path, "wb") as capture_file:
+                capture_file.write(contents)
+        return path
+
+    def test_pcap(self):
+        path = self.get_path("capture.pcap")
+        self.assertEquals(3, write_pcap(path, FRAMES))
+
+        packets = list(read_capture(path))
+        self.assertEquals([frame for _, frame in FRAMES], [frame for _, _, frame in packets])
+        self.assertEquals([LINKTYPE_IEEE802_11_RADIOTAP] * 3, [linktype for _, linktype, _ in packets])
+        for (timestamp, _), (read_timestamp, _, _) in zip(FRAMES, packets):
+            self.assertAlmostEqual(timestamp, read_timestamp, places=6)
+
+    def test_truncated_pcap(self):
+        path = self.get_path("capture.pcap")
+        write_pcap(path, FRAMES)
+        with open(path, "rb") as capture_file:
+            contents = capture_file.read()
+
+        truncated = self.get_path("truncated.pcap", contents[:-3])
+        self.assertEquals(['first frame', 'second'], [frame for _, _, frame in read_capture(truncated)])
+
+    def test_pcapng(self):
+        path = self.get_path("capture.pcapng", make_pcapng(FRAMES))
+
+        packets = list(read_capture(path))
+        self.assertEquals([frame for _, frame in FRAMES], [frame for _, _, frame in packets])
+        self.assertEquals([LINKTYPE_IEEE802_11] * 3, [linktype for _, linktype, _ in packets])
+        self.assertAlmostEqual(FRAMES[0][0], packets[0][0], places=6)
+        self.assertAlmostEqual(FRAMES[1][0], packets[1][0], places=6)
+        self.assertIsNone(packets[2][0])
+
+    def test_not_a_capture(self):
+        self.assertEquals([], list(read_capture(self.get_path("empty.pcap", ""))))
+        self.assertRaises(CaptureFileError, list, read_capture(self.get_path("text.pcap", "not a capture file")))
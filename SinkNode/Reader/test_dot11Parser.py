@@ -0,0 +1,75 @@
+import socket
+import struct
+from unittest import TestCase
+import netaddr
+from SinkNode.Reader.Dot11Parser import PROBE_REQUEST_SUBTYPE, PROBE_RESPONSE_SUBTYPE, SSID_BEACON_FRAME, \
+    parse_frame, format_mac, attach_filter
+
+__author__ = 'Leenix'
+
+DEVICE = '\x00\x1c\xb3\x09\x85\x15'
+ACCESS_POINT = '\xa4\x2b\xb0\xd1\x3e\x01'
+BROADCAST = '\xff' * 6
+
+
+def make_frame(frame_type, subtype, addr1, addr2, body='', radiotap_length=18):
+    """
+    Build a radiotap-headed 802.11 frame
+    """
+    radiotap = struct.pack("<BxHI", 0, radiotap_length, 0).ljust(radiotap_length, '\x00')
+    header = struct.pack("<BBH", (subtype << 4) | (frame_type << 2), 0, 0) + addr1 + addr2 + addr2 + '\x00\x00'
+    return radiotap + header + body
+
+
+def make_elements(ssid):
+    # Supported rates first, as some devices send them, then the SSID
+    return '\x01\x04\x02\x04\x0b\x16' + '\x00' + chr(len(ssid)) + ssid
+
+
+class TestDot11Parser(TestCase):
+
+    def test_probe_request(self):
+        frame = make_frame(0, PROBE_REQUEST_SUBTYPE, BROADCAST, DEVICE, make_elements('HomeNet'))
+        self.assertEquals((PROBE_REQUEST_SUBTYPE, BROADCAST, DEVICE, 'HomeNet'), parse_frame(frame))
+
+    def test_beacon_and_probe_response(self):
+        fixed_fields = '\x00' * 12
+        for subtype in (SSID_BEACON_FRAME, PROBE_RESPONSE_SUBTYPE):
+            frame = make_frame(0, subtype, DEVICE, ACCESS_POINT, fixed_fields + make_elements('Cafe'),
+                               radiotap_length=36)
+            self.assertEquals((subtype, DEVICE, ACCESS_POINT, 'Cafe'), parse_frame(frame))
+
+    def test_no_ssid(self):
+        frame = make_frame(0, PROBE_REQUEST_SUBTYPE, BROADCAST, DEVICE, '\x01\x02\x02')
+        self.assertIsNone(parse_frame(frame)[3])
+
+    def test_not_management(self):
+        self.assertIsNone(parse_frame(make_frame(2, 0, DEVICE, ACCESS_POINT, 'data')))
+        self.assertIsNone(parse_frame(make_frame(0, PROBE_REQUEST_SUBTYPE, BROADCAST, DEVICE)[:30]))
+        self.assertIsNone(parse_frame('\x00'))
+
+    def test_format_mac(self):
+        for address in (DEVICE, ACCESS_POINT, BROADCAST):
+            self.assertEquals(str(netaddr.EUI(address.encode('hex'))), format_mac(address))
+
+    def test_filter(self):
+        # The kernel runs socket filters on datagram sockets too, so a socket pair can stand in for a capture socket
+        receiver, sender = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.settimeout(1)
+        attach_filter(receiver)
+
+        wanted = [make_frame(0, PROBE_REQUEST_SUBTYPE, BROADCAST, DEVICE, make_elements('a')),
+                  make_frame(0, PROBE_RESPONSE_SUBTYPE, DEVICE, ACCESS_POINT, radiotap_length=36),
+                  make_frame(0, SSID_BEACON_FRAME, BROADCAST, ACCESS_POINT, radiotap_length=300)]
+        unwanted = [make_frame(2, 0, DEVICE, ACCESS_POINT, 'data'), make_frame(1, 13, DEVICE, ACCESS_POINT),
+                    make_frame(0, 11, DEVICE, ACCESS_POINT)]
+
+        for frame in unwanted + wanted + unwanted:
+            sender.send(frame)
+
+        received = [receiver.recv(4096) for _ in wanted]
+        self.assertEquals(wanted, received)
+        self.assertRaises(socket.timeout, receiver.recv, 4096)
+
+        receiver.close()
+        sender.close()
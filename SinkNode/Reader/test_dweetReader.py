@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import select
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from distutils.spawn import find_executable
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from unittest import TestCase, skipIf
+from SinkNode.EntryQueue import EntryQueue, Empty
+from SinkNode.Reader.DweetReader import DweetReader, DweetStream, backoff_delay
+
+__author__ = 'Leenix'
+
+LISTEN_PATH = "/listen/for/dweets/from/"
+
+
+def make_dweet(thing, content):
+    """
+    Encode a dweet the way dweet.io streams it - as a JSON string holding the JSON-encoded dweet
+    """
+    return json.dumps(json.dumps({"thing": thing, "created": "2016-03-01T00:00:00.000Z", "content": content})) + "\r\n"
+
+
+class DweetServer(ThreadingMixIn, HTTPServer):
+    """
+    Local stand-in for dweet.io's streaming API.
+    Each thing's stream sends its dweets, then ends. Things named 'plain-...' are sent without chunked encoding, and
+    streams for things named 'held-...' are held open until the client closes them.
+    """
+    daemon_threads = True
+
+    def __init__(self, dweets, failures=0):
+        """
+        :param dweets: Dictionary of thing names and the dweet contents to stream, once, for each
+        :param failures: Number of requests to turn away before streaming anything
+        """
+        HTTPServer.__init__(self, ('127.0.0.1', 0), DweetHandler)
+        self.dweets = dweets
+        self.failures = failures
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get_address(self):
+        scheme = "https" if isinstance(self.socket, ssl.SSLSocket) else "http"
+        return "{}://127.0.0.1:{}{}".format(scheme, self.server_address[1], LISTEN_PATH)
+
+
+class DweetHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        thing = self.path[len(LISTEN_PATH):]
+        server = self.server
+
+        with server.lock:
+            server.requests.append((time.time(), thing))
+            failed = server.failures > 0
+            if failed:
+                server.failures -= 1
+            else:
+                contents = server.dweets.pop(thing, [])
+
+        if failed:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            return
+
+        body = "".join(make_dweet(thing, content) for content in contents)
+        self.send_response(200)
+        self.send_header("Connection", "close")
+
+        if thing.startswith("plain-"):
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        # Chunks are split in awkward places, as they can be on a real stream
+        for start in range(0, len(body), 37):
+            chunk = body[start:start + 37]
+            self.wfile.write("{:x}\r\n{}\r\n".format(len(chunk), chunk))
+            self.wfile.flush()
+
+        if thing.startswith("held-"):
+            # Wait for the client to hang up
+            select.select([self.connection], [], [], 5)
+            return
+
+        self.wfile.write("0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingDweetReader(DweetReader):
+    """
+    DweetReader that keeps track of the most connections it has had open at once
+    """
+    most_connections = 0
+
+    def _connect(self, stream, now, address):
+        connected = super(CountingDweetReader, self)._connect(stream, now, address)
+        self.most_connections = max(self.most_connections, len(self.connections))
+        return connected
+
+
+class TestDweetReader(TestCase):
+
+    def setUp(self):
+        self.server = None
+        self.reader = None
+        self.queue = EntryQueue()
+
+    def tearDown(self):
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader.join(5)
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def start(self, things, dweets, failures=0, reader_class=DweetReader, **kwargs):
+        self.server = DweetServer(dweets, failures)
+        server_thread = threading.Thread(target=self.server.serve_forever)
+        server_thread.setDaemon(True)
+        server_thread.start()
+
+        self.reader = reader_class(things, outbox=self.queue, server_address=self.server.get_address(),
+                                   logger_level=logging.FATAL, **kwargs)
+        self.reader.start()
+
+    def get_entries(self, count):
+        entries = []
+        end_time = time.time() + 5
+        while len(entries) < count and time.time() < end_time:
+            try:
+                entries.extend(self.queue.get_batch(count, timeout=0.1))
+            except Empty:
+                pass
+        return entries
+
+    def test_stream_many_things(self):
+        dweets = {"sensor-1": [{"temp": i} for i in range(5)],
+                  "sensor-2": [{"temp": i, "note": "line\nbreak"} for i in range(5)],
+                  "plain-sensor": [{"temp": i} for i in range(3)]}
+        self.start(sorted(dweets), dict(dweets), thing_key="thing", retry_delay=10)
+
+        entries = self.get_entries(13)
+        self.assertEquals(13, len(entries))
+
+        for thing in dweets:
+            self.assertEquals(dweets[thing], [dict((k, v) for k, v in entry.items() if k != "thing")
+                                              for entry in entries if entry["thing"] == thing])
+
+        self.assertEquals(13, self.reader.metrics.get_snapshot()["received"])
+
+    def test_connection_pool(self):
+        things = ["held-{}".format(i) for i in range(6)]
+        self.start(things, dict((thing, [{"temp": i}]) for i, thing in enumerate(things)), thing_key="thing",
+                   max_connections=2, rotate_interval=0.1, reader_class=CountingDweetReader)
+
+        # Every thing gets a turn, two at a time
+        entries = self.get_entries(6)
+        self.assertEquals(sorted(things), sorted(entry["thing"] for entry in entries))
+        self.assertEquals(2, self.reader.most_connections)
+
+    def test_slow_lookup(self):
+        self.server = DweetServer({"sensor-1": [{"temp": 21}]})
+        server_thread = threading.Thread(target=self.server.serve_forever)
+        server_thread.setDaemon(True)
+        server_thread.start()
+
+        get_address_info = socket.getaddrinfo
+
+        def slow_lookup(*args):
+            time.sleep(0.5)
+            return get_address_info(*args)
+
+        reader = DweetReader("sensor-1", server_address=self.server.get_address(), logger_level=logging.FATAL)
+        reader.is_running = True
+        socket.getaddrinfo = slow_lookup
+        try:
+            # The read thread carries on while the server is looked up
+            entries = []
+            end_time = time.time() + 5
+            while len(entries) == 0 and time.time() < end_time:
+                start_time = time.time()
+                entries = reader.read_entries()
+                self.assertLess(time.time() - start_time, 0.2)
+        finally:
+            socket.getaddrinfo = get_address_info
+            reader.is_running = False
+            reader._read_loop()
+
+        self.assertEquals([{"temp": 21}], entries)
+
+    @skipIf(find_executable("openssl") is None, "openssl isn't installed to make a test certificate")
+    def test_https(self):
+        directory = tempfile.mkdtemp()
+        try:
+            certificate = os.path.join(directory, "cert.pem")
+            key = os.path.join(directory, "key.pem")
+            with open(os.devnull, "w") as devnull:
+                subprocess.check_call(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                                       "-keyout", key, "-out", certificate, "-subj", "/CN=127.0.0.1",
+                                       "-addext", "subjectAltName=IP:127.0.0.1"], stdout=devnull, stderr=devnull)
+
+            self.server = DweetServer({"sensor-1": [{"temp": i} for i in range(3)]})
+            self.server.socket = ssl.wrap_socket(self.server.socket, keyfile=key, certfile=certificate,
+                                                 server_side=True)
+            server_thread = threading.Thread(target=self.server.serve_forever)
+            server_thread.setDaemon(True)
+            server_thread.start()
+
+            # Only the test certificate is trusted, and the server name is checked against it
+            context = ssl.create_default_context(cafile=certificate)
+            self.reader = DweetReader("sensor-1", outbox=self.queue, server_address=self.server.get_address(),
+                                      ssl_context=context, logger_level=logging.FATAL)
+            self.reader.start()
+
+            self.assertEquals([{"temp": i} for i in range(3)], self.get_entries(3))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_reconnect_backoff(self):
+        self.start("sensor-1", {"sensor-1": [{"temp": 21}]}, failures=4, retry_delay=0.05, max_retry_delay=1)
+
+        self.assertEquals([{"temp": 21}], self.get_entries(1))
+
+        # Each delay is at least half of the doubled delay before it
+        times = [request_time for request_time, _ in self.server.requests]
+        self.assertGreaterEqual(len(times), 5)
+        for failures, (previous, current) in enumerate(zip(times, times[1:5]), 1):
+            self.assertGreaterEqual(current - previous, 0.05 * 2 ** (failures - 1) / 2 - 0.01)
+
+    def test_not_a_dweet(self):
+        stream = DweetStream("sensor-1", "127.0.0.1", 80, LISTEN_PATH + "sensor-1")
+        stream.head = ""
+        lines = stream.feed("HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n" + make_dweet("sensor-1", {})
+                            + "garbage\r\n" + '"{\\"cont')
+
+        reader = DweetReader("sensor-1", logger_level=logging.FATAL)
+        self.assertEquals(["sensor-1", None], [(reader.decode_dweet(line) or {}).get("thing") for line in lines])
+        self.assertEquals('"{\\"cont', stream.close())
+
+
+class TestBackoffDelay(TestCase):
+
+    def test_backoff_delay(self):
+        for failures, limit in ((1, 1.0), (2, 2.0), (3, 4.0), (7, 60.0), (100, 60.0)):
+            for _ in range(20):
+                delay = backoff_delay(failures, 1.0, 60.0)
+                self.assertGreaterEqual(delay, limit / 2)
+                self.assertLessEqual(delay, limit)
@@ -0,0 +1,55 @@
+from unittest import TestCase
+from SinkNode.Reader.FrameBuffer import FrameBuffer
+
+__author__ = 'Leenix'
+
+
+class TestFrameBuffer(TestCase):
+
+    def test_stop_delimiter_only(self):
+        frames = FrameBuffer(stop_delimiter='\n')
+        self.assertEquals(['one', 'two'], frames.feed('one\ntwo\nthr'))
+        self.assertEquals(['three'], frames.feed('ee\n'))
+        self.assertEquals([], frames.feed(''))
+
+    def test_start_and_stop_delimiters(self):
+        frames = FrameBuffer(start_delimiter='#', stop_delimiter='$')
+        self.assertEquals(['one', 'two'], frames.feed('noise#one$junk#two$#thr'))
+        self.assertEquals(['three'], frames.feed('ee$more noise'))
+        self.assertEquals(['four'], frames.feed('#four$'))
+
+    def test_byte_at_a_time(self):
+        frames = FrameBuffer(start_delimiter='#', stop_delimiter='$')
+        found = []
+        for c in 'x#one$y#two$':
+            found.extend(frames.feed(c))
+        self.assertEquals(['one', 'two'], found)
+
+    def test_split_delimiters(self):
+        frames = FrameBuffer(start_delimiter='<<', stop_delimiter='\r\n')
+        self.assertEquals([], frames.feed('junk<'))
+        self.assertEquals([], frames.feed('<one\r'))
+        self.assertEquals(['one'], frames.feed('\n<<two\r\n'[0:3]))
+        self.assertEquals(['two'], frames.feed('\n<<two\r\n'[3:]))
+
+    def test_oversized_frame(self):
+        frames = FrameBuffer(start_delimiter='#', stop_delimiter='$', max_frame_size=8)
+        self.assertEquals([], frames.feed('#' + 'x' * 20))
+        self.assertEquals(['ok'], frames.feed('$#ok$'))
+        self.assertEquals(1, frames.oversized)
+
+    def test_oversized_line(self):
+        frames = FrameBuffer(stop_delimiter='\r\n', max_frame_size=8)
+        self.assertEquals(['ok'], frames.feed('ok\r\n' + 'x' * 20))
+
+        # The rest of the long line is thrown away with it, not passed on as a frame of its own
+        self.assertEquals([], frames.feed('x' * 20 + '\r'))
+        self.assertEquals(['next'], frames.feed('\nnext\r\n'))
+        self.assertEquals(1, frames.oversized)
+        self.assertIsNone(frames.flush())
+
+    def test_flush(self):
+        frames = FrameBuffer(stop_delimiter='\n')
+        frames.feed('one\ntw')
+        self.assertEquals('tw', frames.flush())
+        self.assertIsNone(frames.flush())
@@ -0,0 +1,46 @@
+import json
+from unittest import TestCase
+from SinkNode.Reader.JSONDecoder import JSONDecoder, LIBRARIES, find_library
+
+__author__ = 'Leenix'
+
+
+class TestJSONDecoder(TestCase):
+
+    def setUp(self):
+        self.decoder = JSONDecoder()
+
+    def test_decode(self):
+        entry = {'id': 'test', 'value': 12.5, 'tags': ['a', 'b']}
+        self.assertEquals(entry, self.decoder.decode(json.dumps(entry)))
+
+    def test_invalid(self):
+        for raw_entry in ["not json", "", "{'id': 1}", '{"id": "test"', None]:
+            self.assertIsNone(self.decoder.decode(raw_entry))
+
+    def test_not_an_object(self):
+        for raw_entry in ["1", '"text"', "[1, 2]", "null"]:
+            self.assertIsNone(self.decoder.decode(raw_entry))
+
+    def test_line_breaks(self):
+        self.assertEquals({'id': 'test', 'text': 'one|two'}, self.decoder.decode('{"id": "test", "text": "one\r\ntwo"}'))
+
+        # Line breaks between values are fine as they are
+        self.assertEquals({'id': 'test'}, self.decoder.decode('{\r\n"id": "test"\r\n}'))
+
+    def test_batch(self):
+        raw_entries = [json.dumps({'value': i}) if i % 3 else "bad" for i in xrange(10)]
+        entries = self.decoder.decode_batch(raw_entries)
+
+        self.assertEquals(10, len(entries))
+        for i, entry in enumerate(entries):
+            if i % 3:
+                self.assertEquals({'value': i}, entry)
+            else:
+                self.assertIsNone(entry)
+
+    def test_library(self):
+        self.assertIn(self.decoder.library, LIBRARIES)
+        self.assertEquals("json", JSONDecoder("json").library)
+        self.assertEquals("json", find_library(["not_a_json_library", "json"])[0])
+        self.assertRaises(ImportError, find_library, ["not_a_json_library"])
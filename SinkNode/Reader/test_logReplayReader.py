@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from SinkNode import SinkNode
+from SinkNode.Entry import freeze
+from SinkNode.EntryQueue import EntryQueue
+from SinkNode.Reader.LogReplayReader import LogReplayReader, find_log_files
+from SinkNode.Writer.LogFileWriter import LogFileWriter
+
+__author__ = 'Leenix'
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class TestLogReplayReader(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp() + os.sep
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_log(self, name, values):
+        with open(self.directory + name, "wb") as log_file:
+            for value in values:
+                log_file.write("2016-03-01 00:00:00," + json.dumps({"id": "log", "value": value}) + "\n")
+
+    def replay(self, reader):
+        queue = EntryQueue()
+        reader.set_outbox(queue)
+        reader.start()
+        self.assertTrue(reader.join(5))
+        return [entry["value"] for entry in queue.get_batch(100000)]
+
+    def test_replay_series(self):
+        # Written a month at a time, with a writer's timestamp in front of every line
+        self.write_log("2016-02-data.log", range(1000, 2000))
+        self.write_log("2015-12-data.log", range(0, 500))
+        self.write_log("2016-01-data.log", range(500, 1000))
+        self.write_log("notes-data.log", [-1])
+
+        reader = LogReplayReader("data.log", path=self.directory, file_time_prefix="%Y-%m-",
+                                 timestamp_format=TIMESTAMP_FORMAT, read_size=4096, logger_level=logging.FATAL)
+
+        self.assertEquals(range(2000), self.replay(reader))
+        self.assertEquals((self.directory + "2016-02-data.log",
+                           os.path.getsize(self.directory + "2016-02-data.log")), reader.get_position())
+
+    def test_writer_round_trip(self):
+        # Written by a pipeline as it would be running, with the writer's default formatter
+        node = SinkNode(logger_level=logging.FATAL)
+        node.add_logger(LogFileWriter("data.log", path=self.directory, timestamp_format=TIMESTAMP_FORMAT))
+        node.start()
+        node.read_queue.put_batch([freeze({"id": u"log", "value": i, "name": u"caf\xe9"}) for i in range(100)])
+        node.stop(drain_timeout=None)
+
+        reader = LogReplayReader("data.log", path=self.directory, timestamp_format=TIMESTAMP_FORMAT,
+                                 logger_level=logging.FATAL)
+        self.assertEquals(range(100), self.replay(reader))
+        self.assertEquals(0, reader.metrics.get_snapshot()["errors"])
+
+    def test_resume_from_checkpoint(self):
+        self.write_log("data.log.1", range(0, 300))
+        self.write_log("data.log", range(300, 600))
+        checkpoint = self.directory + "checkpoint.json"
+
+        reader = LogReplayReader("data.log", path=self.directory, timestamp_format=TIMESTAMP_FORMAT,
+                                 checkpoint_file=checkpoint, batch_size=100, logger_level=logging.FATAL)
+        reader.is_running = True
+        first = [json.loads(entry)["value"] for _ in range(4) for entry in reader.read_entries()]
+        reader.save_checkpoint()
+
+        # Picks up in the second file, where the first reader left off
+        reader = LogReplayReader("data.log", path=self.directory, timestamp_format=TIMESTAMP_FORMAT,
+                                 checkpoint_file=checkpoint, logger_level=logging.FATAL)
+        self.assertEquals(range(600), first + self.replay(reader))
+
+        # Finished replays only pick up what's been written since
+        with open(self.directory + "data.log", "ab") as log_file:
+            log_file.write(json.dumps({"id": "log", "value": 600}) + "\n")
+
+        reader = LogReplayReader("data.log", path=self.directory, checkpoint_file=checkpoint,
+                                 logger_level=logging.FATAL)
+        self.assertEquals([600], self.replay(reader))
+
+    def test_rate_limit(self):
+        self.write_log("data.log", range(200))
+
+        reader = LogReplayReader("data.log", path=self.directory, timestamp_format=TIMESTAMP_FORMAT, rate=1000,
+                                 logger_level=logging.FATAL)
+        start_time = time.time()
+        self.assertEquals(range(200), self.replay(reader))
+        self.assertGreater(time.time() - start_time, 0.18)
+
+    def test_find_rotated_files(self):
+        for name in ("data.log", "data.log.2", "data.log.10", "data.log.1", "data.log.gz", "other.log.1"):
+            self.write_log(name, [])
+
+        self.assertEquals([self.directory + name for name in ("data.log.10", "data.log.2", "data.log.1", "data.log")],
+                          find_log_files("data.log", self.directory))
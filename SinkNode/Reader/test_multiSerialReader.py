@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+import threading
+import time
+from unittest import TestCase
+from SinkNode.EntryQueue import EntryQueue, Empty
+from SinkNode.Reader.MultiSerialReader import MultiSerialReader
+
+__author__ = 'Leenix'
+
+
+class TestMultiSerialReader(TestCase):
+
+    def setUp(self):
+        # Pseudo-terminals stand in for the serial adapters; the master end plays the device
+        self.devices = {}
+        for _ in range(12):
+            master, slave = os.openpty()
+            self.devices[os.ttyname(slave)] = (master, slave)
+
+        self.queue = EntryQueue()
+        self.reader = MultiSerialReader(sorted(self.devices.keys()), baud_rate=115200, outbox=self.queue,
+                                        logger_level=logging.FATAL)
+
+    def tearDown(self):
+        self.reader.stop()
+        self.reader.join(5)
+        for master, slave in self.devices.values():
+            for fd in (master, slave):
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+    def get_entries(self, count):
+        entries = []
+        end_time = time.time() + 5
+        while len(entries) < count and time.time() < end_time:
+            try:
+                entries.extend(self.queue.get_batch(count, timeout=0.1))
+            except Empty:
+                pass
+        return entries
+
+    def test_read_every_port(self):
+        threads = threading.active_count()
+        self.reader.start()
+        self.assertEquals(threads + 1, threading.active_count())
+        self.assertEquals(sorted(self.devices.keys()), self.reader.get_open_ports())
+
+        for port, (master, _) in self.devices.items():
+            for i in range(10):
+                # Split across writes so each port has to be framed on its own
+                line = json.dumps({'id': 'sensor', 'value': i}) + '\n'
+                os.write(master, line[:5])
+                os.write(master, line[5:])
+
+        entries = self.get_entries(120)
+        self.assertEquals(120, len(entries))
+
+        for port in self.devices.keys():
+            values = [entry['value'] for entry in entries if entry['port'] == port]
+            self.assertEquals(range(10), values)
+
+    def test_missing_port(self):
+        reader = MultiSerialReader(['/dev/does-not-exist'], logger_level=logging.FATAL)
+        reader.start()
+        self.assertEquals([], reader.get_open_ports())
+        reader.stop()
+        self.assertTrue(reader.join(5))
@@ -0,0 +1,66 @@
+import json
+import logging
+import time
+from threading import Event
+from unittest import TestCase
+from SinkNode.EntryQueue import EntryQueue
+from SinkNode.Reader.SerialReader import SerialReader
+
+__author__ = 'Leenix'
+
+
+class FakeSerial(object):
+    """
+    Stands in for a serial port with everything already received
+    """
+    def __init__(self, data):
+        self.data = data
+        self.reads = 0
+        self.drained = Event()
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def read(self, size=1):
+        if len(self.data) == 0:
+            # Nothing more is coming - act like the read timed out
+            self.drained.set()
+            time.sleep(0.01)
+            return ''
+
+        self.reads += 1
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class TestSerialReader(TestCase):
+
+    def test_read_in_chunks(self):
+        lines = ['#{}$'.format(json.dumps({'id': 'serial', 'value': i})) for i in xrange(1000)]
+        reader = SerialReader('/dev/null', 57600, start_delimiter='#', stop_delimiter='$', logger_level=logging.FATAL)
+        reader.ser = FakeSerial('noise' + ''.join(lines))
+
+        entries = []
+        while reader.ser.in_waiting > 0:
+            entries.extend(reader.read_entries())
+
+        self.assertEquals(range(1000), [json.loads(entry)['value'] for entry in entries])
+        self.assertLess(reader.ser.reads, 20)
+
+    def test_batch_to_outbox(self):
+        queue = EntryQueue()
+        reader = SerialReader('/dev/null', 57600, outbox=queue, logger_level=logging.FATAL)
+        reader.ser = FakeSerial('{"id": "a"}\n{"id": "b"}\n{"id": "c"}\n')
+
+        # Start the read thread without opening a real port
+        reader.is_running = True
+        reader.read_thread.start()
+        reader.ser.drained.wait(5)
+        reader.stop()
+        reader.join(5)
+
+        self.assertEquals(['a', 'b', 'c'], [entry['id'] for entry in queue.get_batch(10)])
@@ -0,0 +1,66 @@
+import json
+import logging
+import socket
+import time
+from unittest import TestCase
+from SinkNode.EntryQueue import EntryQueue, Empty
+from SinkNode.Reader.SocketReader import SocketReader
+
+__author__ = 'Leenix'
+
+
+class TestSocketReader(TestCase):
+
+    def setUp(self):
+        self.queue = EntryQueue()
+        self.reader = SocketReader(listening_port=0, outbox=self.queue, logger_level=logging.FATAL)
+        self.reader.start()
+        self.address = self.reader.listening_socket.getsockname()
+
+    def tearDown(self):
+        self.reader.stop()
+        self.reader.join(5)
+
+    def get_entries(self, count):
+        entries = []
+        end_time = time.time() + 5
+        while len(entries) < count and time.time() < end_time:
+            try:
+                entries.extend(self.queue.get_batch(count, timeout=0.1))
+            except Empty:
+                pass
+        return entries
+
+    def test_many_persistent_clients(self):
+        clients = [socket.create_connection(self.address) for _ in xrange(100)]
+
+        # Each reading is sent in two pieces to make sure it's put back together
+        for reading in xrange(10):
+            for i, client in enumerate(clients):
+                line = json.dumps({'id': 'sensor{}'.format(i), 'value': reading}) + '\n'
+                client.sendall(line[:10])
+                client.sendall(line[10:])
+
+        entries = self.get_entries(1000)
+        self.assertEquals(1000, len(entries))
+        self.assertEquals(range(10), [entry['value'] for entry in entries if entry['id'] == 'sensor42'])
+        self.assertEquals(100, self.reader.get_client_count())
+
+        for client in clients:
+            client.close()
+
+    def test_unfinished_entry_on_disconnect(self):
+        client = socket.create_connection(self.address)
+        client.sendall('{"id": "one-shot", "value": 1}')
+        client.close()
+
+        entries = self.get_entries(1)
+        self.assertEquals(['one-shot'], [entry['id'] for entry in entries])
+
+    def test_large_entry(self):
+        client = socket.create_connection(self.address)
+        client.sendall(json.dumps({'id': 'big', 'value': 'x' * 10000}) + '\n')
+
+        entries = self.get_entries(1)
+        self.assertEquals(10000, len(entries[0]['value']))
+        client.close()
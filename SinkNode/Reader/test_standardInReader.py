@@ -0,0 +1,64 @@
+import json
+import logging
+import os
+from StringIO import StringIO
+from unittest import TestCase
+from SinkNode.EntryQueue import EntryQueue
+from SinkNode.Reader.StandardInReader import StandardInReader
+
+__author__ = 'Leenix'
+
+
+class TestStandardInReader(TestCase):
+
+    def setUp(self):
+        self.read_end, self.write_end = os.pipe()
+        self.stream = os.fdopen(self.read_end)
+
+    def tearDown(self):
+        self.stream.close()
+
+    def test_read_until_end(self):
+        lines = [json.dumps({'id': 'stdin', 'value': i}) for i in xrange(10000)]
+        data = '\n'.join(lines)
+
+        queue = EntryQueue()
+        reader = StandardInReader(stream=self.stream, read_size=4096, raw=True, logger_level=logging.FATAL)
+        reader.set_outbox(queue)
+        reader.start()
+
+        # The last line isn't terminated; it's still read in at the end of the input
+        while len(data) > 0:
+            written = os.write(self.write_end, data)
+            data = data[written:]
+        os.close(self.write_end)
+
+        self.assertTrue(reader.join(5))
+        self.assertEquals(range(10000), [entry['value'] for entry in queue.get_batch(20000)])
+
+    def test_stream_object(self):
+        # Streams without a file descriptor are read through the stream object, a character at a time for packets
+        # that don't end in a line break
+        queue = EntryQueue()
+        reader = StandardInReader(start_delimiter='#', stop_delimiter='$', logger_level=logging.FATAL,
+                                  stream=StringIO('#{"value": 1}$#{"value": 2}$#{"value": 3}'))
+        reader.set_outbox(queue)
+        reader.start()
+
+        self.assertTrue(reader.join(5))
+        self.assertEquals([1, 2, 3], [entry['value'] for entry in queue.get_batch(10)])
+
+    def test_buffered_input(self):
+        os.write(self.write_end, '{"value": 1}\n{"value": 2}\n{"value": 3}\n')
+        os.close(self.write_end)
+
+        # Input the stream object has already taken in isn't lost
+        self.assertEquals('{"value": 1}\n', self.stream.readline())
+
+        queue = EntryQueue()
+        reader = StandardInReader(stream=self.stream, logger_level=logging.FATAL)
+        reader.set_outbox(queue)
+        reader.start()
+
+        self.assertTrue(reader.join(5))
+        self.assertEquals([2, 3], [entry['value'] for entry in queue.get_batch(10)])
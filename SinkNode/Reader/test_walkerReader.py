@@ -0,0 +1,58 @@
+import calendar
+import datetime
+from unittest import TestCase, skipIf
+from SinkNode.Reader.WalkerReader import PACKET, PACKET_SIZE, EPOCH_OFFSET, decode_packet, decode_packets
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__author__ = 'Leenix'
+
+
+def make_packet(station_id=7, ts=500000000, battery=87):
+    return PACKET.pack(station_id, ts, 2150, 1925, 1800, 2300, 5550, 1200, 42, 125, battery, 3)
+
+
+class TestWalkerDecoding(TestCase):
+
+    def test_epoch_offset(self):
+        self.assertEquals(calendar.timegm(datetime.datetime(2000, 1, 1).timetuple()), EPOCH_OFFSET)
+
+    def test_decode_packet(self):
+        entry = decode_packet(make_packet())
+
+        self.assertEquals('stalker7', entry['id'])
+        self.assertEquals('2015-11-05 00:53', entry['timestamp'])
+        self.assertEquals(21.5, entry['air_temp'])
+        self.assertEquals(19.25, entry['wall_temp'])
+        self.assertEquals(18.0, entry['surface_temp'])
+        self.assertEquals(23.0, entry['case_temp'])
+        self.assertEquals(55.5, entry['humidity'])
+        self.assertEquals(1200, entry['illuminance'])
+        self.assertEquals(42, entry['sound'])
+        self.assertEquals(1.25, entry['current'])
+        self.assertEquals(87, entry['battery'])
+        self.assertEquals(3, entry['version'])
+
+    def test_wrong_size(self):
+        self.assertIsNone(decode_packet(make_packet()[:-1]))
+        self.assertIsNone(decode_packet(make_packet() + '\x00'))
+
+    @skipIf(numpy is None, "NumPy isn't installed")
+    def test_decode_packets(self):
+        packets = [make_packet(station_id=i, ts=500000000 + i * 60, battery=i) for i in range(100)]
+        readings = decode_packets("".join(packets) + make_packet()[:10])
+
+        self.assertEquals(100, len(readings))
+        for packet, reading in zip(packets, readings):
+            entry = decode_packet(packet)
+            self.assertEquals(entry['id'], 'stalker' + str(reading['station_id']))
+            self.assertEquals(entry['timestamp'], datetime.datetime.utcfromtimestamp(reading['timestamp'])
+                              .strftime("%Y-%m-%d %H:%M"))
+            for name in ('air_temp', 'wall_temp', 'surface_temp', 'case_temp', 'humidity', 'illuminance', 'sound',
+                         'current', 'battery', 'version'):
+                self.assertAlmostEqual(entry[name], reading[name])
+
+        self.assertEquals(len(readings), len(decode_packets(packets)))
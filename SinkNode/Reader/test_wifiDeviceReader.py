@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import time
+from threading import Thread
+from unittest import TestCase
+from SinkNode.Metrics import monotonic
+from SinkNode.Reader.CaptureFile import write_pcap
+from SinkNode.Reader.WifiDeviceReader import WifiDeviceReader, VendorCache, UNREGISTERED_VENDOR
+from SinkNode.Reader.Dot11Parser import PROBE_REQUEST_SUBTYPE, SSID_BEACON_FRAME
+from SinkNode.Reader.test_dot11Parser import make_frame, make_elements, DEVICE, ACCESS_POINT, BROADCAST
+
+__author__ = 'Leenix'
+
+
+class TestWifiDeviceReader(TestCase):
+
+    def test_raw_frames(self):
+        reader = WifiDeviceReader(include_access_points=True, logger_level=logging.FATAL)
+        reader.is_running = True
+        reader.process_thread.start()
+
+        for _ in range(3):
+            reader.handle_frame(make_frame(0, PROBE_REQUEST_SUBTYPE, BROADCAST, DEVICE, make_elements('HomeNet')))
+        reader.handle_frame(make_frame(0, SSID_BEACON_FRAME, BROADCAST, ACCESS_POINT, '\x00' * 12 + make_elements('Cafe')))
+        reader.handle_frame(make_frame(2, 0, DEVICE, ACCESS_POINT, 'data'))
+
+        reader.packet_queue.join()
+        reader.stop()
+
+        payload = json.loads(reader.convert_to_json(reader.take_snapshot()))['payload']
+        devices = sorted((json.loads(device) for device in payload.split('|') if device), key=lambda d: d['eui'])
+
+        self.assertEquals([('00-1C-B3-09-85-15', 'HomeNet'), ('A4-2B-B0-D1-3E-01', 'Cafe (AP)')],
+                          [(device['eui'], device['ssid']) for device in devices])
+
+    def test_replay(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "capture.pcap")
+            devices = [struct.pack(">HI", 0x001c, i) for i in range(50)]
+            write_pcap(path, [(1456790400 + i * 0.01, make_frame(0, PROBE_REQUEST_SUBTYPE, BROADCAST,
+                                                                 devices[i % 50], make_elements('HomeNet')))
+                              for i in range(1000)])
+
+            # Frames are 10ms apart, so replaying 1000 of them at 50x speed takes 0.2 seconds
+            reader = WifiDeviceReader(capture_files=path, replay_speed=50, queue_size=10, logger_level=logging.FATAL)
+            reader.is_running = True
+            start_time = monotonic()
+            reader.listener_thread.start()
+            reader.process_thread.start()
+
+            self.assertTrue(reader.replay_finished.wait(5))
+            self.assertGreater(monotonic() - start_time, 0.18)
+            reader.packet_queue.join()
+            reader.stop()
+
+            self.assertEquals(50, len(reader.device_list))
+            self.assertEquals(0, reader.packet_queue.dropped)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_replay_clock(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "capture.pcap")
+            start = 1456790400.0
+            devices = [struct.pack(">HI", 0x001c, i) for i in range(100)]
+            write_pcap(path, [(start + i * 60, make_frame(0, PROBE_REQUEST_SUBTYPE, BROADCAST, devices[i],
+                                                          make_elements('HomeNet')))
+                              for i in range(100)])
+
+            # 100 minutes of capture in a second, dumped every half hour of it
+            reader = WifiDeviceReader(capture_files=path, replay_speed=6000, dump_period=1800,
+                                      logger_level=logging.FATAL)
+            reader.is_running = True
+            reader.listener_thread.start()
+            reader.process_thread.start()
+
+            dumps = []
+
+            def read_dumps():
+                while sum(len(dump) for dump in dumps) < 100:
+                    dump = reader.read_entry()
+                    if dump is None:
+                        break
+                    dumps.append(dump)
+
+            dump_thread = Thread(target=read_dumps)
+            dump_thread.start()
+            dump_thread.join(5)
+            reader.stop()
+            dump_thread.join(2)
+
+            self.assertGreater(len(dumps), 1)
+            seen = sorted(device.time_last_seen for dump in dumps for device in dump)
+            self.assertEquals([start + i * 60 for i in range(100)], seen)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_snapshot(self):
+        reader = WifiDeviceReader(logger_level=logging.FATAL)
+        now = 1456790400.0
+        for i in range(50000):
+            mac = '00-1C-{:02X}-{:02X}-{:02X}-{:02X}'.format(i >> 24, (i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+            reader.device_list[mac] = WifiDeviceReader.Device(mac, ssid='Say "hi"', seen=now + i % 60)
+
+        reader.is_running = True
+        snapshot = reader.read_entry()
+
+        # The list is swapped out, so new devices go into the next dump
+        self.assertEquals(50000, len(snapshot))
+        self.assertEquals(0, len(reader.device_list))
+
+        start_time = monotonic()
+        payload = json.loads(reader.convert_to_json(snapshot))['payload']
+        self.assertLess(monotonic() - start_time, 1.0)
+
+        entries = payload.split('|')
+        self.assertEquals(50001, len(entries))
+        self.assertEquals('', entries[-1])
+        self.assertEquals('Say "hi"', json.loads(entries[0])['ssid'])
+
+    def test_wake_on_device(self):
+        reader = WifiDeviceReader(logger_level=logging.FATAL)
+        reader.is_running = True
+        reader.process_thread.start()
+
+        snapshots = []
+        dump_thread = Thread(target=lambda: snapshots.append(reader.read_entry()))
+        dump_thread.start()
+
+        reader.handle_frame(make_frame(0, PROBE_REQUEST_SUBTYPE, BROADCAST, DEVICE, make_elements('HomeNet')))
+        dump_thread.join(2)
+        self.assertFalse(dump_thread.is_alive())
+        self.assertEquals(['00-1C-B3-09-85-15'], [device.mac_address for device in snapshots[0]])
+
+        # Stopping wakes up a dump that's still waiting
+        dump_thread = Thread(target=lambda: snapshots.append(reader.read_entry()))
+        dump_thread.start()
+        reader.stop()
+        dump_thread.join(2)
+        self.assertFalse(dump_thread.is_alive())
+        self.assertIsNone(snapshots[1])
+
+    def test_expiry(self):
+        reader = WifiDeviceReader(cumulative_list=True, device_ttl=60, logger_level=logging.FATAL)
+        now = 1456790400.0
+        for i in range(10):
+            mac = '00-1C-B3-00-00-{:02X}'.format(i)
+            reader.device_list[mac] = WifiDeviceReader.Device(mac, seen=now - i * 10)
+
+        self.assertEquals(3, reader.expire_devices(now))
+        self.assertEquals(['00-1C-B3-00-00-{:02X}'.format(i) for i in range(7)], sorted(reader.device_list.keys()))
+
+    def test_quiet_expiry(self):
+        reader = WifiDeviceReader(cumulative_list=True, device_ttl=0.5, logger_level=logging.FATAL)
+        reader.is_running = True
+        reader.process_thread.start()
+
+        reader.handle_frame(make_frame(0, PROBE_REQUEST_SUBTYPE, BROADCAST, DEVICE, make_elements('HomeNet')))
+        reader.packet_queue.join()
+        self.assertEquals(1, len(reader.device_list))
+
+        # Devices expire even when nothing else is captured
+        end_time = monotonic() + 5
+        while len(reader.device_list) > 0 and monotonic() < end_time:
+            time.sleep(0.1)
+        reader.stop()
+        self.assertEquals(0, len(reader.device_list))
+
+    def test_max_devices(self):
+        reader = WifiDeviceReader(max_devices=100, logger_level=logging.FATAL)
+        now = 1456790400.0
+        for i in range(150):
+            mac = '00-1C-B3-00-00-{:02X}'.format(i)
+            reader.device_list[mac] = WifiDeviceReader.Device(mac, seen=now + i)
+
+        # Room is made for another tenth of the limit, so the oldest 60 go
+        self.assertEquals(60, reader.expire_devices(now))
+        self.assertEquals(90, len(reader.device_list))
+        self.assertEquals(now + 60, min(device.time_last_seen for device in reader.device_list.values()))
+
+
+class TestVendorCache(TestCase):
+
+    def test_cache(self):
+        cache = VendorCache(size=2)
+
+        vendor = cache.get_vendor('00-1C-B3-09-85-15')
+        self.assertEquals('Apple', vendor[:5])
+        self.assertEquals(vendor, cache.get_vendor('00-1c-b3-ff-ff-ff'))
+        self.assertEquals((1, 1), (cache.hits, cache.misses))
+
+        cache.get_vendor('A4-2B-B0-D1-3E-01')
+        cache.get_vendor('F0-9F-C2-00-00-01')
+        self.assertEquals(['A4-2B-B0', 'F0-9F-C2'], list(cache.vendors.keys()))
+
+    def test_unregistered(self):
+        cache = VendorCache()
+
+        # Randomised addresses are locally administered, so they're never looked up
+        self.assertEquals(UNREGISTERED_VENDOR, cache.get_vendor('DA-A1-19-00-00-01'))
+        self.assertEquals(0, cache.misses)
+        self.assertEquals(UNREGISTERED_VENDOR, cache.get_vendor('00-FF-FE-00-00-01'))
@@ -0,0 +1,70 @@
+import logging
+from unittest import TestCase, skipIf
+from SinkNode.Reader.XbeeReader import XBeeReader, frame_to_entry
+
+try:
+    import xbee
+except ImportError:
+    xbee = None
+
+__author__ = 'Leenix'
+
+FRAME = {'id': 'rx', 'source_addr_long': '\x00\x13\xa2\x00\x40\x8b\x12\x34', 'source_addr': '\x7a\x01',
+         'options': '\x01', 'rf_data': '\x00\xffpayload'}
+
+
+class FakeXBee(object):
+    """
+    Stands in for an XBee that has received a list of frames
+    """
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def wait_read_frame(self):
+        return self.frames.pop(0)
+
+
+class TestFrameToEntry(TestCase):
+
+    def test_zigbee_frame(self):
+        entry = frame_to_entry(FRAME)
+
+        self.assertIs(FRAME['rf_data'], entry['data'])
+        self.assertEquals('rx', entry['frame'])
+        self.assertEquals('0013a200408b1234', entry['source'])
+        self.assertEquals('7a01', entry['source_short'])
+        self.assertNotIn('rssi', entry)
+
+    def test_rssi(self):
+        entry = frame_to_entry({'id': 'rx', 'source_addr': '\x00\x02', 'rssi': '\x28', 'rf_data': 'payload'})
+        self.assertEquals(-40, entry['rssi'])
+        self.assertNotIn('source', entry)
+
+
+@skipIf(xbee is None, "The xbee library isn't installed")
+class TestXBeeReader(TestCase):
+
+    def read(self, reader, frames):
+        reader.xbee = FakeXBee(frames)
+        return [reader.convert_to_json(raw_entry) for raw_entry in
+                [reader.read_entry() for _ in frames] if raw_entry is not None]
+
+    def test_hex_frames(self):
+        reader = XBeeReader('/dev/null', 57600, logger_level=logging.FATAL)
+        self.assertEquals([{'data': '00ff7061796c6f6164'}], self.read(reader, [FRAME, {'id': 'status'}]))
+
+    def test_raw_frames(self):
+        reader = XBeeReader('/dev/null', 57600, logger_level=logging.FATAL, raw_frames=True)
+        self.assertEquals([frame_to_entry(FRAME)], self.read(reader, [{'id': 'status'}, FRAME]))
+
+    def test_walker_frames(self):
+        from SinkNode.Reader.WalkerReader import WalkerReader, PACKET
+
+        reader = WalkerReader('/dev/null', 57600)
+        frame = dict(FRAME, rssi='\x28',
+                     rf_data=PACKET.pack(7, 500000000, 2150, 1925, 1800, 2300, 5550, 1200, 42, 125, 87, 3))
+
+        # The decoded entry keeps where the frame came from
+        self.assertEquals([('stalker7', '0013a200408b1234', '7a01', -40)],
+                          [(entry['id'], entry['source'], entry['source_short'], entry['rssi'])
+                           for entry in self.read(reader, [frame])])
@@ -0,0 +1,136 @@
+import importlib
+import sys
+import types
+
+__author__ = 'Leenix'
+
+# Kinds of plugin
+READER = "reader"
+WRITER = "writer"
+FORMATTER = "formatter"
+
+# Where each plugin lives - "module:ClassName". Modules are only imported when their plugin is first asked for, so
+# a pipeline only pays for (and only needs the dependencies of) the plugins it actually uses
+PLUGINS = {
+    READER: {
+        "DweetReader": "SinkNode.Reader.DweetReader:DweetReader",
+        "HTTPReader": "SinkNode.Reader.HTTPReader:HTTPReader",
+        "LogReplayReader": "SinkNode.Reader.LogReplayReader:LogReplayReader",
+        "MultiSerialReader": "SinkNode.Reader.MultiSerialReader:MultiSerialReader",
+        "SerialReader": "SinkNode.Reader.SerialReader:SerialReader",
+        "SocketReader": "SinkNode.Reader.SocketReader:SocketReader",
+        "StandardInReader": "SinkNode.Reader.StandardInReader:StandardInReader",
+        "UDPReader": "SinkNode.Reader.UDPReader:UDPReader",
+        "WalkerReader": "SinkNode.Reader.WalkerReader:WalkerReader",
+        "WifiDeviceReader": "SinkNode.Reader.WifiDeviceReader:WifiDeviceReader",
+        "XBeeReader": "SinkNode.Reader.XbeeReader:XBeeReader",
+    },
+    WRITER: {
+        "DweetWriter": "SinkNode.Writer.DweetWriter:DweetWriter",
+        "LogFileWriter": "SinkNode.Writer.LogFileWriter:LogFileWriter",
+        "QueueWriter": "SinkNode.Writer.QueueWriter:QueueWriter",
+        "SocketWriter": "SinkNode.Writer.SocketWriter:SocketWriter",
+        "ThingspeakWriter": "SinkNode.Writer.ThingspeakWriter:ThingspeakWriter",
+    },
+    FORMATTER: {
+        "BluetoothFormatter": "SinkNode.Formatter.BluetoothFormatter:BluetoothFormatter",
+        "CSVFormatter": "SinkNode.Formatter.CSVFormatter:CSVFormatter",
+        "RawFormatter": "SinkNode.Formatter.RawFormatter:RawFormatter",
+        "ThingspeakFormatter": "SinkNode.Formatter.ThingspeakFormatter:ThingspeakFormatter",
+        "WiFiFormatter": "SinkNode.Formatter.WiFiFormatter:WiFiFormatter",
+    },
+}
+
+
+def register(kind, name, plugin):
+    """
+    Add a plugin to the registry, or replace an existing one
+    :param kind: READER, WRITER or FORMATTER
+    :param name: Name the plugin is looked up by
+    :param plugin: The class itself, or "module:ClassName" to import it when it's first used
+    :return: None
+    """
+    assert kind in PLUGINS
+    PLUGINS[kind][name] = plugin
+
+
+def get_names(kind):
+    """
+    Get the names of the registered plugins of a kind
+    :param kind: READER, WRITER or FORMATTER
+    :return: Sorted list of plugin names
+    """
+    return sorted(PLUGINS[kind].keys())
+
+
+def get_class(kind, name):
+    """
+    Get a plugin class by name, importing its module if it hasn't been used yet
+    :param kind: READER, WRITER or FORMATTER
+    :param name: Name of the plugin, e.g. "LogFileWriter"
+    :return: Plugin class
+    """
+    try:
+        plugin = PLUGINS[kind][name]
+    except KeyError:
+        raise KeyError("No {} named [{}] - choose from {}".format(kind, name, get_names(kind)))
+
+    if isinstance(plugin, basestring):
+        module_name, _, class_name = plugin.partition(":")
+        plugin = getattr(importlib.import_module(module_name), class_name)
+
+        # Keep the class so the lookup is only done once
+        PLUGINS[kind][name] = plugin
+
+    return plugin
+
+
+def create(kind, name, *args, **kwargs):
+    """
+    Create a plugin by name
+    :param kind: READER, WRITER or FORMATTER
+    :param name: Name of the plugin, e.g. "LogFileWriter"
+    :param args: Arguments for the plugin's constructor
+    :param kwargs: Keyword arguments for the plugin's constructor
+    :return: New plugin object
+    """
+    return get_class(kind, name)(*args, **kwargs)
+
+
+def get_reader(name):
+    return get_class(READER, name)
+
+
+def get_writer(name):
+    return get_class(WRITER, name)
+
+
+def get_formatter(name):
+    return get_class(FORMATTER, name)
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is only imported when one of its attributes is first used.
+    Lets plugins keep optional, heavy dependencies (scapy, netaddr, requests...) at the top of the file without
+    every import of the plugin paying for them. If the dependency isn't installed, the ImportError comes from the
+    first use instead of the import.
+    """
+
+    def __getattr__(self, attribute):
+        # Only called for attributes that haven't been found - i.e. before the real module has been loaded
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+
+def lazy_import(module_name):
+    """
+    Import a module the first time it's used
+    :param module_name: Full name of the module, e.g. "scapy.all"
+    :return: The module if it has already been imported, otherwise a LazyModule standing in for it
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    return LazyModule(module_name)
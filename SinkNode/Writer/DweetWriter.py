@@ -2,11 +2,20 @@ __author__ = 'Leenix'
 
 from SinkNode.Writer import Writer
 from SinkNode.Formatter.RawFormatter import RawFormatter
-import requests
+from SinkNode.EventLoop import http_request
+from SinkNode.Registry import lazy_import
 import logging
+import json
+import urllib
+import urlparse
+
+requests = lazy_import("requests")
 
 SERVER_ADDRESS = "http://dweet.io/dweet/for/"
 
+# Time between upload attempts when failed entries are being retried (in seconds)
+RETRY_DELAY = 2
+
 
 class DweetWriter(Writer):
     def __init__(self, writer_id, drop_failed_entries=True,
@@ -40,15 +49,43 @@ class DweetWriter(Writer):
 
             except Exception:
                 self.logger.warning("Packet could not be uploaded")
-                if self.drop_failed_entries:
+
+                # Don't hold up shutdown retrying the upload
+                if self.drop_failed_entries or not self.is_running:
                     packet_uploaded = True
 
         return response
 
-
-
-
-
-
-
-
+    def write_entry_async(self, entry, loop, callback):
+        """
+        Upload the entry to Dweet without blocking the event loop
+        Only plain HTTP is done on the loop; anything else falls back to the blocking upload on an executor thread.
+        :param entry: Processed entry
+        :param loop: EventLoop the writer is running on
+        :param callback: Function to call on the loop with (response, error) once the upload is over
+        :return: None
+        """
+        url = urlparse.urlsplit(self.server_address)
+        if url.scheme != "http":
+            return super(DweetWriter, self).write_entry_async(entry, loop, callback)
+
+        path = "{0}?{1}".format(url.path, urllib.urlencode(entry))
+
+        def uploaded(response, error):
+            if error is None:
+                try:
+                    response = json.loads(response[1])
+                    self.logger.info("Upload successful - Response {}".format(response))
+                    return callback(response, None)
+                except ValueError as err:
+                    error = err
+
+            self.logger.warning("Packet could not be uploaded")
+
+            # Don't hold up shutdown retrying the upload
+            if self.drop_failed_entries or not self.is_running:
+                return callback(None, None)
+            loop.call_later(RETRY_DELAY, self.write_entry_async, entry, loop, callback)
+
+        self.logger.debug("Attempting upload...")
+        http_request(loop, url.hostname, url.port or 80, "GET", path, uploaded)
@@ -29,23 +29,36 @@ class LogFileWriter(Writer):
         :param entry:
         :return:
         """
+        self.write_entries([entry])
+
+    def write_entries(self, entries):
+        """
+        Append a batch of entries to the logfile.
+        The file is opened once for the whole batch and all lines go out in a single write.
+        :param entries: List of entries
+        :return:
+        """
         prefix = ""
+        timestamp = None
+        lines = []
 
-        if len(entry) > 0:
-            if self.file_time_prefix is not None:
-                prefix = datetime.datetime.now().strftime(self.file_time_prefix)
+        if self.file_time_prefix is not None:
+            prefix = datetime.datetime.now().strftime(self.file_time_prefix)
 
-            logfile = open(self.path + prefix + self.filename, 'ab')
+        if self.timestamp_format is not None:
+            timestamp = datetime.datetime.now().strftime(self.timestamp_format) + ","
 
-            # Add the entry line-by-line to include a timestamp on each line
-            entry_lines = str(entry).split('\n')
-
-            for line in entry_lines:
-                if self.timestamp_format is not None:
-                    logfile.write(datetime.datetime.now().strftime(self.timestamp_format))
-                    logfile.write(",")
-                logfile.write(str(line))
-                logfile.write('\n')
-            logfile.close()
+        for entry in entries:
+            if len(entry) > 0:
 
+                # Add the entry line-by-line to include a timestamp on each line
+                for line in str(entry).split('\n'):
+                    if timestamp is not None:
+                        lines.append(timestamp)
+                    lines.append(str(line))
+                    lines.append('\n')
 
+        if len(lines) > 0:
+            logfile = open(self.path + prefix + self.filename, 'ab')
+            logfile.write("".join(lines))
+            logfile.close()
@@ -2,6 +2,7 @@ __author__ = 'Leenix'
 
 from SinkNode.Writer import Writer
 from SinkNode.Formatter.RawFormatter import RawFormatter
+from SinkNode.EventLoop import AsyncConnection
 import socket
 import logging
 
@@ -32,3 +33,12 @@ class SocketWriter(Writer):
         client_socket.send(str(entry) + '\n')
         client_socket.close()
 
+    def write_entry_async(self, entry, loop, callback):
+        """
+        Send the data entry to the specified socket without blocking the event loop
+        :param entry: The string formatted data entry to send
+        :param loop: EventLoop the writer is running on
+        :param callback: Function to call on the loop with (None, error) once the entry has been sent
+        """
+        self.logger.debug("Sending: [{}]".format(str(entry)))
+        AsyncConnection(loop, self.server_address, self.server_port, str(entry) + '\n', callback, read_response=False)
@@ -1,15 +1,23 @@
 import httplib
 import urllib
-import time
 import logging
 from SinkNode.Formatter.ThingspeakFormatter import ThingspeakFormatter
 from SinkNode.Writer import Writer
+from SinkNode.EntryQueue import BLOCK
+from SinkNode.EventLoop import http_request
 
 __author__ = 'Leenix'
 
 SERVER_ADDRESS = "api.thingspeak.com:80"
 THINGSPEAK_DELAY = 15
 
+# Suggested limit on entries waiting for upload (with DROP_OLDEST) - at one upload every 15 seconds, anything older
+# than this is stale anyway. Queues are unbounded unless a limit is asked for
+THINGSPEAK_QUEUE_SIZE = 100
+
+# Time between upload attempts after a failure (in seconds)
+RETRY_DELAY = 2
+
 HEADERS = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain"}
 
 
@@ -21,7 +29,9 @@ class ThingspeakWriter(Writer):
                  drop_failed_entries=True,
                  server_address=SERVER_ADDRESS,
                  upload_delay=THINGSPEAK_DELAY,
-                 logger_level=logging.FATAL):
+                 logger_level=logging.FATAL,
+                 queue_size=0,
+                 queue_policy=BLOCK):
 
         self.formatter = ThingspeakFormatter(api_key,
                                              key_map,
@@ -37,6 +47,11 @@ class ThingspeakWriter(Writer):
         self.upload_delay = upload_delay
         self.drop_failed_entries = drop_failed_entries
 
+        # Uploads are slow, so a long outage builds up a backlog. Bounding it (e.g. to THINGSPEAK_QUEUE_SIZE with
+        # DROP_OLDEST) is up to the user, as it throws entries away
+        if queue_size > 0:
+            self.set_queue_limit(queue_size, queue_policy)
+
     def write_entry(self, entry):
         """
         Upload the entry to Thingspeak
@@ -62,14 +77,44 @@ class ThingspeakWriter(Writer):
                 self.logger.info("Upload successful")
 
                 # Thingspeak can only accept a packet every 15 seconds
-                time.sleep(self.upload_delay)
+                self.pause(self.upload_delay)
 
             except Exception:
                 self.logger.warning("Packet could not be uploaded")
-                if self.drop_failed_entries:
+
+                # Don't hold up shutdown retrying the upload
+                if self.drop_failed_entries or not self.is_running:
                     packet_uploaded = True
-                time.sleep(2)
+                self.pause(RETRY_DELAY)
 
+    def write_entry_async(self, entry, loop, callback):
+        """
+        Upload the entry to Thingspeak without blocking the event loop
+        The callback isn't run until the upload delay is over, so the next entry isn't sent too soon.
+        :param entry: Processed entry
+        :param loop: EventLoop the writer is running on
+        :param callback: Function to call on the loop with (response, error) once the upload is over
+        :return: None
+        """
+        host, _, port = self.server_address.partition(":")
+
+        def uploaded(response, error):
+            if error is None:
+                self.logger.info("Response: %s", response[0])
+                self.logger.info("Upload successful")
+
+                # Thingspeak can only accept a packet every 15 seconds
+                loop.call_later(self.upload_delay, callback, response, None)
+                return
 
+            self.logger.warning("Packet could not be uploaded")
 
+            # Don't hold up shutdown retrying the upload
+            if self.drop_failed_entries or not self.is_running:
+                loop.call_later(RETRY_DELAY, callback, None, None)
+            else:
+                loop.call_later(RETRY_DELAY, self.write_entry_async, entry, loop, callback)
 
+        self.logger.debug("Attempting upload...")
+        http_request(loop, host, int(port or 80), "POST", "/update", uploaded, body=urllib.urlencode(entry),
+                     headers=HEADERS)
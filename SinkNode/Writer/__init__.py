@@ -1,8 +1,11 @@
 import logging
-from threading import Thread
+import time
+from threading import Thread, Event
 
 from SinkNode import Formatter
 from SinkNode.Formatter import RawFormatter
+from SinkNode.EntryQueue import EntryQueue, DEFAULT_BATCH_SIZE, BLOCK
+from SinkNode.Metrics import StageMetrics
 
 
 LOGGER_FORMAT = "%(asctime)s - %(name)s - %(levelname)s: %(message)s"
@@ -13,16 +16,18 @@ from Queue import Queue
 
 
 class Writer(object):
-    def __init__(self, formatter=None, writer_id=__name__, logger_level=logging.FATAL, logger_format=LOGGER_FORMAT):
+    def __init__(self, formatter=None, writer_id=__name__, logger_level=logging.FATAL, logger_format=LOGGER_FORMAT,
+                 batch_size=DEFAULT_BATCH_SIZE):
         self.id = writer_id
+        self.batch_size = batch_size
 
         if formatter is None:
             formatter = RawFormatter.RawFormatter(logger_level=logger_level)
         self.formatter = formatter
 
         # Incoming entries are passed to the format queue, which are processed and passed to the write queue
-        self.format_queue = Queue()
-        self.write_queue = Queue()
+        self.format_queue = EntryQueue()
+        self.write_queue = EntryQueue()
         self.formatter.set_inbox(self.format_queue)
         self.formatter.set_outbox(self.write_queue)
 
@@ -34,15 +39,55 @@ class Writer(object):
         self.logger.setLevel(logger_level)
 
         self.is_running = False
+        self.drain_deadline = None
+        self.stop_event = Event()
         self.write_thread = Thread(name=writer_id, target=self._write_loop)
 
-    def stop(self):
+        # Entries taken off the write queue, entries written and entries that failed to write
+        self.metrics = StageMetrics(writer_id, self.write_queue)
+
+    def stop(self, drain_timeout=0):
         """
         Stop the press!
+        Queued entries are formatted and written until the drain timeout runs out; whatever is left after that is
+        dropped. Use join() to wait for the writer to finish.
+
+        :param drain_timeout: Time (in seconds) allowed for flushing queued entries. None flushes everything
         :return: None
         """
         self.is_running = False
-        self.formatter.stop()
+
+        if drain_timeout is not None:
+            self.drain_deadline = time.time() + drain_timeout
+
+        # Wake up any pause between writes; the formatter closes the write queue once it has finished
+        self.stop_event.set()
+        self.formatter.stop(drain_timeout)
+
+    def join(self, timeout=None):
+        """
+        Wait for the formatter and writer threads to finish
+        :param timeout: Maximum time to wait (in seconds) for each thread. None waits until they have exited
+        :return: None
+        """
+        self.formatter.join(timeout)
+        if self.write_thread.is_alive():
+            self.write_thread.join(timeout)
+
+    def pause(self, seconds):
+        """
+        Wait between writes (e.g. to respect an upload rate limit)
+        The pause is cut short when the writer is stopped, and is kept within the drain deadline while stopping.
+        :param seconds: Time to wait (in seconds)
+        :return: None
+        """
+        if not self.stop_event.is_set():
+            self.stop_event.wait(seconds)
+            return
+
+        if self.drain_deadline is not None:
+            seconds = min(seconds, max(0.0, self.drain_deadline - time.time()))
+        time.sleep(seconds)
 
     def start(self):
         """
@@ -62,6 +107,14 @@ class Writer(object):
         """
         self.formatter.add_to_inbox(entry)
 
+    def add_entries(self, entries):
+        """
+        Add a batch of entries to the writer's formatting queue
+        :param entries: List of JSON formatted entries
+        :return:
+        """
+        self.formatter.add_batch_to_inbox(entries)
+
     def write_entry(self, entry):
         """
         Write the formatted entry to its destination
@@ -71,19 +124,63 @@ class Writer(object):
         """
         raise Exception("Method [write_entry] not implemented")
 
+    def write_entry_async(self, entry, loop, callback):
+        """
+        Write the formatted entry without blocking the event loop (see EventSinkNode)
+        By default the blocking write_entry is run on one of the loop's shared executor threads. Network writers
+        override this with a non-blocking version that runs on the loop itself.
+        :param entry: Entry to be written
+        :param loop: EventLoop the writer is running on
+        :param callback: Function to call on the loop with (result, error) once the entry is written
+        :return: None
+        """
+        loop.run_in_executor(self.write_entry, (entry,), callback)
+
+    def write_entries(self, entries):
+        """
+        Write a batch of formatted entries to their destination
+        Child classes can override this if the destination can take a batch more cheaply than entry-by-entry.
+        :param entries: List of entries to be written, in order
+        :return: None
+        """
+        for entry in entries:
+            try:
+                self.write_entry(entry)
+            except Exception:
+                self.metrics.count_errors()
+                self.logger.exception("Entry could not be written: %s", entry)
+
     def _write_loop(self):
         """
         Write any formatted entries to their appropriate destination
         :return:
         """
-        while self.is_running:
+        while True:
+            # Sleep until there's something to do. An empty batch means the formatter has finished
+            formatted_entries, stamps = self.write_queue.get_stamped_batch(self.batch_size)
+            if len(formatted_entries) == 0:
+                break
+
+            if self.drain_deadline is not None and time.time() >= self.drain_deadline:
+                self.logger.warning("Drain time is up - dropping %d entries",
+                                    self.write_queue.drop_remaining(len(formatted_entries)))
+                break
+
+            self.metrics.count_received(len(formatted_entries))
+            errors = self.metrics.errors
+
             try:
-                formatted_entry = self.write_queue.get(block=True, timeout=2)
-                self.write_entry(formatted_entry)
-                self.write_queue.task_done()
-                self.logger.info("Entry written")
-            except:
-                pass
+                self.write_entries(formatted_entries)
+                self.logger.info("%d entries written", len(formatted_entries))
+
+            except Exception:
+                self.metrics.count_errors(len(formatted_entries) - (self.metrics.errors - errors))
+                self.logger.exception("Entries could not be written")
+
+            # Anything that didn't fail was written
+            self.metrics.count_sent(len(formatted_entries) - (self.metrics.errors - errors))
+            self.metrics.record_latency(stamps)
+            self.write_queue.task_done(len(formatted_entries))
 
     def get_id(self):
         """
@@ -92,6 +189,54 @@ class Writer(object):
         """
         return self.id
 
+    def set_batch_size(self, batch_size):
+        """
+        Set the maximum number of entries the formatter and writer will take off their queues at a time
+        :param batch_size: Maximum batch size
+        :return:
+        """
+        self.batch_size = batch_size
+        self.formatter.batch_size = batch_size
+
+    def set_queue_limit(self, maxsize, policy=BLOCK, write_maxsize=None):
+        """
+        Bound the writer's format and write queues
+        Use a dropping or coalescing policy for slow writers - a full BLOCK queue stalls every writer behind the
+        dispatcher.
+        :param maxsize: Maximum number of entries waiting to be formatted. 0 is unbounded
+        :param policy: Backpressure policy for both queues (see EntryQueue.POLICIES)
+        :param write_maxsize: Maximum number of formatted entries waiting to be written. Defaults to maxsize
+        :return:
+        """
+        if write_maxsize is None:
+            write_maxsize = maxsize
+
+        self.format_queue.set_limit(maxsize, policy)
+        self.write_queue.set_limit(write_maxsize, policy)
+
+    def get_metrics(self):
+        """
+        Get the metrics of the writer's formatter and write stages
+        :return: Tuple of (formatter, writer) StageMetrics
+        """
+        return self.formatter.metrics, self.metrics
+
+    def get_dropped(self):
+        """
+        Get the number of entries the writer's queues have thrown away
+        :return: Number of dropped entries
+        """
+        return self.format_queue.dropped + self.write_queue.dropped
+
+    def set_format_processes(self, processes):
+        """
+        Run the writer's formatter in a pool of worker processes
+        Worth it for CPU-heavy formatters; see Formatter.set_processes.
+        :param processes: Number of worker processes. 0 formats in the formatter thread
+        :return:
+        """
+        self.formatter.set_processes(processes)
+
     def set_formatter(self, formatter):
         """
         Set the formatter for the writer
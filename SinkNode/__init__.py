@@ -1,13 +1,20 @@
 import datetime
+import time
 from SinkNode.Writer import *
+from SinkNode.Entry import freeze
+from SinkNode.EntryQueue import EntryQueue, DEFAULT_BATCH_SIZE, BLOCK, ingest_time
+from SinkNode.Metrics import StageMetrics, format_metrics
 import json
 
 LOGGER_FORMAT = "%(asctime)s - %(name)s - %(levelname)s: %(message)s"
 
+# Time allowed for each reader to finish its current read when stopping (in seconds)
+READER_JOIN_TIMEOUT = 1.0
+
 
 class SinkNode:
 
-    def __init__(self, reader=None, logger_level=logging.FATAL):
+    def __init__(self, reader=None, logger_level=logging.FATAL, batch_size=DEFAULT_BATCH_SIZE):
 
         # Set up logging stuff
         self.logger = logging.getLogger("Main")
@@ -17,17 +24,26 @@ class SinkNode:
         self.logger.setLevel(logger_level)
 
         # Set up queues to pass the data between the different processes
-        self.read_queue = Queue()
+        self.read_queue = EntryQueue()
+        self.batch_size = batch_size
+        self.metrics = StageMetrics("dispatch", self.read_queue)
 
         self.writers = []
         self.readers = []
 
-        if reader is not None:
-            self.add_reader(reader)
+        # Routing index for dispatch - loggers take everything, routed writers are looked up by entry id, and
+        # predicate writers are the slow path for conditions that can't be expressed as an id match
+        self.loggers = []
+        self.routes = {}
+        self.predicate_writers = []
 
         self.is_running = False
+        self.drain_deadline = None
         self.process_thread = Thread(name="main", target=self._main_loop)
 
+        if reader is not None:
+            self.add_reader(reader)
+
     def add_reader(self, reader):
         """
         Add a reader to the system
@@ -37,14 +53,23 @@ class SinkNode:
         reader.set_outbox(self.read_queue)
         self.readers.append(reader)
 
+        if self.is_running:
+            reader.start()
+
     def add_writer(self, writer, condition=None):
         """
         Add a writer to output the formatted data
         Writers only accept packets conditionally, if their id matches the id of the incoming entry.
         :param writer: Writer object
+        :param condition: Filtering condition for the writer. Either an entry id to match, a callable that takes the
+        entry and returns True if the writer should receive it, or None to make the writer indiscriminate.
         :return:
         """
+        if self.is_running:
+            self._start_writer(writer)
+
         self.writers.append([writer, condition])
+        self._add_route(writer, condition)
         self.logger.debug("Writer added [%s]", writer.get_id())
 
     def add_logger(self, logger, condition=None):
@@ -57,9 +82,100 @@ class SinkNode:
         :return:
         """
         assert isinstance(logger, Writer)
+
+        if self.is_running:
+            self._start_writer(logger)
+
         self.writers.append([logger, None])
+        self._add_route(logger, None)
         self.logger.debug("Logger added [%s]", logger.get_id())
 
+    def _add_route(self, writer, condition):
+        """
+        Index the writer by its condition so dispatch doesn't have to scan every writer
+        :param writer: Writer object
+        :param condition: Entry id, predicate callable, or None
+        :return:
+        """
+        if condition is None:
+            self.loggers.append(writer)
+        elif callable(condition):
+            self.predicate_writers.append((writer, condition))
+        else:
+            self.routes.setdefault(condition, []).append(writer)
+
+    def get_destinations(self, entry):
+        """
+        Get the writers that should receive the entry
+        Loggers come first, then writers routed by the entry id, then any predicate writers that accept the entry.
+        :param entry: Dictionary entry
+        :return: List of Writer objects
+        """
+        destinations = self.loggers + self.routes.get(entry.get("id"), [])
+
+        for writer, condition in self.predicate_writers:
+            if condition(entry):
+                destinations.append(writer)
+
+        return destinations
+
+    def set_queue_limit(self, maxsize, policy=BLOCK):
+        """
+        Bound the queue between the readers and the dispatcher
+        :param maxsize: Maximum number of entries waiting to be dispatched. 0 is unbounded
+        :param policy: Backpressure policy used when the queue is full (see EntryQueue.POLICIES)
+        :return:
+        """
+        self.read_queue.set_limit(maxsize, policy)
+
+    def get_drop_counts(self):
+        """
+        Get the number of entries thrown away by each stage's queue
+        :return: Dictionary of dropped entry counts, keyed by 'dispatch' and the writer ids
+        """
+        drop_counts = {"dispatch": self.read_queue.dropped}
+
+        for writer in self.writers:
+            drop_counts[writer[0].get_id()] = writer[0].get_dropped()
+
+        return drop_counts
+
+    def get_metrics(self):
+        """
+        Get a snapshot of the metrics of every stage in the pipeline
+        Each stage reports entries received and sent, errors, dropped entries, its queue depth and a summary of how
+        long entries took to reach the end of the stage after being read in (see StageMetrics.get_snapshot).
+        :return: Dictionary with the 'dispatch' snapshot, and 'readers', 'formatters' and 'writers' dictionaries of
+        snapshots keyed by reader and writer id
+        """
+        metrics = {"dispatch": self.metrics.get_snapshot(), "readers": {}, "formatters": {}, "writers": {}}
+
+        for reader in self.readers:
+            metrics["readers"][reader.metrics.name] = reader.metrics.get_snapshot()
+
+        for writer in self.writers:
+            formatter_metrics, writer_metrics = writer[0].get_metrics()
+            metrics["formatters"][writer[0].get_id()] = formatter_metrics.get_snapshot()
+            metrics["writers"][writer[0].get_id()] = writer_metrics.get_snapshot()
+
+        return metrics
+
+    def dump_metrics(self):
+        """
+        Get the pipeline metrics as a text table, one line per stage in the order entries pass through them
+        :return: Metrics table as a string
+        """
+        metrics = self.get_metrics()
+        stages = [("reader " + name, snapshot) for name, snapshot in sorted(metrics["readers"].items())]
+        stages.append(("dispatch", metrics["dispatch"]))
+
+        for writer in self.writers:
+            writer_id = writer[0].get_id()
+            stages.append(("format " + writer_id, metrics["formatters"][writer_id]))
+            stages.append(("write " + writer_id, metrics["writers"][writer_id]))
+
+        return format_metrics(stages)
+
     def start(self):
         """
         Start the ingestor
@@ -74,27 +190,65 @@ class SinkNode:
         # Fire up the writers
         self.logger.debug("Starting writers...")
         for writer in self.writers:
-            writer[0].start()
+            self._start_writer(writer[0])
 
         self.is_running = True
         self.process_thread.start()
         self.logger.info("Main thread starting...")
 
-    def stop(self):
+    def _start_writer(self, writer):
+        """
+        Get a writer going
+        :param writer: Writer object
+        :return:
+        """
+        writer.start()
+
+    def stop(self, drain_timeout=0):
         """
         Stop the ingestor
         Shut down all the threads and go home...
+        The readers are stopped first, then each stage is closed in turn so entries already read can be flushed
+        through to the writers. Returns once every thread has finished.
+
+        :param drain_timeout: Time (in seconds) allowed for flushing in-flight entries. Entries still queued when it
+        runs out are dropped. 0 drops them straight away; None flushes everything
         :return:
         """
         self.logger.info("Main thread stopping..")
+        self.is_running = False
+
+        if drain_timeout is not None:
+            self.drain_deadline = time.time() + drain_timeout
 
         for reader in self.readers:
             reader.stop()
 
+        for reader in self.readers:
+            if not reader.join(READER_JOIN_TIMEOUT):
+                self.logger.warning("Reader [%s] is blocked reading - leaving it behind", reader.logger.name)
+
+        # Let the dispatcher empty the read queue, then do the same for the writers
+        self.read_queue.close()
+        if self.process_thread.is_alive():
+            self.process_thread.join()
+
         for writer in self.writers:
-            writer[0].stop()
+            writer[0].stop(self._get_drain_time())
 
-        self.is_running = False
+        for writer in self.writers:
+            writer[0].join()
+
+        self.logger.info("Main thread stopped")
+
+    def _get_drain_time(self):
+        """
+        Get the time left until the drain deadline
+        :return: Time left (in seconds), or None if there's no deadline
+        """
+        if self.drain_deadline is None:
+            return None
+        return max(0.0, self.drain_deadline - time.time())
 
     def _main_loop(self):
         """
@@ -102,25 +256,71 @@ class SinkNode:
         Data is managed between read and write threads
         :return:
         """
-        while self.is_running:
+        while True:
+            # Sleep until there's something to do. An empty batch means the read queue has been closed and drained
+            entries = self.read_queue.get_batch(self.batch_size)
+            if len(entries) == 0:
+                break
+
+            if self.drain_deadline is not None and time.time() >= self.drain_deadline:
+                self.logger.warning("Drain time is up - dropping %d entries", self.read_queue.drop_remaining(len(entries)))
+                break
+
+            self.logger.info("%d entries received - %s", len(entries), datetime.datetime.now().isoformat())
+
             try:
+                self._dispatch(entries)
+            except Exception:
+                self.logger.exception("Entries could not be dispatched")
+
+            self.read_queue.task_done(len(entries))
+
+    def _dispatch(self, entries):
+        """
+        Hand a batch of entries to their writers
+        :param entries: List of entries from the readers
+        :return:
+        """
+        for writer, writer_entries in self._route(entries).iteritems():
+            writer.add_entries(writer_entries)
+
+    def _route(self, entries):
+        """
+        Sort a batch of entries by destination
+        Each writer's share of the batch is gathered up so its queue only has to be touched once.
+        :param entries: List of entries from the readers
+        :return: Dictionary of entry lists, keyed by writer
+        """
+        writer_batches = {}
+        errors = 0
+
+        for entry in entries:
+            try:
+                assert not isinstance(entry, basestring)
+                assert isinstance(entry, dict)
+
+                # Every writer gets the same read-only entry; no per-writer copies
+                entry = freeze(entry)
 
-                entry = self.read_queue.get(block=True, timeout=2)
-                self.logger.info("Entry received - %s", datetime.datetime.now().isoformat())
+                destinations = self.get_destinations(entry)
 
-                try:
-                    assert not isinstance(entry, basestring)
-                    assert isinstance(entry, dict)
+            except AssertionError:
+                errors += 1
+                self.logger.error("Entry formatted incorrectly - Must be dictionary object")
+                continue
 
-                    for writer in self.writers:
-                        if writer[1] is None or entry["id"] == writer[1]:
-                            self.logger.debug("Entry sent to writer [%s]", writer[0].get_id())
-                            writer[0].add_entry(entry.copy())
+            except TypeError:
+                errors += 1
+                self.logger.error("Entry id cannot be routed - Must be hashable [%r]", entry.get("id"))
+                continue
 
-                except AssertionError:
-                    self.logger.error("Entry formatted incorrectly - Must be dictionary object")
+            for writer in destinations:
+                self.logger.debug("Entry sent to writer [%s]", writer.get_id())
+                writer_batches.setdefault(writer, []).append(entry)
 
-                self.read_queue.task_done()
+        self.metrics.count_received(len(entries))
+        self.metrics.count_sent(len(entries) - errors)
+        self.metrics.count_errors(errors)
+        self.metrics.record_latency([ingest_time(entry) for entry in entries])
 
-            except:
-                pass
+        return writer_batches
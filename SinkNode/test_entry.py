@@ -0,0 +1,84 @@
+import logging
+import pickle
+from unittest import TestCase
+from SinkNode import SinkNode
+from SinkNode.Entry import Entry, freeze
+from SinkNode.Formatter.CSVFormatter import CSVFormatter
+from SinkNode.Formatter.RawFormatter import RawFormatter
+from SinkNode.Writer import Writer
+
+__author__ = 'Leenix'
+
+
+class MutatingFormatter(RawFormatter):
+    """
+    Badly behaved formatter that tries to strip the id from its input
+    """
+    def format_entry(self, entry):
+        del entry["id"]
+        return entry
+
+
+class RecordingWriter(Writer):
+    """
+    Writer that keeps every entry handed to it by the dispatcher
+    """
+    def __init__(self, writer_id):
+        super(RecordingWriter, self).__init__(writer_id=writer_id)
+        self.received = []
+
+    def add_entries(self, entries):
+        self.received.extend(entries)
+
+
+class TestEntry(TestCase):
+
+    def setUp(self):
+        self.entry = freeze({'id': 'test', 'value1': 1, 'value2': 2})
+
+    def test_read_only(self):
+        self.assertRaises(TypeError, self.entry.__setitem__, 'value1', 5)
+        self.assertRaises(TypeError, self.entry.pop, 'id')
+        self.assertRaises(TypeError, self.entry.update, {'id': 'other'})
+        self.assertEquals({'id': 'test', 'value1': 1, 'value2': 2}, self.entry)
+
+    def test_copy_is_modifiable(self):
+        copy = self.entry.copy()
+        copy['value1'] = 5
+        self.assertEquals(1, self.entry['value1'])
+
+    def test_freeze_once(self):
+        self.assertIs(self.entry, freeze(self.entry))
+
+    def test_pickle(self):
+        unpickled = pickle.loads(pickle.dumps(self.entry))
+        self.assertIsInstance(unpickled, Entry)
+        self.assertEquals(self.entry, unpickled)
+
+    def test_formatters_share_entry(self):
+        csv_formatter = CSVFormatter(logger_level=logging.FATAL)
+        mutating_formatter = MutatingFormatter(logger_level=logging.FATAL)
+
+        self.assertRaises(TypeError, mutating_formatter.format_entry, self.entry)
+        first_run = csv_formatter.format_entry(self.entry)
+        second_run = csv_formatter.format_entry(self.entry)
+
+        self.assertEquals("'id','value1','value2'\ntest,1,2", first_run)
+        self.assertEquals("test,1,2", second_run)
+        self.assertEquals({'id': 'test', 'value1': 1, 'value2': 2}, self.entry)
+
+    def test_dispatch_without_copies(self):
+        node = SinkNode(logger_level=logging.FATAL)
+        writers = [RecordingWriter("writer{}".format(i)) for i in xrange(10)]
+        for writer in writers:
+            node.add_logger(writer)
+
+        node.read_queue.put({'id': 'test', 'value1': 1})
+        node.start()
+        node.stop(drain_timeout=None)
+
+        dispatched = writers[0].received[0]
+        self.assertIsInstance(dispatched, Entry)
+        for writer in writers:
+            self.assertEquals(1, len(writer.received))
+            self.assertIs(dispatched, writer.received[0])
@@ -0,0 +1,86 @@
+from unittest import TestCase
+from Queue import Empty
+from threading import Timer
+from SinkNode.EntryQueue import EntryQueue, DROP_OLDEST, DROP_NEWEST, COALESCE
+
+__author__ = 'Leenix'
+
+
+class TestEntryQueue(TestCase):
+
+    def setUp(self):
+        self.queue = EntryQueue()
+
+    def test_get_batch(self):
+        self.queue.put_batch(range(10))
+
+        self.assertEquals([0, 1, 2, 3], self.queue.get_batch(4))
+        self.assertEquals([4, 5, 6, 7, 8, 9], self.queue.get_batch(100))
+        self.assertRaises(Empty, self.queue.get_batch, 4, block=False)
+        self.assertRaises(Empty, self.queue.get_batch, 4, timeout=0.01)
+
+    def test_single_entry(self):
+        self.queue.put('entry')
+        self.assertEquals(['entry'], self.queue.get_batch(64, timeout=1))
+
+    def test_task_done(self):
+        self.queue.put_batch(range(5))
+        self.queue.get_batch(5)
+
+        self.queue.task_done(5)
+        self.queue.join()
+        self.assertRaises(ValueError, self.queue.task_done)
+
+    def test_drop_oldest(self):
+        queue = EntryQueue(3, DROP_OLDEST)
+        queue.put_batch(range(5))
+
+        self.assertEquals([2, 3, 4], queue.get_batch(10))
+        self.assertEquals(2, queue.dropped)
+
+    def test_drop_newest(self):
+        queue = EntryQueue(3, DROP_NEWEST)
+        queue.put_batch(range(5))
+        queue.put(5)
+
+        self.assertEquals([0, 1, 2], queue.get_batch(10))
+        self.assertEquals(3, queue.dropped)
+
+    def test_coalesce(self):
+        queue = EntryQueue(2, COALESCE)
+        queue.put({'id': 'a', 'value': 1})
+        queue.put({'id': 'b', 'value': 1})
+        queue.put({'id': 'a', 'value': 2})
+        self.assertEquals(1, queue.dropped)
+
+        queue.put({'id': 'c', 'value': 1})
+        self.assertEquals([{'id': 'b', 'value': 1}, {'id': 'c', 'value': 1}], queue.get_batch(10))
+        self.assertEquals(2, queue.dropped)
+
+    def test_dropped_entries_are_done(self):
+        queue = EntryQueue(2, DROP_OLDEST)
+        queue.put_batch(range(4))
+
+        queue.task_done(len(queue.get_batch(10)))
+        queue.join()
+
+    def test_set_limit(self):
+        self.queue.put_batch(range(5))
+        self.queue.set_limit(2, DROP_OLDEST)
+
+        self.assertEquals([3, 4], self.queue.get_batch(10))
+        self.assertEquals(3, self.queue.dropped)
+
+    def test_close(self):
+        self.queue.put_batch(range(3))
+        self.queue.close()
+        self.queue.put(3)
+
+        self.assertEquals([0, 1, 2], self.queue.get_batch(10))
+        self.assertEquals([], self.queue.get_batch(10))
+        self.assertRaises(Empty, self.queue.get)
+        self.assertEquals(1, self.queue.dropped)
+
+    def test_close_wakes_consumer(self):
+        Timer(0.05, self.queue.close).start()
+        self.assertEquals([], self.queue.get_batch(10, timeout=5))
@@ -0,0 +1,70 @@
+import socket
+import threading
+from unittest import TestCase
+from SinkNode.EventLoop import EventLoop
+
+__author__ = 'Leenix'
+
+
+class TestEventLoop(TestCase):
+
+    def setUp(self):
+        self.loop = EventLoop(executor_threads=1)
+        self.loop_thread = threading.Thread(target=self.loop.run)
+        self.loop_thread.start()
+
+    def tearDown(self):
+        self.loop.stop()
+        self.loop_thread.join()
+
+    def resolve(self, host, port):
+        resolved = threading.Event()
+        results = []
+
+        def callback(addresses, error):
+            results.append((addresses, error))
+            resolved.set()
+
+        self.loop.call_soon_threadsafe(self.loop.resolve, host, port, callback)
+        self.assertTrue(resolved.wait(2))
+        return results[0]
+
+    def test_resolve_with_busy_executors(self):
+        release = threading.Event()
+        self.loop.call_soon_threadsafe(self.loop.run_in_executor, release.wait)
+
+        try:
+            addresses, error = self.resolve("127.0.0.1", 80)
+        finally:
+            release.set()
+
+        self.assertIsNone(error)
+        self.assertEquals(("127.0.0.1", 80), addresses[0][4])
+
+    def test_resolve_cached(self):
+        first, _ = self.resolve("127.0.0.1", 80)
+
+        original_getaddrinfo = socket.getaddrinfo
+        socket.getaddrinfo = None
+        try:
+            second, error = self.resolve("127.0.0.1", 80)
+        finally:
+            socket.getaddrinfo = original_getaddrinfo
+
+        self.assertIsNone(error)
+        self.assertIs(first, second)
+
+    def test_resolve_error(self):
+        def fail(*args):
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+
+        original_getaddrinfo = socket.getaddrinfo
+        socket.getaddrinfo = fail
+        try:
+            addresses, error = self.resolve("host.invalid", 80)
+        finally:
+            socket.getaddrinfo = original_getaddrinfo
+
+        self.assertIsNone(addresses)
+        self.assertIsInstance(error, socket.gaierror)
+        self.assertNotIn(("host.invalid", 80), self.loop.addresses)
@@ -0,0 +1,145 @@
+import json
+import logging
+import socket
+import threading
+import time
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from unittest import TestCase
+from SinkNode.EntryQueue import DROP_NEWEST
+from SinkNode.EventSinkNode import EventSinkNode
+from SinkNode.Writer import Writer
+from SinkNode.Writer.DweetWriter import DweetWriter
+from SinkNode.Writer.SocketWriter import SocketWriter
+
+__author__ = 'Leenix'
+
+
+class ListWriter(Writer):
+    """
+    Blocking writer that keeps everything it writes
+    """
+    def __init__(self, writer_id):
+        super(ListWriter, self).__init__(writer_id=writer_id)
+        self.written = []
+
+    def write_entry(self, entry):
+        self.written.append(entry)
+
+
+class StuckWriter(Writer):
+    """
+    Blocking writer that doesn't finish a write until released
+    """
+    def __init__(self, writer_id):
+        super(StuckWriter, self).__init__(writer_id=writer_id)
+        self.release = threading.Event()
+
+    def write_entry(self, entry):
+        self.release.wait()
+
+
+class DweetHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for dweet.io that remembers every request path
+    """
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        body = json.dumps({"this": "succeeded"})
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestEventSinkNode(TestCase):
+
+    def setUp(self):
+        self.node = EventSinkNode(logger_level=logging.FATAL)
+        self.entries = [{'id': 'station{}'.format(i % 4), 'value': i} for i in xrange(200)]
+
+    def test_blocking_writers(self):
+        writers = [ListWriter("writer{}".format(i)) for i in xrange(100)]
+        for i, writer in enumerate(writers):
+            self.node.add_writer(writer, "station{}".format(i % 4))
+
+        threads_before = threading.active_count()
+        self.node.start()
+        self.node.read_queue.put_batch(self.entries)
+        self.node.read_queue.join()
+
+        # One loop thread plus the shared executors, however many writers there are
+        self.assertLessEqual(threading.active_count() - threads_before, 1 + self.node.loop.executor_threads)
+        self.node.stop(drain_timeout=None)
+
+        for i, writer in enumerate(writers):
+            expected = [entry['value'] for entry in self.entries if entry['id'] == "station{}".format(i % 4)]
+            self.assertEquals(expected, [entry['value'] for entry in writer.written])
+
+    def test_stuck_writer(self):
+        writer = StuckWriter("stuck")
+        self.node.add_logger(writer)
+        self.node.start()
+        self.node.read_queue.put_batch(self.entries)
+        self.node.read_queue.join()
+
+        start_time = time.time()
+        self.node.stop(drain_timeout=0)
+        writer.release.set()
+
+        self.assertLess(time.time() - start_time, 3)
+        self.assertFalse(self.node.process_thread.is_alive())
+
+    def test_socket_writer(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(128)
+        received = []
+
+        def accept_connections():
+            for _ in self.entries:
+                client, _ = server.accept()
+                received.append(client.makefile().readline())
+                client.close()
+
+        server_thread = threading.Thread(target=accept_connections)
+        server_thread.start()
+
+        self.node.add_logger(SocketWriter("socket", server_address='127.0.0.1', server_port=server.getsockname()[1]))
+        self.node.start()
+        self.node.read_queue.put_batch(self.entries)
+        self.node.stop(drain_timeout=None)
+        server_thread.join()
+        server.close()
+
+        self.assertEquals(len(self.entries), len(received))
+        self.assertEquals(str(self.entries[0]) + '\n', received[0])
+
+    def test_dweet_writer(self):
+        server = HTTPServer(('127.0.0.1', 0), DweetHandler)
+        server.paths = []
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.start()
+
+        address = "http://127.0.0.1:{}/dweet/for/".format(server.server_port)
+        self.node.add_logger(DweetWriter("thing", server_address=address))
+        self.node.start()
+        self.node.read_queue.put_batch(self.entries[:20])
+        self.node.stop(drain_timeout=None)
+        server.shutdown()
+        server_thread.join()
+
+        self.assertEquals(20, len(server.paths))
+        self.assertTrue(server.paths[0].startswith("/dweet/for/thing?"))
+        self.assertIn("value=0", server.paths[0])
+
+    def test_dispatch_metrics(self):
+        self.node.set_queue_limit(50, DROP_NEWEST)
+        self.node.read_queue.put_batch(self.entries)
+
+        # Dispatch metrics watch the loop's read queue, not the one the base node started with
+        dispatch = self.node.get_metrics()["dispatch"]
+        self.assertEquals(150, dispatch["dropped"])
+        self.assertEquals(50, dispatch["queue_depth"])
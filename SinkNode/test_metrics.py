@@ -0,0 +1,97 @@
+import json
+import logging
+import time
+from threading import Event
+from unittest import TestCase
+from SinkNode import SinkNode
+from SinkNode.Metrics import LatencyHistogram
+from SinkNode.Reader import Reader
+from SinkNode.Writer import Writer
+
+__author__ = 'Leenix'
+
+
+class ListReader(Reader):
+    """
+    Reader that reads each line of a list once, then signals when it has run out
+    """
+    def __init__(self, lines):
+        super(ListReader, self).__init__(reader_id="list")
+        self.lines = list(lines)
+        self.finished = Event()
+
+    def read_entry(self):
+        if len(self.lines) == 0:
+            self.finished.set()
+            time.sleep(0.01)
+            return None
+        return self.lines.pop(0)
+
+
+class FussyWriter(Writer):
+    """
+    Writer that fails to write odd values
+    """
+    def write_entry(self, entry):
+        if entry['value'] % 2:
+            raise ValueError("Odd value")
+
+
+class TestLatencyHistogram(TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for latency in [0.001] * 90 + [0.5] * 10:
+            histogram.record(latency)
+
+        summary = histogram.get_summary()
+        self.assertEquals(100, summary["count"])
+        self.assertLessEqual(summary["p50"], 0.002)
+        self.assertLessEqual(summary["p90"], 0.002)
+        self.assertEquals(0.5, summary["p99"])
+        self.assertEquals(0.5, summary["max"])
+
+    def test_empty(self):
+        summary = LatencyHistogram().get_summary()
+        self.assertEquals(0, summary["count"])
+        self.assertIsNone(summary["p99"])
+
+
+class TestMetrics(TestCase):
+
+    def test_pipeline_counts(self):
+        lines = [json.dumps({'id': 'test', 'value': i}) for i in xrange(100)] + ["not json"]
+        reader = ListReader(lines)
+        node = SinkNode(reader=reader, logger_level=logging.FATAL)
+        node.add_logger(FussyWriter(writer_id="fussy"))
+        node.start()
+
+        reader.finished.wait(5)
+        node.stop(drain_timeout=None)
+        metrics = node.get_metrics()
+
+        self.assertEquals(101, metrics["readers"]["list"]["received"])
+        self.assertEquals(1, metrics["readers"]["list"]["errors"])
+
+        # Entries that couldn't be converted are dropped by the reader
+        self.assertEquals(100, metrics["readers"]["list"]["sent"])
+        self.assertEquals(100, metrics["dispatch"]["received"])
+        self.assertEquals(100, metrics["dispatch"]["sent"])
+        self.assertEquals(0, metrics["dispatch"]["errors"])
+
+        self.assertEquals(100, metrics["formatters"]["fussy"]["sent"])
+        self.assertEquals(100, metrics["writers"]["fussy"]["received"])
+        self.assertEquals(50, metrics["writers"]["fussy"]["sent"])
+        self.assertEquals(50, metrics["writers"]["fussy"]["errors"])
+        self.assertEquals(0, metrics["writers"]["fussy"]["queue_depth"])
+
+        # Every entry that was read in is timed all the way through
+        self.assertEquals(100, metrics["formatters"]["fussy"]["latency"]["count"])
+        self.assertEquals(100, metrics["writers"]["fussy"]["latency"]["count"])
+
+    def test_dump(self):
+        node = SinkNode(logger_level=logging.FATAL)
+        node.add_logger(Writer(writer_id="logger"))
+
+        lines = node.dump_metrics().splitlines()
+        self.assertEquals(["stage", "dispatch", "format", "write"], [line.split()[0] for line in lines])
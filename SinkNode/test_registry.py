@@ -0,0 +1,45 @@
+import subprocess
+import sys
+from unittest import TestCase
+from SinkNode import Registry
+from SinkNode.Registry import WRITER, FORMATTER, lazy_import, LazyModule
+from SinkNode.Formatter.CSVFormatter import CSVFormatter
+from SinkNode.Writer import Writer
+
+__author__ = 'Leenix'
+
+
+class NamedWriter(Writer):
+    pass
+
+
+class TestRegistry(TestCase):
+
+    def test_get_class(self):
+        self.assertIs(CSVFormatter, Registry.get_formatter("CSVFormatter"))
+        self.assertIs(CSVFormatter, Registry.get_class(FORMATTER, "CSVFormatter"))
+
+    def test_unknown_name(self):
+        self.assertRaises(KeyError, Registry.get_writer, "NoSuchWriter")
+
+    def test_register(self):
+        Registry.register(WRITER, "NamedWriter", NamedWriter)
+        self.assertIn("NamedWriter", Registry.get_names(WRITER))
+
+        writer = Registry.create(WRITER, "NamedWriter", writer_id="named")
+        self.assertIsInstance(writer, NamedWriter)
+        self.assertEquals("named", writer.get_id())
+
+    def test_lazy_import(self):
+        self.assertIs(sys, lazy_import("sys"))
+
+        module = lazy_import("SinkNode.test_registry_missing")
+        self.assertIsInstance(module, LazyModule)
+        self.assertRaises(ImportError, getattr, module, "anything")
+
+    def test_plugins_import_lightly(self):
+        # Optional dependencies and the process pool are only loaded once they're needed
+        script = "import sys, SinkNode.Writer.DweetWriter, SinkNode.Reader.DweetReader, SinkNode.Formatter.WiFiFormatter;" \
+                 "print(sorted(m for m in ('requests', 'dweepy', 'netaddr', 'multiprocessing') if m in sys.modules))"
+        output = subprocess.check_output([sys.executable, "-c", script])
+        self.assertEquals("[]", output.strip())
@@ -0,0 +1,97 @@
+import logging
+import time
+from threading import Event, Timer
+from unittest import TestCase
+from SinkNode import SinkNode
+from SinkNode.Writer import Writer
+
+__author__ = 'Leenix'
+
+
+class ListWriter(Writer):
+    """
+    Writer that keeps everything it writes, optionally holding up each write until released
+    """
+    def __init__(self, writer_id, hold_writes=False):
+        super(ListWriter, self).__init__(writer_id=writer_id)
+        self.written = []
+        self.release = Event()
+        if not hold_writes:
+            self.release.set()
+
+    def write_entry(self, entry):
+        self.release.wait()
+        self.written.append(entry)
+
+
+class TestSinkNode(TestCase):
+
+    def setUp(self):
+        self.node = SinkNode(logger_level=logging.FATAL)
+        self.logger = Writer(writer_id="logger")
+        self.station_writers = [Writer(writer_id="station{}".format(i)) for i in xrange(100)]
+        self.hot_writer = Writer(writer_id="hot")
+
+        self.node.add_logger(self.logger)
+        for i, writer in enumerate(self.station_writers):
+            self.node.add_writer(writer, "station{}".format(i))
+        self.node.add_writer(self.hot_writer, lambda entry: entry.get("temperature", 0) > 40)
+
+    def test_routed_destinations(self):
+        destinations = self.node.get_destinations({"id": "station42", "temperature": 20})
+        self.assertEquals([self.logger, self.station_writers[42]], destinations)
+
+    def test_predicate_destinations(self):
+        destinations = self.node.get_destinations({"id": "station7", "temperature": 45})
+        self.assertEquals([self.logger, self.station_writers[7], self.hot_writer], destinations)
+
+    def test_unrouted_destinations(self):
+        destinations = self.node.get_destinations({"temperature": 20})
+        self.assertEquals([self.logger], destinations)
+
+    def test_unhashable_id(self):
+        batches = self.node._route([{"id": ["station1"], "value": 1}, {"id": "station1", "value": 2}])
+
+        self.assertEquals([2], [entry["value"] for entry in batches[self.logger]])
+        self.assertEquals([2], [entry["value"] for entry in batches[self.station_writers[1]]])
+        self.assertEquals(1, self.node.metrics.get_snapshot()["errors"])
+
+    def test_stop_is_prompt(self):
+        node = SinkNode(logger_level=logging.FATAL)
+        node.add_logger(ListWriter("logger"))
+        node.start()
+
+        start_time = time.time()
+        node.stop()
+
+        self.assertLess(time.time() - start_time, 0.5)
+        self.assertFalse(node.process_thread.is_alive())
+
+    def test_stop_drains_entries(self):
+        node = SinkNode(logger_level=logging.FATAL)
+        writer = ListWriter("logger")
+        node.add_logger(writer)
+        node.start()
+
+        node.read_queue.put_batch([{'id': 'test', 'value': i} for i in xrange(1000)])
+        node.stop(drain_timeout=None)
+
+        self.assertEquals(range(1000), [entry['value'] for entry in writer.written])
+        self.assertFalse(writer.write_thread.is_alive())
+        self.assertFalse(writer.formatter.format_thread.is_alive())
+
+    def test_stop_drain_deadline(self):
+        node = SinkNode(logger_level=logging.FATAL)
+        writer = ListWriter("logger", hold_writes=True)
+        node.add_logger(writer)
+        node.start()
+
+        node.read_queue.put_batch([{'id': 'test', 'value': i} for i in xrange(1000)])
+        node.read_queue.join()
+
+        # The writer is stuck on its first batch until after the stop has been called
+        Timer(0.1, writer.release.set).start()
+        node.stop(drain_timeout=0)
+
+        self.assertLess(len(writer.written), 1000)
+        self.assertEquals(1000 - len(writer.written), node.get_drop_counts()["logger"])
@@ -0,0 +1,130 @@
+"""
+HTTP bulk ingest throughput benchmark for SinkNode.
+
+Starts an HTTPReader on loopback and has a number of client processes POST batches of entries to it over keep-alive
+connections, one batch at a time each, as upstream collectors would. The time is taken from the first request until
+every entry has been decoded and put in the read queue.
+
+Usage:
+    python benchmarks/bench_http.py                         Send 500,000 entries, 500 a request, from 4 clients
+    python benchmarks/bench_http.py -n 2000000 -b 1000 -c 8 Send more
+    python benchmarks/bench_http.py --array                 Send JSON array bodies instead of one entry per line
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from multiprocessing import Process
+from threading import Thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from SinkNode.EntryQueue import EntryQueue
+from SinkNode.Reader.HTTPReader import HTTPReader
+
+__author__ = 'Leenix'
+
+DEFAULT_ENTRIES = 500000
+DEFAULT_BATCH = 500
+DEFAULT_CLIENTS = 4
+
+
+def make_request(client, batch, array):
+    """
+    Build a bulk upload request
+    :param client: Client number, used as the entries' id
+    :param batch: Number of entries in the request
+    :param array: Send a JSON array rather than one entry per line
+    :return: Raw HTTP request
+    """
+    entries = [json.dumps({"id": "collector{}".format(client), "seq": i, "value": i * 0.5}) for i in range(batch)]
+    if array:
+        body = "[" + ",".join(entries) + "]"
+    else:
+        body = "\n".join(entries) + "\n"
+
+    return "POST /ingest HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n{}" \
+        .format(len(body), body)
+
+
+def run_client(address, client, requests, batch, array):
+    """
+    Send requests one after the other over a single connection, waiting for each response
+    """
+    request = make_request(client, batch, array)
+    sock = socket.create_connection(address)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    for _ in range(requests):
+        sock.sendall(request)
+        response = ""
+        # Responses are small - the body ends with a closing brace
+        while not response.endswith("}"):
+            data = sock.recv(4096)
+            if len(data) == 0:
+                raise IOError("Server closed the connection")
+            response += data
+        if " 200 " not in response.split("\r\n", 1)[0]:
+            raise IOError("Request failed: {}".format(response))
+
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP bulk ingest throughput benchmark for SinkNode")
+    parser.add_argument("-n", "--entries", type=int, default=DEFAULT_ENTRIES, help="Number of entries to send")
+    parser.add_argument("-b", "--batch", type=int, default=DEFAULT_BATCH, help="Entries per request")
+    parser.add_argument("-c", "--clients", type=int, default=DEFAULT_CLIENTS, help="Number of client connections")
+    parser.add_argument("--array", action="store_true", help="Send JSON array bodies")
+    args = parser.parse_args()
+
+    requests = args.entries // (args.batch * args.clients)
+    total = requests * args.batch * args.clients
+
+    queue = EntryQueue()
+    reader = HTTPReader(server_address="127.0.0.1", listening_port=0, outbox=queue, logger_level=logging.FATAL)
+    reader.start()
+    address = reader.listening_socket.getsockname()
+
+    counts = [0]
+
+    def drain():
+        while counts[0] < total:
+            counts[0] += len(queue.get_batch(4096))
+
+    drain_thread = Thread(target=drain)
+    drain_thread.setDaemon(True)
+
+    clients = [Process(target=run_client, args=(address, i, requests, args.batch, args.array))
+               for i in range(args.clients)]
+
+    start_time = time.time()
+    drain_thread.start()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    drain_thread.join(60)
+    elapsed = time.time() - start_time
+
+    reader.stop()
+    reader.join(5)
+
+    if counts[0] != total:
+        print("Read {} entries instead of {}".format(counts[0], total))
+        return 1
+
+    print("{} entries in {} requests of {} ({} bodies), from {} clients".format(
+        total, requests * args.clients, args.batch, "array" if args.array else "line", args.clients))
+    print("")
+    print("{:>8}  {:>12}  {:>12}".format("seconds", "entries/s", "requests/s"))
+    print("{:>8.2f}  {:>12.0f}  {:>12.0f}".format(elapsed, total / elapsed, requests * args.clients / elapsed))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Startup benchmarks for SinkNode.
+
+Measures what importing the package and each plugin costs a fresh interpreter: wall time, extra peak RSS and the
+number of modules pulled in. Plugins are loaded through the registry, the same way a pipeline would load them, and
+plugins whose optional dependencies aren't installed are reported as such.
+
+Usage:
+    python benchmarks/bench_imports.py                      Measure the package and every plugin
+    python benchmarks/bench_imports.py -r 10                Take the median of 10 runs of each
+    python benchmarks/bench_imports.py --save imports.json  Keep the results for later
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from SinkNode import Registry
+
+__author__ = 'Leenix'
+
+DEFAULT_RUNS = 5
+
+PACKAGE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# Run in a fresh interpreter for each measurement. Prints time (ms), extra peak RSS (KB) and new modules as JSON
+MEASURE_SCRIPT = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+modules = len(sys.modules)
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start_time = time.time()
+try:
+    {statement}
+    error = None
+except ImportError as err:
+    error = str(err)
+elapsed = time.time() - start_time
+print(json.dumps({{"ms": elapsed * 1000, "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss,
+                  "modules": len(sys.modules) - modules, "error": error}}))
+"""
+
+
+def get_targets():
+    """
+    Get everything to be measured
+    :return: List of (target name, statement to time) tuples
+    """
+    targets = [("import SinkNode", "import SinkNode"),
+               ("import SinkNode.Registry", "import SinkNode.Registry")]
+
+    for kind in (Registry.READER, Registry.FORMATTER, Registry.WRITER):
+        for name in Registry.get_names(kind):
+            statement = "from SinkNode import Registry; Registry.get_class({!r}, {!r})".format(kind, name)
+            targets.append(("{} {}".format(kind, name), statement))
+
+    return targets
+
+
+def measure(statement, runs):
+    """
+    Time a statement in fresh interpreters
+    :param statement: Python statement to time
+    :param runs: Number of interpreters to run it in
+    :return: Dictionary of the median time (ms), extra peak RSS (MB) and modules loaded, or the import error
+    """
+    samples = []
+    for _ in range(runs):
+        script = MEASURE_SCRIPT.format(root=PACKAGE_ROOT, statement=statement)
+        output = subprocess.check_output([sys.executable, "-c", script])
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    if samples[0]["error"] is not None:
+        return {"error": samples[0]["error"]}
+
+    def median(key):
+        values = sorted(sample[key] for sample in samples)
+        return values[len(values) // 2]
+
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS
+    rss_scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+    return {"ms": median("ms"), "rss_mb": median("rss") / rss_scale, "modules": median("modules"), "error": None}
+
+
+def format_results(results):
+    """
+    Lay out the results as a text table
+    :param results: List of (target name, results) tuples
+    :return: Table as a string
+    """
+    columns = ["target", "ms", "RSS MB", "modules"]
+    rows = [columns]
+    missing = []
+
+    for name, result in results:
+        if result["error"] is not None:
+            rows.append([name, "-", "-", "-"])
+            missing.append("{}: {}".format(name, result["error"]))
+        else:
+            rows.append([name, "{:.1f}".format(result["ms"]), "{:.1f}".format(result["rss_mb"]),
+                         str(result["modules"])])
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    lines = []
+    for row in rows:
+        cells = [row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+        lines.append("  ".join(cells))
+
+    if len(missing) > 0:
+        lines.append("")
+        lines.append("Missing dependencies:")
+        lines.extend("  " + line for line in missing)
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup benchmarks for SinkNode")
+    parser.add_argument("-r", "--runs", type=int, default=DEFAULT_RUNS,
+                        help="Number of fresh interpreters to measure each target in")
+    parser.add_argument("--save", metavar="FILE", help="Save the results as JSON")
+    args = parser.parse_args()
+
+    results = [(name, measure(statement, args.runs)) for name, statement in get_targets()]
+    print(format_results(results))
+
+    if args.save is not None:
+        with open(args.save, "w") as results_file:
+            json.dump(dict(results), results_file, indent=2, sort_keys=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+JSON decode benchmark for SinkNode readers.
+
+Decodes batches of entries shaped like the ones our readers actually see, with each JSON library that's installed,
+and compares them against the old conversion path (clean up the line, then json.loads, one entry at a time). The
+figures are entries decoded per second; higher is better.
+
+Usage:
+    python benchmarks/bench_json.py                 Decode 100,000 entries of each shape
+    python benchmarks/bench_json.py -n 1000000      Decode more
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from SinkNode.Reader.JSONDecoder import JSONDecoder, LIBRARIES
+
+__author__ = 'Leenix'
+
+DEFAULT_ENTRIES = 100000
+BATCH_SIZE = 256
+
+
+def make_payloads(count):
+    """
+    Make entries shaped like the ones the readers pass on
+    :param count: Number of entries of each shape
+    :return: List of (shape name, list of JSON-encoded entries) tuples
+    """
+    station = [json.dumps({"id": "station{}".format(i % 16), "timestamp": "2016-03-01 12:{:02d}".format(i % 60),
+                           "air_temp": 21.5 + i % 10, "wall_temp": 19.25, "surface_temp": 18.0,
+                           "humidity": 55.5, "illuminance": 1200 + i % 100, "battery": 87})
+               for i in range(count)]
+
+    xbee = [json.dumps({"data": "7e001a9001" + "{:08x}".format(i) * 4}) for i in range(count)]
+
+    devices = ";".join("00:1c:b3:{:02x}:{:02x}:0f,-{},{}".format(d, d * 3 % 256, 40 + d, 1456790400 + d)
+                       for d in range(20))
+    wifi = [json.dumps({"id": "scanner{}".format(i % 4), "payload": devices}) for i in range(count)]
+
+    invalid = [line if i % 10 else line[:-5] for i, line in enumerate(station)]
+
+    return [("station", station), ("xbee", xbee), ("wifi scan", wifi), ("10% invalid", invalid)]
+
+
+def old_convert(raw_entries):
+    """
+    Convert entries the way Reader.convert_to_json used to, before the decoder
+    :param raw_entries: List of JSON-encoded entries
+    :return: List of decoded entries, with "" in place of invalid ones
+    """
+    entries = []
+    for entry_line in raw_entries:
+        entry = ""
+        try:
+            entry = json.loads(entry_line.replace("\r\n", "|"))
+        except ValueError:
+            # The warning was formatted whether or not it was going to be logged
+            message = "Entry could not be converted to JSON: {}".format(entry_line)
+        entries.append(entry)
+    return entries
+
+
+def time_decode(decode, raw_entries):
+    """
+    Time decoding the entries a batch at a time
+    :param decode: Function that decodes a list of entries
+    :param raw_entries: List of JSON-encoded entries
+    :return: Entries decoded per second
+    """
+    start_time = time.time()
+    for i in range(0, len(raw_entries), BATCH_SIZE):
+        decode(raw_entries[i:i + BATCH_SIZE])
+    return len(raw_entries) / (time.time() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON decode benchmark for SinkNode readers")
+    parser.add_argument("-n", "--entries", type=int, default=DEFAULT_ENTRIES, help="Number of entries of each shape")
+    args = parser.parse_args()
+
+    decoders = [("old path", old_convert)]
+    missing = []
+    for library in LIBRARIES:
+        try:
+            decoders.append((library, JSONDecoder(library).decode_batch))
+        except ImportError:
+            missing.append(library)
+
+    payloads = make_payloads(args.entries)
+
+    print("{:<12}".format("decoder") + "".join("{:>14}".format(shape) for shape, _ in payloads))
+    for name, decode in decoders:
+        rates = [time_decode(decode, raw_entries) for _, raw_entries in payloads]
+        print("{:<12}".format(name) + "".join("{:>14.0f}".format(rate) for rate in rates))
+
+    if len(missing) > 0:
+        print("")
+        print("Not installed: {}".format(", ".join(missing)))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
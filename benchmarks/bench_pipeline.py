@@ -0,0 +1,266 @@
+"""
+End-to-end throughput benchmarks for SinkNode.
+
+Each scenario builds a real SinkNode topology - a synthetic reader feeding JSON lines in as fast as it can, through
+the dispatcher and formatters, out to writers that throw their entries away - and times how long it takes to push a
+fixed number of entries all the way through. Scenarios vary the fan-out, routing, payload size, formatter and engine.
+
+Every scenario runs in its own process so its peak RSS isn't inflated by the scenarios before it.
+
+Usage:
+    python benchmarks/bench_pipeline.py                         Run every scenario
+    python benchmarks/bench_pipeline.py -s fanout-16 -s csv     Run selected scenarios
+    python benchmarks/bench_pipeline.py --save baseline.json    Keep the results for later
+    python benchmarks/bench_pipeline.py --compare baseline.json Fail if throughput has dropped since the baseline
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+from threading import Event
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from SinkNode import SinkNode
+from SinkNode.EventSinkNode import EventSinkNode
+from SinkNode.Formatter.CSVFormatter import CSVFormatter
+from SinkNode.Formatter.RawFormatter import RawFormatter
+from SinkNode.Metrics import LatencyHistogram
+from SinkNode.Reader import Reader
+from SinkNode.Writer import Writer
+
+__author__ = 'Leenix'
+
+DEFAULT_ENTRIES = 20000
+
+# Distinct lines the synthetic reader cycles through, so big payloads don't have to be generated up front
+LINE_POOL_SIZE = 256
+
+# Throughput drop (as a fraction of the baseline) reported as a regression by --compare
+DEFAULT_TOLERANCE = 0.2
+
+DEFAULTS = {
+    "engine": "thread",     # "thread" for SinkNode, "event" for EventSinkNode
+    "writers": 1,           # Number of writers
+    "routing": "fanout",    # "fanout" sends every entry to every writer, "routed" sends writer n the id "station<n>"
+    "ids": 16,              # Number of distinct entry ids
+    "payload": 64,          # Size of the padding value in each entry (in bytes)
+    "formatter": "raw",     # "raw" or "csv"
+}
+
+SCENARIOS = [
+    ("baseline", {}),
+    ("fanout-4", {"writers": 4}),
+    ("fanout-16", {"writers": 16}),
+    ("routed-16", {"writers": 16, "routing": "routed"}),
+    ("payload-1k", {"payload": 1024}),
+    ("payload-16k", {"payload": 16384}),
+    ("csv", {"formatter": "csv"}),
+    ("csv-fanout-4", {"formatter": "csv", "writers": 4}),
+    ("event-fanout-16", {"engine": "event", "writers": 16}),
+    ("event-routed-16", {"engine": "event", "writers": 16, "routing": "routed"}),
+]
+
+
+class SyntheticReader(Reader):
+    """
+    Reader that produces a fixed number of JSON lines as fast as it can
+    """
+
+    def __init__(self, entries, ids, payload):
+        super(SyntheticReader, self).__init__(reader_id="synthetic")
+        self.remaining = entries
+        self.finished = Event()
+
+        padding = "x" * payload
+        self.lines = [json.dumps({"id": "station{}".format(i % ids), "seq": i, "value": i * 0.5, "payload": padding})
+                      for i in range(LINE_POOL_SIZE)]
+
+    def read_entry(self):
+        if self.remaining == 0:
+            self.finished.set()
+            time.sleep(0.01)
+            return None
+
+        self.remaining -= 1
+        return self.lines[self.remaining % LINE_POOL_SIZE]
+
+
+class NullWriter(Writer):
+    """
+    Writer that throws everything away, so only the pipeline itself is measured
+    """
+
+    def write_entry(self, entry):
+        pass
+
+
+def build_node(settings, entries):
+    """
+    Put together the topology for a scenario
+    :param settings: Scenario settings (see DEFAULTS)
+    :param entries: Number of entries the reader should produce
+    :return: Tuple of (node, reader, writers)
+    """
+    if settings["engine"] == "event":
+        node = EventSinkNode(logger_level=logging.FATAL)
+    else:
+        node = SinkNode(logger_level=logging.FATAL)
+
+    reader = SyntheticReader(entries, settings["ids"], settings["payload"])
+    node.add_reader(reader)
+
+    writers = []
+    for i in range(settings["writers"]):
+        if settings["formatter"] == "csv":
+            formatter = CSVFormatter()
+        else:
+            formatter = RawFormatter()
+
+        writer = NullWriter(formatter=formatter, writer_id="writer{}".format(i))
+        writers.append(writer)
+
+        if settings["routing"] == "routed":
+            # Routed by id, so dispatch goes through the id index. Ids without a writer of their own go nowhere
+            node.add_writer(writer, "station{}".format(i))
+        else:
+            node.add_logger(writer)
+
+    return node, reader, writers
+
+
+def run_scenario(settings, entries):
+    """
+    Push entries through a scenario's topology and measure it
+    :param settings: Scenario settings (see DEFAULTS)
+    :param entries: Number of entries to push through
+    :return: Dictionary of results
+    """
+    node, reader, writers = build_node(settings, entries)
+
+    start_time = time.time()
+    node.start()
+    reader.finished.wait()
+    node.stop(drain_timeout=None)
+    elapsed = time.time() - start_time
+
+    latency = LatencyHistogram()
+    writes = 0
+    for writer in writers:
+        latency.merge(writer.metrics.latency)
+        writes += writer.metrics.sent
+
+    summary = latency.get_summary()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "entries": entries,
+        "seconds": elapsed,
+        "entries_per_second": entries / elapsed,
+        "writes_per_second": writes / elapsed,
+        "p50_ms": None if summary["p50"] is None else summary["p50"] * 1000,
+        "p99_ms": None if summary["p99"] is None else summary["p99"] * 1000,
+        # ru_maxrss is in kilobytes on Linux but bytes on macOS
+        "peak_rss_mb": peak_rss / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0),
+    }
+
+
+def run_in_subprocess(name, entries):
+    """
+    Run a single scenario in a fresh interpreter
+    :param name: Scenario name
+    :param entries: Number of entries to push through
+    :return: Dictionary of results
+    """
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--run-one", name,
+                                      "-n", str(entries)])
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def format_results(results, baseline=None):
+    """
+    Lay out the results as a text table
+    :param results: List of (scenario name, results) tuples
+    :param baseline: Dictionary of baseline results keyed by scenario name, to show the change in throughput
+    :return: Table as a string
+    """
+    columns = ["scenario", "entries/s", "writes/s", "p50 ms", "p99 ms", "peak RSS MB"]
+    if baseline is not None:
+        columns.append("vs baseline")
+
+    rows = [columns]
+    for name, result in results:
+        row = [name, "{:.0f}".format(result["entries_per_second"]), "{:.0f}".format(result["writes_per_second"])]
+        for key in ("p50_ms", "p99_ms"):
+            row.append("-" if result[key] is None else "{:.1f}".format(result[key]))
+        row.append("{:.1f}".format(result["peak_rss_mb"]))
+
+        if baseline is not None:
+            if name in baseline:
+                change = result["entries_per_second"] / baseline[name]["entries_per_second"] - 1
+                row.append("{:+.1%}".format(change))
+            else:
+                row.append("-")
+        rows.append(row)
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    lines = []
+    for row in rows:
+        cells = [row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+        lines.append("  ".join(cells))
+
+    return "\n".join(lines)
+
+
+def main():
+    scenario_names = [name for name, _ in SCENARIOS]
+
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmarks for SinkNode")
+    parser.add_argument("-s", "--scenario", action="append", choices=scenario_names,
+                        help="Scenario to run (can be given more than once). Runs everything by default")
+    parser.add_argument("-n", "--entries", type=int, default=DEFAULT_ENTRIES,
+                        help="Number of entries to push through each scenario")
+    parser.add_argument("--save", metavar="FILE", help="Save the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="Compare throughput against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Throughput drop (as a fraction) that counts as a regression when comparing")
+    parser.add_argument("--run-one", metavar="SCENARIO", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one is not None:
+        settings = dict(DEFAULTS)
+        settings.update(dict(SCENARIOS)[args.run_one])
+        print(json.dumps(run_scenario(settings, args.entries)))
+        return 0
+
+    results = []
+    for name in args.scenario or scenario_names:
+        results.append((name, run_in_subprocess(name, args.entries)))
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print(format_results(results, baseline))
+
+    if args.save is not None:
+        with open(args.save, "w") as results_file:
+            json.dump(dict(results), results_file, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = [name for name, result in results if name in baseline and
+                       result["entries_per_second"] < baseline[name]["entries_per_second"] * (1 - args.tolerance)]
+        if len(regressions) > 0:
+            print("Throughput regressed in: {}".format(", ".join(regressions)))
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Log replay throughput benchmark for SinkNode.
+
+Writes a series of log files the way LogFileWriter does (a file a month, with a timestamp in front of every line),
+then replays them with LogReplayReader as fast as it can go. Two readings are taken:
+    lines   - splitting the files into entries and stripping the timestamps
+    entries - the full read loop, including JSON decoding and batching into the read queue
+
+Usage:
+    python benchmarks/bench_replay.py                   Replay a million lines over 4 files
+    python benchmarks/bench_replay.py -n 5000000 -f 12  Replay more
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from threading import Thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from SinkNode.EntryQueue import EntryQueue
+from SinkNode.Reader.LogReplayReader import LogReplayReader
+
+__author__ = 'Leenix'
+
+DEFAULT_LINES = 1000000
+DEFAULT_FILES = 4
+
+FILE_TIME_PREFIX = "%Y-%m-"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def make_logs(directory, lines, files):
+    """
+    Write a series of log files
+    :param directory: Directory to write them in (with a trailing separator)
+    :param lines: Total number of lines
+    :param files: Number of files to spread them over
+    :return: Total size of the files (in bytes)
+    """
+    size = 0
+    for month in range(files):
+        path = "{}2016-{:02d}-data.log".format(directory, month + 1)
+        with open(path, "w") as log_file:
+            for i in range(month * lines // files, (month + 1) * lines // files):
+                log_file.write("2016-{:02d}-01 00:00:00,".format(month + 1))
+                log_file.write(json.dumps({"id": "station{}".format(i % 16), "seq": i, "value": i * 0.5}) + "\n")
+        size += os.path.getsize(path)
+    return size
+
+
+def make_reader(directory):
+    return LogReplayReader("data.log", path=directory, file_time_prefix=FILE_TIME_PREFIX,
+                           timestamp_format=TIMESTAMP_FORMAT)
+
+
+def time_lines(directory):
+    reader = make_reader(directory)
+    reader.is_running = True
+
+    start_time = time.time()
+    count = 0
+    while reader.is_running:
+        count += len(reader.read_entries())
+    return count, time.time() - start_time
+
+
+def time_entries(directory):
+    queue = EntryQueue()
+    reader = make_reader(directory)
+    reader.set_outbox(queue)
+
+    counts = [0]
+
+    def drain():
+        while True:
+            entries = queue.get_batch(4096)
+            if len(entries) == 0:
+                break
+            counts[0] += len(entries)
+
+    drain_thread = Thread(target=drain)
+    drain_thread.start()
+
+    start_time = time.time()
+    reader.start()
+    reader.join()
+    queue.close()
+    drain_thread.join()
+    return counts[0], time.time() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log replay throughput benchmark for SinkNode")
+    parser.add_argument("-n", "--lines", type=int, default=DEFAULT_LINES, help="Number of lines to replay")
+    parser.add_argument("-f", "--files", type=int, default=DEFAULT_FILES, help="Number of files to spread them over")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp() + os.sep
+    try:
+        size = make_logs(directory, args.lines, args.files)
+        results = [("lines",) + time_lines(directory), ("entries",) + time_entries(directory)]
+    finally:
+        shutil.rmtree(directory)
+
+    for name, count, _ in results:
+        if count != args.lines:
+            print("{} read {} lines instead of {}".format(name, count, args.lines))
+            return 1
+
+    print("{:<8}  {:>8}  {:>12}  {:>8}".format("reading", "seconds", "lines/s", "MB/s"))
+    for name, count, seconds in results:
+        print("{:<8}  {:>8.2f}  {:>12.0f}  {:>8.1f}".format(name, seconds, count / seconds, size / seconds / 1e6))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Standard input throughput benchmark for SinkNode.
+
+Pipes a file of JSON lines into StandardInReader and compares the time taken against 'cat' piping the same file,
+which is as fast as the input can go. Two readings are taken for the reader:
+    frames  - reading and cutting the input into entries (the part that should keep up with cat)
+    entries - the full read loop, including JSON decoding and batching into the read queue
+
+Usage:
+    python benchmarks/bench_stdin.py                Pipe in a million lines
+    python benchmarks/bench_stdin.py -n 5000000     Pipe in more
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from SinkNode.EntryQueue import EntryQueue
+from SinkNode.Reader.StandardInReader import StandardInReader
+
+__author__ = 'Leenix'
+
+DEFAULT_LINES = 1000000
+
+
+def consume_frames():
+    """
+    Cut standard input into entries until it runs out
+    :return: Number of entries read
+    """
+    reader = StandardInReader(raw=True)
+    reader.is_running = True
+
+    count = 0
+    while reader.is_running:
+        count += len(reader.read_entries())
+    return count
+
+
+def consume_entries():
+    """
+    Run standard input through the reader's full read loop into a read queue until it runs out
+    :return: Number of entries queued
+    """
+    queue = EntryQueue()
+    reader = StandardInReader(raw=True)
+    reader.set_outbox(queue)
+
+    counts = [0]
+
+    def drain():
+        while True:
+            entries = queue.get_batch(1024)
+            if len(entries) == 0:
+                break
+            counts[0] += len(entries)
+
+    drain_thread = Thread(target=drain)
+    drain_thread.start()
+
+    reader.start()
+    reader.join()
+    queue.close()
+    drain_thread.join()
+    return counts[0]
+
+
+def time_pipe(path, command):
+    """
+    Time how long a command takes to read the file through a pipe
+    :param path: File to pipe in
+    :param command: Command reading standard input
+    :return: Tuple of (seconds, output)
+    """
+    start_time = time.time()
+    cat = subprocess.Popen(["cat", path], stdout=subprocess.PIPE)
+    output = subprocess.check_output(command, stdin=cat.stdout)
+    cat.stdout.close()
+    cat.wait()
+    return time.time() - start_time, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Standard input throughput benchmark for SinkNode")
+    parser.add_argument("-n", "--lines", type=int, default=DEFAULT_LINES, help="Number of lines to pipe in")
+    parser.add_argument("--consume", choices=["frames", "entries"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.consume == "frames":
+        print(consume_frames())
+        return 0
+    if args.consume == "entries":
+        print(consume_entries())
+        return 0
+
+    input_file, path = tempfile.mkstemp(suffix=".jsonl")
+    try:
+        with os.fdopen(input_file, "w") as lines:
+            for i in range(args.lines):
+                lines.write(json.dumps({"id": "station{}".format(i % 16), "seq": i, "value": i * 0.5}) + "\n")
+        size = os.path.getsize(path)
+
+        results = [("cat", time_pipe(path, ["cat"])[0])]
+        for mode in ("frames", "entries"):
+            seconds, output = time_pipe(path, [sys.executable, os.path.abspath(__file__), "--consume", mode])
+            if int(output) != args.lines:
+                print("{} read {} lines instead of {}".format(mode, int(output), args.lines))
+                return 1
+            results.append((mode, seconds))
+    finally:
+        os.remove(path)
+
+    print("{:<8}  {:>8}  {:>12}  {:>8}  {:>7}".format("reader", "seconds", "lines/s", "MB/s", "vs cat"))
+    for name, seconds in results:
+        print("{:<8}  {:>8.2f}  {:>12.0f}  {:>8.1f}  {:>6.1f}x".format(name, seconds, args.lines / seconds,
+                                                                      size / seconds / 1e6, seconds / results[0][1]))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
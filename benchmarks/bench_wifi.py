@@ -0,0 +1,150 @@
+"""
+Wi-Fi device scan throughput benchmark for SinkNode.
+
+Writes a synthetic capture of probe requests, probe responses, beacons and data frames, then replays it through
+WifiDeviceReader as fast as it can go, so the scan can be measured without a monitor-mode card. An archived capture
+can be replayed instead. Three readings are taken:
+    read   - reading the frames out of the capture file
+    parse  - reading and parsing each frame (see Dot11Parser)
+    scan   - the full replay through the packet queue and device tracking
+The time taken to dump the devices found is shown as well.
+
+Usage:
+    python benchmarks/bench_wifi.py                         Replay 200,000 synthetic frames from 2,000 devices
+    python benchmarks/bench_wifi.py -n 1000000 -d 20000     Replay more
+    python benchmarks/bench_wifi.py --capture venue.pcapng  Replay a recorded capture
+"""
+import argparse
+import logging
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from SinkNode.Reader.CaptureFile import read_capture, write_pcap
+from SinkNode.Reader.Dot11Parser import parse_frame
+from SinkNode.Reader.WifiDeviceReader import WifiDeviceReader
+
+__author__ = 'Leenix'
+
+DEFAULT_FRAMES = 200000
+DEFAULT_DEVICES = 2000
+
+# Share of each kind of frame in the synthetic capture - (frame control byte, fixed fields before the elements)
+FRAME_MIX = [(0x40, 0)] * 5 + [(0x50, 12)] * 2 + [(0x80, 12)] * 2 + [(0x08, None)]
+
+RADIOTAP = struct.pack("<BxHI", 0, 18, 0).ljust(18, "\x00")
+BROADCAST = "\xff" * 6
+
+
+def make_capture(path, frames, devices):
+    """
+    Write a synthetic capture
+    :param path: File to write
+    :param frames: Number of frames
+    :param devices: Number of distinct device addresses
+    :return: None
+    """
+    random.seed(1)
+
+    # Real vendor prefixes, so looking up who made each device costs what it does on real traffic
+    prefixes = ["\x00\x1c\xb3", "\xa4\x2b\xb0", "\x3c\x5a\xb4", "\xf0\x9f\xc2"]
+    addresses = [prefixes[i % len(prefixes)] + struct.pack(">I", i)[1:] for i in range(devices)]
+    ssids = ["HomeNet", "Cafe Free WiFi", "eduroam", ""]
+
+    def generate():
+        for i in range(frames):
+            frame_control, fixed_fields = random.choice(FRAME_MIX)
+            address = random.choice(addresses)
+            # Probe responses are sent to the device; everything else here is from it
+            receiver = address if frame_control == 0x50 else BROADCAST
+            header = chr(frame_control) + "\x00\x00\x00" + receiver + address + address + "\x00\x00"
+
+            if fixed_fields is None:
+                body = "\x00" * 64
+            else:
+                ssid = random.choice(ssids)
+                body = "\x00" * fixed_fields + "\x00" + chr(len(ssid)) + ssid + "\x01\x04\x02\x04\x0b\x16"
+
+            yield 1456790400 + i * 0.001, RADIOTAP + header + body
+
+    write_pcap(path, generate())
+
+
+def time_read(path):
+    start_time = time.time()
+    count = sum(1 for _ in read_capture(path))
+    return count, time.time() - start_time
+
+
+def time_parse(path):
+    start_time = time.time()
+    count = sum(1 for _, _, frame in read_capture(path) if parse_frame(frame) is not None)
+    return count, time.time() - start_time
+
+
+def time_scan(path):
+    """
+    Replay a capture through the device scan
+    :param path: Capture file
+    :return: Tuple of (frames replayed, seconds taken, devices found, seconds taken to dump them)
+    """
+    reader = WifiDeviceReader(capture_files=path, include_access_points=True, logger_level=logging.FATAL)
+    reader.is_running = True
+
+    start_time = time.time()
+    reader.process_thread.start()
+    count = reader.replay_captures()
+    reader.packet_queue.join()
+    elapsed = time.time() - start_time
+
+    reader.stop()
+
+    devices = len(reader.device_list)
+    start_time = time.time()
+    reader.convert_to_json(reader.take_snapshot())
+    dump_seconds = time.time() - start_time
+
+    return count, elapsed, devices, dump_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wi-Fi device scan throughput benchmark for SinkNode")
+    parser.add_argument("-n", "--frames", type=int, default=DEFAULT_FRAMES, help="Number of synthetic frames")
+    parser.add_argument("-d", "--devices", type=int, default=DEFAULT_DEVICES, help="Number of synthetic devices")
+    parser.add_argument("--capture", metavar="FILE", help="Replay a .pcap or .pcapng capture instead")
+    args = parser.parse_args()
+
+    path = args.capture
+    if path is None:
+        capture_file, path = tempfile.mkstemp(suffix=".pcap")
+        os.close(capture_file)
+        make_capture(path, args.frames, args.devices)
+
+    try:
+        size = os.path.getsize(path)
+        frames, read_seconds = time_read(path)
+        parsed, parse_seconds = time_parse(path)
+        replayed, scan_seconds, devices, dump_seconds = time_scan(path)
+    finally:
+        if args.capture is None:
+            os.remove(path)
+
+    print("{} frames ({:.1f} MB), {} management frames, {} devices found".format(frames, size / 1e6, parsed,
+                                                                                  devices))
+    print("")
+    print("{:<6}  {:>8}  {:>12}".format("stage", "seconds", "frames/s"))
+    for name, seconds in (("read", read_seconds), ("parse", parse_seconds), ("scan", scan_seconds)):
+        print("{:<6}  {:>8.2f}  {:>12.0f}".format(name, seconds, frames / seconds))
+    print("")
+    print("Dumping {} devices took {:.1f} ms".format(devices, dump_seconds * 1000))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())